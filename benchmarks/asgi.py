@@ -0,0 +1,159 @@
+"""Compares serving the API over WSGI and over ASGI.
+
+Opens CONCURRENCY simulated connections, each sending its share of REQUESTS
+requests for a page of photos and waiting DELAY seconds before each one, as
+a slow or idle client would. In WSGI mode every connection holds a thread,
+as a threaded WSGI server does; in ASGI mode connections are coroutines and
+requests share the `ASGI_THREADS` threads of `core.asgi`. Every mode runs in
+its own process, so the report can compare their throughput and peak
+resident memory per connection:
+
+    python -m benchmarks.asgi --concurrency 200 --requests 2000 --output asgi_output.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from core.asgi import ASGIAdapter, environ
+
+from .load import git_commit, login, percentile
+from .seed import create_app, seed
+
+
+def scope(headers: dict) -> dict:
+    return dict(
+        type="http",
+        method="GET",
+        path="/api/photos",
+        query_string=b"",
+        headers=[(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        client=("127.0.0.1", 0),
+    )
+
+
+def drive_wsgi(app, shares, delay: float, headers: dict, latencies: list):
+    def connection(requests: int):
+        for _ in range(requests):
+            time.sleep(delay)
+            start = time.perf_counter()
+            response = app(environ(scope(headers), b""), lambda status, headers, exc_info=None: None)
+            b"".join(response)
+            response.close()
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=connection, args=(requests,)) for requests in shares]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def drive_asgi(app, shares, delay: float, headers: dict, latencies: list):
+    adapter = ASGIAdapter(app, app.config["ASGI_THREADS"])
+
+    async def receive():
+        return dict(type="http.request", body=b"")
+
+    async def send(message):
+        pass
+
+    async def connection(requests: int):
+        for _ in range(requests):
+            await asyncio.sleep(delay)
+            start = time.perf_counter()
+            await adapter(scope(headers), receive, send)
+            latencies.append(time.perf_counter() - start)
+
+    async def main():
+        await asyncio.gather(*(connection(requests) for requests in shares))
+
+    asyncio.run(main())
+    adapter.executor.shutdown()
+
+
+def run_mode(args) -> dict:
+    """Runs one mode against the already seeded database and returns its measurements."""
+    app = create_app(args.database)
+    with app.app_context():
+        headers = login(app.test_client(), 0)
+    shares = [
+        args.requests // args.concurrency + (i < args.requests % args.concurrency) for i in range(args.concurrency)
+    ]
+    drive = drive_wsgi if args.mode == "wsgi" else drive_asgi
+    latencies = []
+
+    drive(app, [1] * min(args.concurrency, 10), 0, headers, [])
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    drive(app, shares, args.delay, headers, latencies)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return dict(
+        requests=len(latencies),
+        rps=len(latencies) / elapsed,
+        mean=statistics.mean(latencies),
+        p50=percentile(latencies, 50),
+        p99=percentile(latencies, 99),
+        threads=args.concurrency if args.mode == "wsgi" else app.config["ASGI_THREADS"],
+        peak_rss_kib=peak,
+        rss_per_connection_kib=(peak - baseline) / args.concurrency,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--photos", type=int, default=1000, help="Photos per user.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200, help="Simultaneous connections.")
+    parser.add_argument("--delay", type=float, default=0.01, help="Seconds a connection waits before each request.")
+    parser.add_argument("--mode", choices=["wsgi", "asgi"], help=argparse.SUPPRESS)
+    parser.add_argument("--database", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="File the JSON report is written to, stdout by default.")
+    args = parser.parse_args(argv)
+
+    if args.mode:
+        print(json.dumps(run_mode(args)))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = f"sqlite:///{os.path.join(directory, 'asgi.db')}"
+        seed(create_app(database), args.users, args.photos)
+        options = ["--requests", args.requests, "--concurrency", args.concurrency, "--delay", args.delay]
+        modes = {}
+        for mode in ("wsgi", "asgi"):
+            command = [sys.executable, "-m", "benchmarks.asgi", "--mode", mode, "--database", database, *options]
+            output = subprocess.run(list(map(str, command)), capture_output=True, text=True, check=True).stdout
+            modes[mode] = json.loads(output.splitlines()[-1])
+
+    report = dict(
+        meta=dict(
+            commit=git_commit(),
+            python=sys.version.split()[0],
+            photos=args.photos,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            delay=args.delay,
+        ),
+        modes=modes,
+    )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from .seed import PASSWORD, create_app, email, seed  # noqa: E402
+
+USERS = 10
+PHOTOS = 500
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    app = create_app(f"sqlite:///{tmp_path_factory.mktemp('bench') / 'bench.db'}")
+    seed(app, USERS, PHOTOS)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        yield app.test_client()
+
+
+@pytest.fixture
+def auth_header(client):
+    rv = client.post(
+        "/api/login", data=json.dumps(dict(email=email(0), password=PASSWORD)), content_type="application/json"
+    )
+    assert 200 == rv.status_code
+    return {"Authorization": f"Bearer {rv.get_json()['access_token']}"}
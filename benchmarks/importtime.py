@@ -0,0 +1,73 @@
+"""Measures the cold start of the application with `python -X importtime`.
+
+Runs ROUNDS fresh interpreters importing `core` and creating the application
+for ENV, and reports the median import and create_app times along with the
+modules that took longest to import, cumulatively, in the last round:
+
+    python -m benchmarks.importtime --rounds 5 --output importtime_output.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from .load import git_commit
+
+SCRIPT = """
+import time
+start = time.perf_counter()
+import core
+imported = time.perf_counter()
+core.create_app({env!r})
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Returns the cumulative import time, in seconds, of every module in `-X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = int(cumulative) / 1e6
+    return modules
+
+
+def run(env: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT.format(env=env)], capture_output=True, text=True, check=True
+    )
+    imported, created = map(float, result.stdout.split())
+    return dict(import_time=imported, create_app_time=created, modules=parse_importtime(result.stderr))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--env", default="test", help="Configuration the application is created with.")
+    parser.add_argument("--top", type=int, default=20, help="Slowest modules reported.")
+    parser.add_argument("--output", help="File the JSON report is written to, stdout by default.")
+    args = parser.parse_args(argv)
+
+    rounds = [run(args.env) for _ in range(args.rounds)]
+    modules = sorted(rounds[-1]["modules"].items(), key=lambda module: module[1], reverse=True)
+    report = dict(
+        meta=dict(commit=git_commit(), python=sys.version.split()[0], env=args.env, rounds=args.rounds),
+        import_time=statistics.median(result["import_time"] for result in rounds),
+        create_app_time=statistics.median(result["create_app_time"] for result in rounds),
+        slowest_modules=dict(modules[: args.top]),
+    )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Standalone load driver for the API hot paths.
+
+Seeds a SQLite database with USERS users owning PHOTOS photos each, then fires
+REQUESTS requests per endpoint at the WSGI application from CONCURRENCY threads
+and reports latency percentiles, throughput and statements per request as JSON:
+
+    python -m benchmarks.load --users 10 --photos 1000 --requests 500 --output bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .seed import PASSWORD, count_queries, create_app, email, first_photo_id, seed
+
+
+def percentile(values, percent: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+def login(client, user: int) -> dict:
+    rv = client.post("/api/login", json=dict(email=email(user), password=PASSWORD))
+    if rv.status_code != 200:
+        raise RuntimeError(f"Logging in as {email(user)} failed with status {rv.status_code}.")
+    return {"Authorization": f"Bearer {rv.get_json()['access_token']}"}
+
+
+def endpoints(app, users: int):
+    """Returns a request function for every endpoint; `delete` removes what `create` added."""
+    photo_ids = {user: first_photo_id(app, user + 1) for user in range(users)}
+    created = {}
+
+    def create(client, user, headers):
+        rv = client.post("/api/photos", json=dict(title="Load", url="https://example.com/load.png"), headers=headers)
+        created.setdefault(user, []).append(rv.get_json()["id"])
+        return rv
+
+    def delete(client, user, headers):
+        return client.delete(f"/api/photos/{created[user].pop()}", headers=headers)
+
+    return {
+        "login": lambda client, user, headers: client.post(
+            "/api/login", json=dict(email=email(user), password=PASSWORD)
+        ),
+        "list": lambda client, user, headers: client.get("/api/photos", headers=headers),
+        "get": lambda client, user, headers: client.get(f"/api/photos/{photo_ids[user]}", headers=headers),
+        "create": create,
+        "delete": delete,
+    }
+
+
+def drive(app, request, requests: int, concurrency: int, headers: dict) -> dict:
+    """Runs requests calls of request from concurrency threads, each acting as one of the users in headers."""
+    latencies, errors = [], []
+
+    def worker(thread: int):
+        user = thread % len(headers)
+        with app.app_context():
+            client = app.test_client()
+            # An even split keeps every thread deleting as many photos as it created.
+            for _ in range(requests // concurrency + (thread < requests % concurrency)):
+                start = time.perf_counter()
+                rv = request(client, user, headers[user])
+                # Rejected requests are counted apart, so they never weigh in the latencies of the endpoint.
+                if 200 <= rv.status_code < 300:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors.append(rv.status_code)
+
+    with app.app_context(), count_queries(app.db.engine) as counter:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(worker, range(concurrency)))
+        elapsed = time.perf_counter() - start
+    if not latencies:
+        raise RuntimeError(f"Every request failed, with statuses {sorted(set(errors))}.")
+
+    return dict(
+        requests=len(latencies),
+        errors=len(errors),
+        rps=len(latencies) / elapsed,
+        mean=statistics.mean(latencies),
+        p50=percentile(latencies, 50),
+        p95=percentile(latencies, 95),
+        p99=percentile(latencies, 99),
+        queries_per_request=counter["queries"] / (len(latencies) + len(errors)),
+    )
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--photos", type=int, default=1000, help="Photos per user.")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--endpoint", action="append", help="Endpoints to drive, all by default.")
+    parser.add_argument("--output", help="File the JSON report is written to, stdout by default.")
+    args = parser.parse_args(argv)
+    if args.endpoint and "delete" in args.endpoint and "create" not in args.endpoint:
+        parser.error("the delete endpoint removes the photos added by the create endpoint, select both.")
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(f"sqlite:///{os.path.join(directory, 'load.db')}")
+        seed(app, args.users, args.photos)
+        with app.app_context():
+            client = app.test_client()
+            headers = {user: login(client, user) for user in range(args.users)}
+        report = dict(
+            meta=dict(
+                commit=git_commit(),
+                python=sys.version.split()[0],
+                platform=platform.platform(),
+                users=args.users,
+                photos=args.photos,
+                requests=args.requests,
+                concurrency=args.concurrency,
+            ),
+            endpoints={
+                name: drive(app, request, args.requests, args.concurrency, headers)
+                for name, request in endpoints(app, args.users).items()
+                if not args.endpoint or name in args.endpoint
+            },
+        )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
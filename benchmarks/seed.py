@@ -0,0 +1,73 @@
+"""Helpers shared by the benchmarks to build a seeded application."""
+
+import contextlib
+
+from flask import Flask
+from sqlalchemy import event
+
+import core
+from core.models import PhotoModel, UserModel
+from core.ratelimit import limiter
+from core.services import PhotoService
+from core.utils import chunked
+
+PASSWORD = "benchmark"
+
+
+def create_app(database_uri: str) -> Flask:
+    app = core.create_app("test")
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
+    # Every benchmark logs in from the same address, which the login rate limits would soon reject.
+    app.config["RATELIMIT_BACKEND"] = None
+    limiter.init_app(app)
+    return app
+
+
+def seed(app: Flask, users: int, photos: int, chunk_size: int = 1000):
+    """Creates the schema with `users` users owning `photos` photos each, all sharing `PASSWORD`."""
+    with app.app_context():
+        app.db.drop_all()
+        app.db.create_all()
+        password = UserModel.hash(PASSWORD)
+        app.db.session.execute(
+            UserModel.__table__.insert(),
+            [dict(email=email(i), name=f"User {i}", password=password) for i in range(users)],
+        )
+        app.db.session.commit()
+
+        rows = (
+            dict(
+                title=f"Photo {i}",
+                url=f"https://example.com/{user_id}/{i}.png",
+                description="Lorem ipsum dolor sit amet. " * 8,
+                user_id=user_id,
+            )
+            for user_id in range(1, users + 1)
+            for i in range(photos)
+        )
+        for chunk in chunked(rows, chunk_size):
+            PhotoService.bulk_save(chunk)
+
+
+def email(i: int) -> str:
+    return f"user{i}@bench.local"
+
+
+def first_photo_id(app: Flask, user_id: int) -> int:
+    with app.app_context():
+        return PhotoModel.query.filter_by(user_id=user_id).order_by(PhotoModel.id).first().id
+
+
+@contextlib.contextmanager
+def count_queries(engine):
+    """Counts the statements executed on engine while the block runs, in `counter["queries"]`."""
+    counter = dict(queries=0)
+
+    def on_execute(*_):
+        counter["queries"] += 1
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from core.models import PhotoModel, UserModel
+from core.schemas import PhotoSchema
+
+from .seed import PASSWORD, count_queries, email, first_photo_id
+
+
+def run(benchmark, app, request):
+    """Benchmarks request, recording how many statements one call executes; a failing request is not timed."""
+    with count_queries(app.db.engine) as counter:
+        rv = request()
+    assert 200 <= rv.status_code < 300, f"The request failed with status {rv.status_code}."
+    benchmark.extra_info["queries"] = counter["queries"]
+    benchmark.extra_info["status"] = rv.status_code
+    return benchmark(request)
+
+
+class TestEndpoints:
+    def test_login(self, benchmark, app, client):
+        body = json.dumps(dict(email=email(0), password=PASSWORD))
+        rv = run(benchmark, app, lambda: client.post("/api/login", data=body, content_type="application/json"))
+        assert 200 == rv.status_code
+
+    def test_list_photos(self, benchmark, app, client, auth_header):
+        rv = run(benchmark, app, lambda: client.get("/api/photos", headers=auth_header))
+        assert 200 == rv.status_code
+
+    def test_list_photos_deep_cursor(self, benchmark, app, client, auth_header):
+        cursor = client.get("/api/photos", query_string={"limit": 450}, headers=auth_header).get_json()["next_cursor"]
+        rv = run(
+            benchmark, app, lambda: client.get("/api/photos", query_string={"cursor": cursor}, headers=auth_header)
+        )
+        assert 200 == rv.status_code
+
+    def test_get_photo(self, benchmark, app, client, auth_header):
+        path = f"/api/photos/{first_photo_id(app, 1)}"
+        rv = run(benchmark, app, lambda: client.get(path, headers=auth_header))
+        assert 200 == rv.status_code
+
+    def test_create_photo(self, benchmark, app, client, auth_header):
+        body = json.dumps(dict(title="Benchmark", url="https://example.com/benchmark.png"))
+        rv = run(
+            benchmark,
+            app,
+            lambda: client.post("/api/photos", data=body, content_type="application/json", headers=auth_header),
+        )
+        assert 201 == rv.status_code
+
+    def test_delete_photo(self, benchmark, app, client, auth_header):
+        def create():
+            photo = PhotoModel(title="Benchmark", url="https://example.com/benchmark.png", user_id=1)
+            app.db.session.add(photo)
+            app.db.session.commit()
+            return (photo.id,), {}
+
+        benchmark.pedantic(lambda id: client.delete(f"/api/photos/{id}", headers=auth_header), setup=create, rounds=50)
+
+
+class TestSerialization:
+    @pytest.mark.parametrize("count", [1, 50, 500])
+    def test_dump_with(self, benchmark, app, client, count):
+        photos = PhotoModel.query.filter_by(user_id=1).limit(count).all()
+        view = PhotoSchema.dump_with(many=True)(lambda: photos)
+        with app.test_request_context():
+            benchmark(view)
+
+
+class TestHashing:
+    def test_hash(self, benchmark, app, client):
+        benchmark(UserModel.hash, PASSWORD)
+
+    def test_verify(self, benchmark, app, client):
+        hash = UserModel.hash(PASSWORD)
+        benchmark(UserModel.verify, PASSWORD, hash)
@@ -2,17 +2,21 @@ import logging
 import os
 from logging.handlers import TimedRotatingFileHandler
 
-from apispec.ext.marshmallow import MarshmallowPlugin
-from apispec_webframeworks.flask import FlaskPlugin
-from flasgger import Swagger
-from flasgger.marshmallow_apispec import APISpec
-from flasgger.utils import apispec_to_template
 from flask import Flask
 
 from . import models
+from .cache import response_cache, user_cache
 from .commands import command_groups
 from .db import db
+from .hashing import hasher
+from .idempotency import idempotency_keys
+from .instrumentation import instrumentation
+from .purge import purger
+from .ratelimit import limiter
+from .revocation import revocation_list
 from .security import cors, jwt
+from .swagger import LazySwagger
+from .thumbnails import thumbnailer
 from .views import api_bp
 from .config import get_config
 
@@ -25,18 +29,8 @@ def create_app(env: str = "development"):
     app.config["ENV"] = env
     app.config.from_object(get_config(env))
 
-    api_spec = APISpec(
-        title=__title__,
-        version=__version__,
-        openapi_version="2.0",
-        plugins=[
-            FlaskPlugin(),
-            MarshmallowPlugin(schema_name_resolver=lambda schema: schema.__name__.replace("Schema", "")),
-        ],
-    )
-
     register_extensions(app)
-    register_swagger(app, api_spec)
+    register_swagger(app)
     register_blueprints(app)
     register_commands(app)
     register_logger(app)
@@ -48,12 +42,32 @@ def register_extensions(app: Flask):
     db.init_app(app)
     jwt.init_app(app)
     cors.init_app(app)
+    user_cache.init_app(app)
+    response_cache.init_app(app)
+    hasher.init_app(app)
+    revocation_list.init_app(app)
+    limiter.init_app(app)
+    idempotency_keys.init_app(app)
+    thumbnailer.init_app(app)
+    purger.init_app(app)
+    instrumentation.init_app(app)
+    instrumentation.gauge("user_cache", "User lookup cache hits, misses and size.", lambda: user_cache.stats)
+    instrumentation.gauge(
+        "idempotency_cache", "Idempotent response cache hits, misses and size.", lambda: idempotency_keys.cache.stats
+    )
+    instrumentation.gauge("hashing_pool", "Passwords being hashed and hashing workers.", lambda: hasher.stats)
+    instrumentation.gauge("thumbnail_pool", "Images being rendered and rendering workers.", lambda: thumbnailer.stats)
+    instrumentation.gauge("purge", "Deleted photos purged and seconds between purges.", lambda: purger.stats)
+    instrumentation.gauge("db_pool", "Database connection pool usage.", db.pool_stats)
+    instrumentation.gauge("revoked_tokens", "Revoked tokens not expired yet.", lambda: revocation_list.stats)
+    instrumentation.gauge("rate_limits", "Rate limited keys counted and requests rejected.", lambda: limiter.stats)
+    instrumentation.gauge("db_replicas", "Read replicas configured and marked down.", lambda: db.replicas.stats)
     app.db = db
 
 
-def register_swagger(app: Flask, api_spec: APISpec):
-    template = apispec_to_template(app, api_spec)
-    Swagger(app, template=template)
+def register_swagger(app: Flask):
+    if app.config["SWAGGER_ENABLED"]:
+        LazySwagger(app)
 
 
 def register_blueprints(app: Flask):
@@ -0,0 +1,203 @@
+"""Serves the application over ASGI.
+
+    uvicorn --factory core.asgi:create_asgi_app
+
+Connections, request bodies and responses are handled on the event loop, so
+slow or idle clients cost a coroutine instead of a thread. Only dispatching
+a complete request to the Flask application takes one of `ASGI_THREADS`
+threads, which mostly wait on the database connection pool and on the
+hashing process pool. A thread does not wait for its response to be sent:
+it is free once the application returned a buffered response, and a
+streamed one holds it only while the client is a few chunks behind.
+"""
+
+import asyncio
+import io
+import os
+import sys
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from threading import Semaphore
+from http import HTTPStatus
+
+from flask import Flask
+
+from . import create_app
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client disconnects before its request body was received or its response was sent."""
+
+
+class ASGIAdapter:
+    """An ASGI 3 application running a WSGI application on a bounded thread pool.
+
+    Up to `window` chunks of a streamed response are queued for the loop to send before its thread waits.
+    """
+
+    def __init__(self, app: Flask, max_workers: int, window: int = 8):
+        self.app = app
+        self.window = window
+        self.max_content_length = app.config["MAX_CONTENT_LENGTH"]
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="asgi")
+
+    async def __call__(self, scope: dict, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}.")
+
+        try:
+            body = await self.read_body(receive)
+        except ClientDisconnected:
+            return
+        if body is None:
+            await send(dict(type="http.response.start", status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE, headers=[]))
+            await send(dict(type="http.response.body", body=b""))
+            return
+
+        # The worker thread hands the response messages over without waiting for them to be sent, so a
+        # buffered response frees it at once; a streamed one waits only while `window` chunks are unsent.
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue()
+        window = Semaphore(self.window)
+        closed = []
+
+        def put(message: dict):
+            window.acquire()
+            if closed:
+                raise ClientDisconnected()
+            loop.call_soon_threadsafe(messages.put_nowait, message)
+
+        done = loop.run_in_executor(self.executor, self.run, environ(scope, body), put)
+        done.add_done_callback(lambda _: messages.put_nowait(None))
+        try:
+            while True:
+                message = await messages.get()
+                if message is None:
+                    break
+                await send(message)
+                window.release()
+        except BaseException:
+            closed.append(True)
+            window.release(self.window)
+            done.add_done_callback(lambda future: future.cancelled() or future.exception())
+            raise
+        await done
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send(dict(type="lifespan.startup.complete"))
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=True)
+                await send(dict(type="lifespan.shutdown.complete"))
+                return
+
+    async def read_body(self, receive) -> typing.Optional[bytes]:
+        """Returns the request body, or None when it is longer than `MAX_CONTENT_LENGTH`.
+
+        Raises `ClientDisconnected` when the client goes away before sending all of it.
+        """
+        body = bytearray()
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnected()
+            body += message.get("body", b"")
+            if self.max_content_length is not None and len(body) > self.max_content_length:
+                return None
+            more_body = message.get("more_body", False)
+        return bytes(body)
+
+    def run(self, environ: dict, put: typing.Callable[[dict], None]):
+        """Runs the WSGI application in a worker thread, putting the messages of its response for the loop to send.
+
+        A chunk is held back until the next one, so the last one ends the response instead of an empty message.
+        """
+        start = {}
+        started = False
+
+        def start_response(status: str, headers: list, exc_info=None):
+            if exc_info is not None:
+                try:
+                    if started:
+                        # The status was already sent, so the error can only end the response.
+                        raise exc_info[1].with_traceback(exc_info[2])
+                finally:
+                    exc_info = None
+            elif start or started:
+                raise AssertionError("start_response was already called.")
+            start.update(
+                type="http.response.start",
+                status=int(status.split(" ", 1)[0]),
+                headers=[(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+            )
+
+        response = self.app(environ, start_response)
+        held = b""
+        try:
+            for chunk in response:
+                if not chunk:
+                    continue
+                if start:
+                    put(start.copy())
+                    start.clear()
+                    started = True
+                elif held:
+                    put(dict(type="http.response.body", body=held, more_body=True))
+                held = chunk
+            if start:
+                put(start.copy())
+            put(dict(type="http.response.body", body=held))
+        except ClientDisconnected:
+            raise
+        except Exception:
+            if held:
+                put(dict(type="http.response.body", body=held, more_body=True))
+            raise
+        finally:
+            if hasattr(response, "close"):
+                response.close()
+
+
+def environ(scope: dict, body: bytes) -> dict:
+    """Returns the WSGI environ of an ASGI HTTP scope"""
+    root_path = scope.get("root_path", "")
+    path = scope.get("raw_path") or scope["path"].encode()
+    path = path.split(b"?", 1)[0].decode("latin-1")
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path,
+        "PATH_INFO": path[len(root_path) :] if path.startswith(root_path) else path,
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        if key == "CONTENT_LENGTH":
+            continue
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def create_asgi_app(env: str = None) -> ASGIAdapter:
+    app = create_app(env or os.environ.get("FLASK_ENV", "production"))
+    return ASGIAdapter(app, app.config["ASGI_THREADS"])
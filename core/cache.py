@@ -0,0 +1,300 @@
+import socket
+import time
+import typing
+from collections import OrderedDict
+from threading import Lock, local
+from urllib.parse import urlparse
+
+from flask import Flask
+
+
+class TTLCache:
+    """A thread-safe LRU cache whose entries expire after a time to live.
+
+    Its size and time to live are read from `<prefix>_SIZE` and `<prefix>_TTL`
+    when the application is initialized.
+    """
+
+    def __init__(self, prefix: str, maxsize: int = 1024, ttl: float = 60):
+        self.prefix = prefix
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def init_app(self, app: Flask):
+        self.maxsize = app.config.get(f"{self.prefix}_SIZE", self.maxsize)
+        self.ttl = app.config.get(f"{self.prefix}_TTL", self.ttl)
+        self.clear()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    @property
+    def stats(self) -> dict:
+        return dict(hits=self.hits, misses=self.misses, size=len(self._entries))
+
+
+class LRUBackend:
+    """Keeps values in process memory, evicting the least recently used beyond `max_bytes`.
+
+    Each worker process has its own copy, so it is not `shared`.
+    """
+
+    shared = False
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] < time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: int = None, nx: bool = False) -> bool:
+        with self._lock:
+            if nx and key in self._entries:
+                return False
+            self._pop(key)
+            expires = time.monotonic() + ttl if ttl else None
+            self._entries[key] = (expires, value)
+            self.size += len(key) + len(value)
+            while self.size > self.max_bytes and self._entries:
+                self._pop(next(iter(self._entries)))
+            return True
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            expires, value = self._entries.get(key, (None, b"0"))
+            self._pop(key)
+            value = str(int(value) + 1).encode()
+            self._entries[key] = (expires, value)
+            self.size += len(key) + len(value)
+            return int(value)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(key) + len(entry[1])
+
+
+class RedisError(Exception):
+    """Raised when a Redis-compatible server answers a command with an error."""
+
+
+class RedisBackend:
+    """Keeps values in a Redis-compatible server, speaking its protocol (RESP) directly.
+
+    Every thread keeps its own connection. The cache must never fail a request,
+    so connection errors are treated as misses.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, timeout: float = 1.0):
+        parsed = urlparse(url)
+        self.address = (parsed.hostname or "localhost", parsed.port or 6379)
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._local = local()
+
+    def get(self, key: str):
+        return self._safe("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: int = None, nx: bool = False) -> bool:
+        args = ["SET", key, value] + (["EX", ttl] if ttl else []) + (["NX"] if nx else [])
+        return self._safe(*args) is not None
+
+    def incr(self, key: str):
+        return self._safe("INCR", key)
+
+    def delete(self, key: str):
+        self._safe("DEL", key)
+
+    def clear(self):
+        self._safe("FLUSHDB")
+
+    def command(self, *args):
+        """Sends a command and returns its reply, reconnecting once if the connection was lost."""
+        try:
+            return self._send(self._connection(), args)
+        except OSError:
+            self._close()
+            return self._send(self._connection(), args)
+
+    def pipeline(self, *commands) -> list:
+        """Sends commands at once and returns their replies, in a single round trip; raises the first error reply."""
+        try:
+            return self._pipeline(self._connection(), commands)
+        except OSError:
+            self._close()
+            return self._pipeline(self._connection(), commands)
+
+    def _safe(self, *args):
+        try:
+            return self.command(*args)
+        except (OSError, RedisError):
+            self._close()
+            return None
+
+    def _connection(self):
+        if getattr(self._local, "file", None) is None:
+            sock = socket.create_connection(self.address, self.timeout)
+            self._local.file = sock.makefile("rwb")
+            sock.close()
+            if self.db:
+                self._send(self._local.file, ("SELECT", self.db))
+        return self._local.file
+
+    def _close(self):
+        file = getattr(self._local, "file", None)
+        self._local.file = None
+        if file is not None:
+            try:
+                file.close()
+            except OSError:
+                pass
+
+    def _send(self, file, args) -> typing.Any:
+        file.write(self._encode(args))
+        file.flush()
+        return self._read(file)
+
+    def _pipeline(self, file, commands) -> list:
+        file.write(b"".join(self._encode(args) for args in commands))
+        file.flush()
+        replies, error = [], None
+        for _ in commands:
+            try:
+                replies.append(self._read(file))
+            except RedisError as exc:
+                # Later replies are still read, so the connection is left ready for the next command.
+                replies.append(None)
+                error = error or exc
+        if error is not None:
+            raise error
+        return replies
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [arg if isinstance(arg, bytes) else str(arg).encode() for arg in args]
+        return b"*%d\r\n" % len(parts) + b"".join(b"$%d\r\n%s\r\n" % (len(part), part) for part in parts)
+
+    def _read(self, file) -> typing.Any:
+        line = file.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server.")
+        prefix, rest = line[:1], line[1:-2]
+        if prefix == b"+":
+            return rest
+        if prefix == b"-":
+            raise RedisError(rest.decode())
+        if prefix == b":":
+            return int(rest)
+        if prefix == b"$":
+            length = int(rest)
+            return None if length < 0 else file.read(length + 2)[:-2]
+        if prefix == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read(file) for _ in range(length)]
+        raise RedisError(f"Unexpected reply {line!r}.")
+
+
+class ResponseCache:
+    """Caches serialized responses in a pluggable backend.
+
+    Entries are keyed by the version of what they represent, so a write only
+    has to change that version. With a `shared` backend, versions are counters
+    kept in the backend itself and bumped by `invalidate`; otherwise they are
+    loaded from the database, the one place every worker process can see.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = None
+
+    def init_app(self, app: Flask):
+        backend = app.config["RESPONSE_CACHE_BACKEND"]
+        self.ttl = app.config["RESPONSE_CACHE_TTL"]
+        if backend == "memory":
+            self.backend = LRUBackend(app.config["RESPONSE_CACHE_MAX_BYTES"])
+        elif backend == "redis":
+            self.backend = RedisBackend(app.config["RESPONSE_CACHE_URL"])
+        else:
+            self.backend = None
+
+    def version(self, namespace: str, loader: typing.Callable[[], int]):
+        """Returns the version of namespace, calling loader when it is not kept in the backend."""
+        if self.backend is None or not self.backend.shared:
+            return loader()
+        key = f"{namespace}:version"
+        version = self.backend.get(key)
+        if version is None:
+            # Start from a value no former, evicted, counter could have reached.
+            self.backend.set(key, time.time_ns(), nx=True)
+            version = self.backend.get(key)
+        return int(version) if version is not None else loader()
+
+    def invalidate(self, namespace: str):
+        """Makes every entry of namespace stale. Call it after the write is committed."""
+        if self.backend is not None and self.backend.shared:
+            self.backend.incr(f"{namespace}:version")
+
+    def get(self, key: str):
+        if self.backend is None:
+            return None
+        return self.backend.get(key)
+
+    def set(self, key: str, value: bytes):
+        if self.backend is not None:
+            self.backend.set(key, value, ttl=self.ttl)
+
+
+user_cache = TTLCache("USER_CACHE")
+response_cache = ResponseCache()
@@ -2,7 +2,8 @@ import click
 from flask.cli import AppGroup
 
 from core.db import db
-
+from core.migrations import pending_migrations, upgrade
+from core.search import photo_index
 
 db_cli = AppGroup("db", help="Database commands related.")
 
@@ -28,3 +29,27 @@ def reset_database(ctx):
     click.echo("Reseting database")
     ctx.invoke(drop_all)
     ctx.invoke(create_all)
+
+
+@db_cli.command("upgrade")
+@click.option("--dry-run", is_flag=True, help="Prints the statements instead of running them.")
+def upgrade_database(dry_run):
+    """Creates missing tables, columns, indexes and full-text indexes without dropping any data."""
+    if dry_run:
+        statements = list(pending_migrations(db.engine, db.metadata, [photo_index]))
+    else:
+        statements = upgrade(db.engine, db.metadata, [photo_index])
+    for statement in statements:
+        click.echo(f"{str(statement.compile(dialect=db.engine.dialect)).strip()};")
+    click.echo(f"{len(statements)} statements {'pending' if dry_run else 'applied'}.")
+
+
+@db_cli.command("reindex")
+def reindex():
+    """Rebuilds the full-text index used to search photos."""
+    with db.engine.begin() as connection:
+        rebuilt = photo_index.rebuild(connection)
+    if rebuilt:
+        click.echo(f"Rebuilt the {photo_index.name} index.")
+    else:
+        click.echo("Full-text search is not supported by this database, searches use LIKE.")
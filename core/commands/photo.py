@@ -1,8 +1,17 @@
+import csv
+from datetime import datetime, timedelta
+from http import HTTPStatus
+
 import click
+from flask import current_app
 from flask.cli import AppGroup
 
 from core.db import db
+from core.ingest import ingest_photos, parse_ndjson
 from core.models import PhotoModel as Photo
+from core.purge import purger
+from core.services import PhotoService, ThumbnailService
+from core.utils import chunked
 
 photo_cli = AppGroup("photo", help="User commands related.")
 
@@ -21,3 +30,63 @@ def add_user(title, url, user_id):
     photo = Photo(title=title, url=url, user_id=user_id)
     db.session.add(photo)
     db.session.commit()
+
+
+@photo_cli.command("import")
+@click.argument("file", type=click.File())
+@click.option(
+    "--user-id",
+    "user_id",
+    type=int,
+    prompt=True,
+    help="ID code of user that will own the photos. Prompted if not defined.",
+)
+@click.option(
+    "--format",
+    "format",
+    type=click.Choice(["csv", "ndjson"]),
+    help="File format. Guessed from the file extension if not defined.",
+)
+@click.option("--chunk-size", type=int, help="Photos inserted per transaction. Defaults to BATCH_CHUNK_SIZE.")
+def import_photos(file, user_id, format, chunk_size):
+    """Imports photos from a CSV file with a header row or a newline delimited JSON file."""
+    if format is None:
+        format = "csv" if file.name.endswith(".csv") else "ndjson"
+    records = csv.DictReader(file) if format == "csv" else parse_ndjson(file)
+    chunk_size = chunk_size or current_app.config["BATCH_CHUNK_SIZE"]
+
+    created = failed = 0
+    for result in ingest_photos(records, user_id, chunk_size):
+        if result["status"] == HTTPStatus.CREATED:
+            created += 1
+        else:
+            failed += 1
+            click.secho(f"Record {result['index']}: {result['errors']}", fg="red", err=True)
+    click.secho(f"{created} photos imported, {failed} failed.", fg="green")
+
+
+@photo_cli.command("thumbnails")
+@click.option("--backfill", is_flag=True, help="Also renders the thumbnails of photos saved before they were.")
+@click.option("--chunk-size", type=int, help="Photos rendered concurrently. Defaults to BATCH_CHUNK_SIZE.")
+def render_thumbnails(backfill, chunk_size):
+    """Renders the pending thumbnails on THUMBNAIL_POOL_SIZE worker processes, or inline without workers."""
+    if backfill:
+        click.echo(f"{ThumbnailService.backfill()} photos queued.")
+    chunk_size = chunk_size or current_app.config["BATCH_CHUNK_SIZE"]
+
+    done = failed = 0
+    for photo_ids in chunked(ThumbnailService.unfinished(), chunk_size):
+        counts = ThumbnailService.process(photo_ids)
+        done += counts["done"]
+        failed += counts["failed"]
+    click.secho(f"{done} photos rendered, {failed} failed.", fg="green")
+
+
+@photo_cli.command("purge")
+@click.option("--older-than", type=int, help="Seconds since the photos were deleted. Defaults to PURGE_AFTER.")
+@click.option("--chunk-size", type=int, help="Photos hard deleted per transaction. Defaults to PURGE_CHUNK_SIZE.")
+def purge_photos(older_than, chunk_size):
+    """Hard deletes the photos that were deleted long enough ago."""
+    before = purger.cutoff() if older_than is None else datetime.utcnow() - timedelta(seconds=older_than)
+    purged = PhotoService.purge(before, chunk_size or current_app.config["PURGE_CHUNK_SIZE"])
+    click.secho(f"{purged} photos purged.", fg="green")
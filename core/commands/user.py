@@ -18,6 +18,16 @@ def add_user(user):
 
 
 @user_cli.command("list")
-def list():
-    users = UserService.list()
-    click.secho("\n".join(f"{user.id}, {user.email}" for user in users), fg="green")
+@click.option("--counts", is_flag=True, help="Also prints how many photos every user has.")
+@click.option("--photos", is_flag=True, help="Also prints the titles of every user's photos.")
+def list(counts, photos):
+    """Lists the users; with counts or photos, in a constant number of queries however many users there are."""
+    if not (counts or photos):
+        users = UserService.list()
+        click.secho("\n".join(f"{user.id}, {user.email}" for user in users), fg="green")
+        return
+
+    for user, count in UserService.with_photo_counts(load={"photos": "selectin"} if photos else None):
+        click.secho(f"{user.id}, {user.email}, {count} photos", fg="green")
+        for photo in user.photos if photos else ():
+            click.echo(f"    {photo.id}, {photo.title}")
@@ -1,30 +1,140 @@
 import os
 
 
+def engine_options(uri: str) -> dict:
+    """Returns the SQLALCHEMY_ENGINE_OPTIONS for uri, tunable through DB_* environment variables."""
+    if not uri or uri.startswith("sqlite"):
+        return dict(
+            sqlite_pragmas=dict(
+                journal_mode=os.environ.get("DB_JOURNAL_MODE", "WAL"),
+                synchronous=os.environ.get("DB_SYNCHRONOUS", "NORMAL"),
+                mmap_size=int(os.environ.get("DB_MMAP_SIZE", 256 * 1024 * 1024)),
+                busy_timeout=int(os.environ.get("DB_BUSY_TIMEOUT", 5000)),
+            ),
+        )
+    return dict(
+        pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        pool_timeout=float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        pool_pre_ping=os.environ.get("DB_POOL_PRE_PING", "1") == "1",
+        statement_timeout=int(os.environ.get("DB_STATEMENT_TIMEOUT", 30000)),
+    )
+
+
+def replica_binds(uris: str) -> dict:
+    """Returns the SQLALCHEMY_BINDS of the comma separated read replica uris, keyed `replica_<n>`."""
+    return {f"replica_{i}": uri.strip() for i, uri in enumerate(uris.split(",")) if uri.strip()}
+
+
 class Config:
+    ASGI_THREADS = 16
+    BATCH_CHUNK_SIZE = 1000
+    CONTENT_ACCEL_PREFIX = "/protected/thumbnails"
+    CONTENT_OFFLOAD = None
     DEBUG = False
     TESTING = False
+    HASHING_POOL_MAX_PENDING = 64
+    HASHING_POOL_SIZE = 0
+    HASHING_POOL_TIMEOUT = 1.0
+    IDEMPOTENCY_CACHE_SIZE = 10000
+    IDEMPOTENCY_CACHE_TTL = 300
+    IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+    IDEMPOTENCY_LOCK_TIMEOUT = 60
+    INSTRUMENTATION_ENABLED = False
+    INSTRUMENTATION_SLOW_QUERY = 0.1
     JWT_ERROR_MESSAGE_KEY = "message"
+    JWT_REVOCATION_REFRESH = 5.0
     JWT_SECRET_KEY = "super-secret"
+    JWT_STATELESS_IDENTITY = False
+    KDF_ROUNDS = 3000
+    KDF_SALT_SIZE = 16
     LOG_DIR = "."
+    MONITORING_TOKEN = None
+    PURGE_AFTER = 7 * 24 * 60 * 60
+    PURGE_CHUNK_SIZE = 500
+    PURGE_INTERVAL = 0
+    RATELIMIT_BACKEND = "memory"
+    RATELIMIT_LIMITS = {"login_address": (30, 60), "login_email": (10, 300), "signup_address": (10, 3600)}
+    RATELIMIT_MAX_KEYS = 100000
+    RATELIMIT_URL = "redis://localhost:6379/0"
+    RESPONSE_CACHE_BACKEND = "memory"
+    RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    RESPONSE_CACHE_TTL = 300
+    RESPONSE_CACHE_URL = "redis://localhost:6379/0"
+    SQLALCHEMY_BINDS = {}
     SQLALCHEMY_DATABASE_URI = "sqlite://"
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_READ_REPLICAS = []
+    SQLALCHEMY_REPLICA_RETRY = 30
+    SQLALCHEMY_REPLICA_STICKY_BACKEND = "memory"
+    SQLALCHEMY_REPLICA_STICKY_SIZE = 10000
+    SQLALCHEMY_REPLICA_STICKY_TTL = 5
+    SQLALCHEMY_REPLICA_STICKY_URL = "redis://localhost:6379/0"
+    SQLALCHEMY_STRICT_LOADING = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    STREAM_CHUNK_SIZE = 500
+    SWAGGER_ENABLED = True
+    THUMBNAIL_DIR = "thumbnails"
+    THUMBNAIL_FETCH_TIMEOUT = 10.0
+    THUMBNAIL_FILE_SOURCES = False
+    THUMBNAIL_MAX_ATTEMPTS = 3
+    THUMBNAIL_MAX_BYTES = 20 * 1024 * 1024
+    THUMBNAIL_POOL_SIZE = 0
+    THUMBNAIL_SIZES = [128, 512]
+    THUMBNAIL_URL = "/api/thumbnails"
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL = 60
 
 
 class ProductionConfig(Config):
+    ASGI_THREADS = int(os.environ.get("ASGI_THREADS", Config.ASGI_THREADS))
+    CONTENT_ACCEL_PREFIX = os.environ.get("CONTENT_ACCEL_PREFIX", Config.CONTENT_ACCEL_PREFIX)
+    CONTENT_OFFLOAD = os.environ.get("CONTENT_OFFLOAD") or None
+    HASHING_POOL_SIZE = int(os.environ.get("HASHING_POOL_SIZE", os.cpu_count() or 1))
+    INSTRUMENTATION_ENABLED = os.environ.get("INSTRUMENTATION_ENABLED", "1") == "1"
+    KDF_ROUNDS = int(os.environ.get("KDF_ROUNDS", Config.KDF_ROUNDS))
+    JWT_REVOCATION_REFRESH = float(os.environ.get("JWT_REVOCATION_REFRESH", Config.JWT_REVOCATION_REFRESH))
     JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
+    JWT_STATELESS_IDENTITY = os.environ.get("JWT_STATELESS_IDENTITY", "0") == "1"
     LOG_DIR = os.environ.get("LOG_DIR")
+    MONITORING_TOKEN = os.environ.get("MONITORING_TOKEN") or None
+    PURGE_AFTER = int(os.environ.get("PURGE_AFTER", Config.PURGE_AFTER))
+    PURGE_INTERVAL = int(os.environ.get("PURGE_INTERVAL", 60 * 60))
+    RATELIMIT_BACKEND = os.environ.get("RATELIMIT_BACKEND", Config.RATELIMIT_BACKEND) or None
+    RATELIMIT_URL = os.environ.get("RATELIMIT_URL", Config.RATELIMIT_URL)
+    RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", Config.RESPONSE_CACHE_BACKEND)
+    RESPONSE_CACHE_URL = os.environ.get("RESPONSE_CACHE_URL", Config.RESPONSE_CACHE_URL)
     SQLALCHEMY_DATABASE_URI = os.environ.get("SQLALCHEMY_DATABASE_URI")
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_BINDS = replica_binds(os.environ.get("SQLALCHEMY_READ_REPLICA_URIS", ""))
+    SQLALCHEMY_READ_REPLICAS = list(SQLALCHEMY_BINDS)
+    SQLALCHEMY_REPLICA_STICKY_BACKEND = os.environ.get(
+        "SQLALCHEMY_REPLICA_STICKY_BACKEND", Config.SQLALCHEMY_REPLICA_STICKY_BACKEND
+    )
+    SQLALCHEMY_REPLICA_STICKY_TTL = float(os.environ.get("SQLALCHEMY_REPLICA_STICKY_TTL", 5))
+    SQLALCHEMY_REPLICA_STICKY_URL = os.environ.get(
+        "SQLALCHEMY_REPLICA_STICKY_URL", Config.SQLALCHEMY_REPLICA_STICKY_URL
+    )
+    SWAGGER_ENABLED = os.environ.get("SWAGGER_ENABLED", "0") == "1"
+    THUMBNAIL_DIR = os.environ.get("THUMBNAIL_DIR", Config.THUMBNAIL_DIR)
+    THUMBNAIL_POOL_SIZE = int(os.environ.get("THUMBNAIL_POOL_SIZE", os.cpu_count() or 1))
+    THUMBNAIL_URL = os.environ.get("THUMBNAIL_URL", Config.THUMBNAIL_URL)
 
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    INSTRUMENTATION_ENABLED = True
+    THUMBNAIL_FILE_SOURCES = True
     SQLALCHEMY_DATABASE_URI = "sqlite:////tmp/temp.db"
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = True
 
 
 class TestConfig(Config):
     TESTING = True
+    SQLALCHEMY_STRICT_LOADING = True
+    THUMBNAIL_FILE_SOURCES = True
     SQLALCHEMY_DATABASE_URI = "sqlite://"
 
 
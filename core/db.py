@@ -1,3 +1,302 @@
-from flask_sqlalchemy import SQLAlchemy
+import hashlib
+import math
+import time
+import typing
+import weakref
+from threading import Lock
 
-db = SQLAlchemy()
+import sqlalchemy
+from flask import Flask, has_request_context, request
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm
+from sqlalchemy.exc import InvalidRequestError, OperationalError
+from sqlalchemy.orm.interfaces import UserDefinedOption
+from sqlalchemy.pool import QueuePool
+
+from core.cache import RedisBackend, RedisError, TTLCache
+
+
+class TimedQueuePool(QueuePool):
+    """A QueuePool that records how long checkouts waited for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_time = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.checkouts += 1
+            self.wait_time += time.perf_counter() - start
+
+
+def set_sqlite_pragmas(pragmas: dict):
+    def on_connect(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    return on_connect
+
+
+def set_statement_timeout(dialect: str, timeout: int):
+    statement = {
+        "postgresql": f"SET statement_timeout = {timeout:d}",
+        "mysql": f"SET SESSION max_execution_time = {timeout:d}",
+    }.get(dialect)
+
+    def on_connect(dbapi_connection, _):
+        if statement:
+            cursor = dbapi_connection.cursor()
+            cursor.execute(statement)
+            cursor.close()
+
+    return on_connect
+
+
+class ReplicaSet:
+    """The read replicas, taken in turn, skipping for `retry` seconds those that failed."""
+
+    def __init__(self, keys: typing.List[str] = (), retry: float = 30):
+        self.keys = list(keys)
+        self.retry = retry
+        self._next = 0
+        self._down = {}
+        self._lock = Lock()
+
+    def choose(self) -> typing.Optional[str]:
+        """Returns the key of the next healthy replica, or None when there is none."""
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.keys)):
+                key = self.keys[self._next % len(self.keys)]
+                self._next += 1
+                if self._down.get(key, 0) <= now:
+                    return key
+        return None
+
+    def is_up(self, key: str) -> bool:
+        return self._down.get(key, 0) <= time.monotonic()
+
+    def mark_down(self, key: str):
+        with self._lock:
+            self._down[key] = time.monotonic() + self.retry
+
+    @property
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return dict(replicas=len(self.keys), down=sum(until > now for until in self._down.values()))
+
+
+class RedisStickyClients:
+    """Remembers the clients that wrote recently in a Redis-compatible server, which every worker process sees.
+
+    Keys are hashed, so credentials are not stored. When the server cannot be
+    reached, every client is taken to have written, so reads go to the primary.
+    """
+
+    def __init__(self, url: str, ttl: float):
+        self.redis = RedisBackend(url)
+        self.ttl = max(1, math.ceil(ttl))
+
+    def get(self, key: str) -> bool:
+        try:
+            return self.redis.command("GET", self._key(key)) is not None
+        except (OSError, RedisError):
+            self.redis._close()
+            return True
+
+    def set(self, key: str, value=True):
+        self.redis.set(self._key(key), b"1", ttl=self.ttl)
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return "sticky:" + hashlib.sha256(key.encode()).hexdigest()
+
+
+def sticky_key() -> typing.Optional[str]:
+    """Identifies the client of the current request, by its credentials or else its address"""
+    if not has_request_context():
+        return None
+    return request.headers.get("Authorization") or request.remote_addr
+
+
+class RoutingSession(SignallingSession):
+    """Sends the statements executed with the `replica` execution option to a read replica.
+
+    Everything else goes to the primary, and so does every statement once the
+    session wrote or `use_primary` was called, and for `SQLALCHEMY_REPLICA_STICKY_TTL`
+    seconds after the same client wrote, so clients always read their own writes.
+    With `SQLALCHEMY_REPLICA_STICKY_BACKEND = "redis"` that holds across worker
+    processes too; in memory, only for the process that handled the write.
+    A read that fails on a replica is retried on the next one, or the primary.
+    Reads keep going to the same replica for the rest of the session.
+    """
+
+    def __init__(self, db, **options):
+        super().__init__(db, **options)
+        self.db = db
+        self.primary = False
+        self.replica = None
+        self._pinned = None
+        self._sticky = None
+
+    def use_primary(self):
+        self.primary = True
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        key = sticky_key()
+        if self._flushing or getattr(clause, "is_dml", False):
+            self.primary = True
+            if key is not None and key != self._sticky:
+                self.db.sticky.set(key, True)
+                self._sticky = key
+        elif (
+            not self.primary
+            and clause is not None
+            and clause._execution_options.get("replica")
+            and (key is None or not self.db.sticky.get(key))
+        ):
+            # A session keeps reading from the same replica, so what it reads is never newer than what it read before.
+            if self._pinned is None or not self.db.replicas.is_up(self._pinned):
+                self._pinned = self.db.replicas.choose()
+            self.replica = self._pinned
+            if self.replica is not None:
+                return self.db.get_replica_engine(self.app, self.replica)
+        self.replica = None
+        return super().get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def retry_replica_reads(state):
+    """Retries a read that failed on a replica, which is then marked down, on the next one or else on the primary."""
+    session = state.session
+    if (
+        not state.is_select
+        or not state.execution_options.get("replica")
+        or session.primary
+        or not session.db.replicas.keys
+    ):
+        return None
+    for _ in range(len(session.db.replicas.keys)):
+        try:
+            return state.invoke_statement()
+        except OperationalError:
+            if session.replica is None:
+                raise
+    session.primary = True
+    try:
+        return state.invoke_statement()
+    finally:
+        session.primary = False
+
+
+class LazyLoadError(InvalidRequestError):
+    """Raised when a relationship is lazy loaded while `SQLALCHEMY_STRICT_LOADING` is set."""
+
+
+class LazyLoadChosen(UserDefinedOption):
+    """Marks the relationship of a mapper, by name or `*` for all of them, that a query chose to lazy load.
+
+    It propagates to the loaded objects, so strict loading lets their lazy loads through.
+    """
+
+    propagate_to_loaders = True
+
+    def __init__(self, mapper, name: str):
+        super().__init__((mapper, name))
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def refuse_lazy_loads(state):
+    """Fails lazy loads in strict loading mode, so a missing loading strategy shows up before it makes N+1 queries.
+
+    Relationships a query chose to lazy load, marked with `LazyLoadChosen`, are still loaded.
+    """
+    if state.is_select and state.lazy_loaded_from is not None and state.session.app.config["SQLALCHEMY_STRICT_LOADING"]:
+        relationship = state.loader_strategy_path[-1]
+        mapper = state.lazy_loaded_from.mapper
+        chosen = {option.payload for option in state.user_defined_options if isinstance(option, LazyLoadChosen)}
+        if (mapper, relationship.key) in chosen or (mapper, "*") in chosen:
+            return
+        raise LazyLoadError(f"{relationship} was lazy loaded; choose a loading strategy for it.")
+
+
+class Database(SQLAlchemy):
+    """SQLAlchemy extension understanding two extra engine options and read replicas.
+
+    `sqlite_pragmas` are set on every new SQLite connection and
+    `statement_timeout`, in milliseconds, on every new connection of
+    the backends supporting it. Pools default to `TimedQueuePool`.
+
+    `SQLALCHEMY_READ_REPLICAS` lists the `SQLALCHEMY_BINDS` keys of the read
+    replicas, see `RoutingSession` for what is read from them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.replicas = ReplicaSet()
+        self.sticky = TTLCache("SQLALCHEMY_REPLICA_STICKY")
+        self._watched = weakref.WeakSet()
+        super().__init__(*args, **kwargs)
+
+    def init_app(self, app: Flask):
+        super().init_app(app)
+        self.replicas = ReplicaSet(app.config["SQLALCHEMY_READ_REPLICAS"], app.config["SQLALCHEMY_REPLICA_RETRY"])
+        if app.config["SQLALCHEMY_REPLICA_STICKY_BACKEND"] == "redis":
+            self.sticky = RedisStickyClients(
+                app.config["SQLALCHEMY_REPLICA_STICKY_URL"], app.config["SQLALCHEMY_REPLICA_STICKY_TTL"]
+            )
+        else:
+            self.sticky = TTLCache("SQLALCHEMY_REPLICA_STICKY")
+            self.sticky.init_app(app)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def get_replica_engine(self, app: Flask, key: str):
+        """Returns the engine of the replica key, which is marked down when it fails to execute a statement."""
+        engine = self.get_engine(app, bind=key)
+        if engine not in self._watched:
+
+            def on_error(context):
+                if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+                    self.replicas.mark_down(key)
+
+            event.listen(engine, "handle_error", on_error)
+            self._watched.add(engine)
+        return engine
+
+    def create_engine(self, sa_url, engine_opts):
+        pragmas = engine_opts.pop("sqlite_pragmas", None)
+        statement_timeout = engine_opts.pop("statement_timeout", None)
+        if sa_url.get_backend_name() != "sqlite":
+            engine_opts.setdefault("poolclass", TimedQueuePool)
+
+        engine = sqlalchemy.create_engine(sa_url, **engine_opts)
+        if pragmas and sa_url.get_backend_name() == "sqlite":
+            event.listen(engine, "connect", set_sqlite_pragmas(pragmas))
+        if statement_timeout:
+            event.listen(engine, "connect", set_statement_timeout(sa_url.get_backend_name(), statement_timeout))
+        return engine
+
+    def pool_stats(self, bind=None) -> dict:
+        """Returns the connection pool usage of the current application's engine."""
+        pool = self.get_engine(bind=bind).pool
+        stats = dict(type=type(pool).__name__)
+        if isinstance(pool, QueuePool):
+            stats.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        if isinstance(pool, TimedQueuePool):
+            stats.update(checkouts=pool.checkouts, wait_time=pool.wait_time)
+        return stats
+
+
+db = Database()
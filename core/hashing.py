@@ -0,0 +1,99 @@
+import typing
+from functools import lru_cache
+from threading import BoundedSemaphore, Lock
+
+from flask import Flask
+from passlib.context import CryptContext
+
+
+class HashingPoolBusy(Exception):
+    """Raised when too many passwords are already waiting to be hashed."""
+
+
+@lru_cache()
+def _context(rounds: int, salt_size: int) -> CryptContext:
+    return CryptContext(
+        schemes=["pbkdf2_sha256"],
+        pbkdf2_sha256__rounds=rounds,
+        pbkdf2_sha256__salt_size=salt_size,
+    )
+
+
+def _hash(password: str, rounds: int, salt_size: int) -> str:
+    return _context(rounds, salt_size).hash(password)
+
+
+def _verify_and_update(password: str, hash: str, rounds: int, salt_size: int) -> typing.Tuple[bool, str]:
+    return _context(rounds, salt_size).verify_and_update(password, hash)
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a bounded process pool.
+
+    The key derivation is CPU-bound, so it runs in `HASHING_POOL_SIZE` worker
+    processes instead of the request thread (inline when it is `0`). At most
+    `HASHING_POOL_MAX_PENDING` passwords may be in flight; callers wait up to
+    `HASHING_POOL_TIMEOUT` seconds for a slot before `HashingPoolBusy` is raised.
+    """
+
+    def __init__(self):
+        self.rounds = 3000
+        self.salt_size = 16
+        self.timeout = 1.0
+        self.pending = 0
+        self._slots = BoundedSemaphore(64)
+        self._lock = Lock()
+        self._pool_size = 0
+        self._executor = None
+
+    def init_app(self, app: Flask):
+        self.shutdown()
+        self.rounds = app.config["KDF_ROUNDS"]
+        self.salt_size = app.config["KDF_SALT_SIZE"]
+        self.timeout = app.config["HASHING_POOL_TIMEOUT"]
+        self._slots = BoundedSemaphore(app.config["HASHING_POOL_MAX_PENDING"])
+        self._pool_size = app.config["HASHING_POOL_SIZE"]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.rounds, self.salt_size)
+
+    def verify(self, password: str, hash: str) -> bool:
+        return self.verify_and_update(password, hash)[0]
+
+    def verify_and_update(self, password: str, hash: str) -> typing.Tuple[bool, typing.Optional[str]]:
+        """Returns whether password matches hash, and a new hash if hash uses outdated parameters."""
+        return self._run(_verify_and_update, password, hash, self.rounds, self.salt_size)
+
+    @property
+    def stats(self) -> dict:
+        return dict(pending=self.pending, workers=self._pool_size)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingPoolBusy()
+        with self._lock:
+            self.pending += 1
+        try:
+            if not self._pool_size:
+                return fn(*args)
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+            self._slots.release()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ProcessPoolExecutor
+
+                self._executor = ProcessPoolExecutor(max_workers=self._pool_size)
+            return self._executor
+
+
+hasher = PasswordHasher()
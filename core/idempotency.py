@@ -0,0 +1,140 @@
+import hashlib
+import json
+import typing
+from datetime import datetime, timedelta
+from functools import wraps
+from http import HTTPStatus
+
+from flask import Flask, Response, current_app, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+
+from core.cache import TTLCache
+from core.db import db
+from core.models import IdempotencyKeyModel
+
+REPLAYED_HEADERS = ("Content-Type", "ETag", "Location")
+
+
+class IdempotencyKeyInFlight(Exception):
+    """Raised when a request repeats the `Idempotency-Key` of a request that is still being handled."""
+
+
+class IdempotencyKeyReused(Exception):
+    """Raised when an `Idempotency-Key` is sent again with a different request."""
+
+
+class IdempotencyKeys:
+    """The responses to requests with an `Idempotency-Key` header, kept for `IDEMPOTENCY_KEY_TTL` seconds.
+
+    They are stored in the `idempotency_keys` table, which every process sees,
+    and the most recent ones in memory, so a retry is usually answered without
+    a query. The first request claims its key by inserting it, so concurrent
+    duplicates fail to and are told to retry once it is answered.
+    """
+
+    def __init__(self):
+        self.ttl = 24 * 60 * 60
+        self.lock_timeout = 60
+        self.cache = TTLCache("IDEMPOTENCY_CACHE")
+
+    def init_app(self, app: Flask):
+        self.ttl = app.config["IDEMPOTENCY_KEY_TTL"]
+        self.lock_timeout = app.config["IDEMPOTENCY_LOCK_TIMEOUT"]
+        self.cache.init_app(app)
+
+    def claim(self, key: str, fingerprint: str) -> typing.Optional[Response]:
+        """Claims key for the request with fingerprint; returns the stored response instead if it was answered."""
+        entry = self.cache.get(key)
+        if entry is None:
+            now = datetime.utcnow()
+            db.session.query(IdempotencyKeyModel).filter(IdempotencyKeyModel.expires_at < now).delete()
+            db.session.add(
+                IdempotencyKeyModel(
+                    key=key, fingerprint=fingerprint, expires_at=now + timedelta(seconds=self.lock_timeout)
+                )
+            )
+            try:
+                db.session.commit()
+                return None
+            except IntegrityError:
+                db.session.rollback()
+            entry = db.session.query(IdempotencyKeyModel).get(key)
+            if entry is None:
+                raise IdempotencyKeyInFlight()  # It expired in between, so it was just claimed again.
+            db.session.expunge(entry)
+            if entry.status is not None:
+                self.cache.set(key, entry)
+
+        if entry.fingerprint != fingerprint:
+            raise IdempotencyKeyReused()
+        if entry.status is None:
+            raise IdempotencyKeyInFlight()
+        headers = dict(json.loads(entry.headers), **{"Idempotent-Replayed": "true"})
+        return Response(entry.body, status=entry.status, headers=headers)
+
+    def complete(self, key: str, fingerprint: str, response: Response):
+        """Stores the response to the request that claimed key, for its retries."""
+        entry = IdempotencyKeyModel(
+            key=key,
+            fingerprint=fingerprint,
+            status=response.status_code,
+            headers=json.dumps({name: response.headers[name] for name in REPLAYED_HEADERS if name in response.headers}),
+            body=response.get_data(),
+            expires_at=datetime.utcnow() + timedelta(seconds=self.ttl),
+        )
+        db.session.merge(entry)
+        db.session.commit()
+        self.cache.set(key, entry)
+
+    def release(self, key: str):
+        """Forgets the claim of key, after its request failed, so a retry is handled again."""
+        db.session.rollback()
+        db.session.query(IdempotencyKeyModel).filter_by(key=key).delete()
+        db.session.commit()
+
+
+def request_fingerprint() -> str:
+    """The digest of what makes a request the same request: its method, URL and body."""
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.full_path.encode(), request.get_data()):
+        digest.update(b"%d:%s" % (len(part), part))
+    return digest.hexdigest()
+
+
+def idempotent(fn):
+    """A decorator that answers the retries of a request with an `Idempotency-Key` header with its first response.
+
+    Keys are scoped to the authenticated user, if any. Server errors are not
+    stored, so their retries are handled again.
+    """
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return fn(*args, **kwargs)
+        if len(key) > 255:
+            return dict(message="The Idempotency-Key is longer than 255 characters."), HTTPStatus.BAD_REQUEST
+
+        key = f"{get_jwt_identity() or ''}:{key}"
+        fingerprint = request_fingerprint()
+        replay = idempotency_keys.claim(key, fingerprint)
+        if replay is not None:
+            return replay
+
+        try:
+            response = current_app.make_response(fn(*args, **kwargs))
+        except Exception:
+            idempotency_keys.release(key)
+            raise
+        if response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR:
+            idempotency_keys.release(key)
+        else:
+            idempotency_keys.complete(key, fingerprint, response)
+        return response
+
+    return wrapper
+
+
+idempotency_keys = IdempotencyKeys()
@@ -0,0 +1,45 @@
+import json
+import typing
+from http import HTTPStatus
+
+from marshmallow import ValidationError
+
+from core.schemas import PhotoSchema
+from core.services import PhotoService
+from core.utils import chunked
+
+
+def parse_ndjson(lines: typing.Iterable) -> typing.Iterator:
+    """Yield the object of every non-blank line, or None when a line is not valid JSON."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def ingest_photos(records: typing.Iterable, user_id: int, chunk_size: int) -> typing.Iterator[dict]:
+    """Validates and inserts photo records a chunk at a time, yielding one result per record.
+
+    Each chunk is validated in a single schema pass and its valid records are
+    inserted with one executemany statement in their own transaction.
+    """
+    schema = PhotoSchema(many=True, as_model=False)
+    defaults = dict.fromkeys(schema.load_fields, None)
+    offset = 0
+    for chunk in chunked(records, chunk_size):
+        try:
+            rows, errors = schema.load(chunk), {}
+        except ValidationError as err:
+            rows, errors = err.valid_data, err.messages
+        valid = [dict(defaults, **row, user_id=user_id) for index, row in enumerate(rows) if index not in errors]
+        if valid:
+            PhotoService.bulk_save(valid)
+        for index in range(len(chunk)):
+            if index in errors:
+                yield dict(index=offset + index, status=HTTPStatus.UNPROCESSABLE_ENTITY, errors=errors[index])
+            else:
+                yield dict(index=offset + index, status=HTTPStatus.CREATED)
+        offset += len(chunk)
@@ -0,0 +1,208 @@
+import hmac
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from http import HTTPStatus
+from threading import Lock
+
+from flask import Flask, Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.exceptions import NotFound
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Instrumentation:
+    """Measures requests and the statements they execute.
+
+    When `INSTRUMENTATION_ENABLED`, every response gets a `Server-Timing`
+    header (db, serialize, auth and total durations), statements slower than
+    `INSTRUMENTATION_SLOW_QUERY` seconds are logged without their parameters
+    and `/metrics` serves the counters in the Prometheus text format to
+    scrapers sending `MONITORING_TOKEN` as their bearer token; it is not
+    found when no token is configured.
+    When disabled no hook is installed and `timing` is a no-op.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_query = None
+        self.gauges = {}
+        self._lock = Lock()
+        self._listening = False
+        self.reset()
+
+    def init_app(self, app: Flask):
+        self.enabled = app.config["INSTRUMENTATION_ENABLED"]
+        self.slow_query = app.config["INSTRUMENTATION_SLOW_QUERY"]
+        self.reset()
+        if not self.enabled:
+            return
+
+        if not self._listening:
+            event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+            self._listening = True
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule("/metrics", "metrics", self.metrics)
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.durations = defaultdict(lambda: [0] * (len(BUCKETS) + 1) + [0.0])
+            self.queries = defaultdict(int)
+            self.query_durations = defaultdict(float)
+            self.slow_queries = 0
+
+    def gauge(self, name: str, help: str, collect):
+        """Registers a gauge whose labelled values, a dict, are collected on every scrape."""
+        self.gauges[name] = (help, collect)
+
+    def timing(self, name: str):
+        """Returns a context manager adding the time spent in its block to the request's name timing."""
+        if not self.enabled or not has_app_context() or "timings" not in g:
+            return nullcontext()
+        return self._timing(name)
+
+    @contextmanager
+    def _timing(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            g.timings[name] += time.perf_counter() - start
+
+    def metrics(self):
+        if not current_app.config["MONITORING_TOKEN"]:
+            raise NotFound()
+        if not monitoring_authorized():
+            return Response("Unauthorized.\n", HTTPStatus.UNAUTHORIZED, {"WWW-Authenticate": "Bearer"})
+        lines = []
+
+        def metric(name, kind, help, samples):
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}"])
+            lines.extend(f"{sample}{format_labels(labels)} {value}" for sample, labels, value in samples)
+
+        with self._lock:
+            metric(
+                "http_requests_total",
+                "counter",
+                "Requests handled, by endpoint, method and status.",
+                [
+                    ("http_requests_total", dict(endpoint=endpoint, method=method, status=status), value)
+                    for (endpoint, method, status), value in sorted(self.requests.items())
+                ],
+            )
+            samples = []
+            for endpoint, histogram in sorted(self.durations.items()):
+                for bound, value in zip(BUCKETS + ("+Inf",), histogram):
+                    samples.append(("http_request_duration_seconds_bucket", dict(endpoint=endpoint, le=bound), value))
+                samples.append(("http_request_duration_seconds_sum", dict(endpoint=endpoint), histogram[-1]))
+                samples.append(("http_request_duration_seconds_count", dict(endpoint=endpoint), histogram[-2]))
+            metric("http_request_duration_seconds", "histogram", "Request durations, by endpoint.", samples)
+            metric(
+                "db_queries_total",
+                "counter",
+                "Statements executed, by endpoint.",
+                [
+                    ("db_queries_total", dict(endpoint=endpoint), value)
+                    for endpoint, value in sorted(self.queries.items())
+                ],
+            )
+            metric(
+                "db_query_duration_seconds_total",
+                "counter",
+                "Time spent executing statements, by endpoint.",
+                [
+                    ("db_query_duration_seconds_total", dict(endpoint=endpoint), value)
+                    for endpoint, value in sorted(self.query_durations.items())
+                ],
+            )
+            metric(
+                "db_slow_queries_total",
+                "counter",
+                "Statements slower than the slow query threshold.",
+                [("db_slow_queries_total", {}, self.slow_queries)],
+            )
+
+        for name, (help, collect) in sorted(self.gauges.items()):
+            samples = [
+                (name, dict(key=key), value) for key, value in collect().items() if isinstance(value, (int, float))
+            ]
+            metric(name, "gauge", help, samples)
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+    def _before_request(self):
+        g.timings = defaultdict(float)
+        g.queries = 0
+        g.request_start = time.perf_counter()
+
+    def _after_request(self, response: Response) -> Response:
+        total = time.perf_counter() - g.request_start
+        endpoint = request.endpoint or "none"
+        timings = dict(g.timings, total=total)
+        response.headers["Server-Timing"] = ", ".join(
+            f"{name};dur={duration * 1000:.2f}" + (f';desc="{g.queries} queries"' if name == "db" else "")
+            for name, duration in timings.items()
+        )
+
+        with self._lock:
+            self.requests[(endpoint, request.method, response.status_code)] += 1
+            histogram = self.durations[endpoint]
+            for i, bound in enumerate(BUCKETS):
+                if total <= bound:
+                    histogram[i] += 1
+            histogram[len(BUCKETS)] += 1
+            histogram[-1] += total
+            self.queries[endpoint] += g.queries
+            self.query_durations[endpoint] += timings.get("db", 0.0)
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled:
+            conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.enabled or not conn.info.get("query_start"):
+            return
+        duration = time.perf_counter() - conn.info["query_start"].pop()
+        if not has_app_context():
+            return
+        if "timings" in g:
+            g.timings["db"] += duration
+            g.queries += 1
+        if self.slow_query is not None and duration >= self.slow_query:
+            with self._lock:
+                self.slow_queries += 1
+            current_app.logger.warning(
+                "Slow query (%.1f ms): %s; parameters: %s", duration * 1000, statement, redact(parameters)
+            )
+
+
+def monitoring_authorized() -> bool:
+    """Whether the request sends `MONITORING_TOKEN` as its bearer token; never when no token is configured."""
+    token = current_app.config["MONITORING_TOKEN"]
+    sent = request.headers.get("Authorization", "")
+    return bool(token) and hmac.compare_digest(sent.encode(), f"Bearer {token}".encode())
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def redact(parameters) -> str:
+    """Describe bound parameters by their types only, so no value reaches the logs"""
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: <{type(value).__name__}>" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return f"<{len(parameters)} rows>"
+        return "(" + ", ".join(f"<{type(value).__name__}>" for value in parameters) + ")"
+    return "<redacted>"
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,54 @@
+import typing
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import Column, CreateIndex, CreateTable, DDLElement, MetaData, Table
+
+
+class AddColumn(DDLElement):
+    def __init__(self, table: Table, column: Column):
+        self.table = table
+        self.column = column
+
+
+@compiles(AddColumn)
+def visit_add_column(element: AddColumn, compiler, **kwargs) -> str:
+    return "ALTER TABLE {} ADD COLUMN {}".format(
+        compiler.preparer.format_table(element.table),
+        compiler.get_column_specification(element.column),
+    )
+
+
+def pending_migrations(engine: Engine, metadata: MetaData, search_indexes=()) -> typing.Iterator[DDLElement]:
+    """Yield the statements that bring the database schema up to date with metadata.
+
+    Missing tables, columns and indexes are created, and so are the missing
+    full-text search_indexes; nothing is ever altered or dropped, so it is
+    safe to run against a database that is already up to date.
+    """
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    for table in metadata.sorted_tables:
+        if table.name not in tables:
+            yield CreateTable(table)
+            yield from (CreateIndex(index) for index in table.indexes)
+            continue
+
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        yield from (AddColumn(table, column) for column in table.columns if column.name not in columns)
+
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        yield from (CreateIndex(index) for index in table.indexes if index.name not in indexes)
+
+    for search_index in search_indexes:
+        yield from search_index.pending_migrations(engine)
+
+
+def upgrade(engine: Engine, metadata: MetaData, search_indexes=()) -> typing.List[DDLElement]:
+    """Applies the pending migrations in a single transaction and returns them."""
+    statements = list(pending_migrations(engine, metadata, search_indexes))
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.execute(statement)
+    return statements
@@ -1,7 +1,16 @@
+from .album import AlbumModel, AlbumPhotoModel
+from .idempotency import IdempotencyKeyModel
 from .photo import PhotoModel
+from .thumbnail import ThumbnailJobModel
+from .token import RevokedTokenModel
 from .user import UserModel
 
 __all__ = [
+    "AlbumModel",
+    "AlbumPhotoModel",
+    "IdempotencyKeyModel",
     "PhotoModel",
+    "RevokedTokenModel",
+    "ThumbnailJobModel",
     "UserModel",
 ]
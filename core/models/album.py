@@ -0,0 +1,40 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer, Text
+from sqlalchemy.orm import relationship
+
+from core.db import db
+
+from .mixins import VersionMixin
+
+
+class AlbumModel(db.Model, VersionMixin):
+    __tablename__ = "albums"
+    __table_args__ = (
+        # Covers listing a user's albums in key order and looking one up by id and owner.
+        Index("ix_albums_user_id_id", "user_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    title = Column(Text, nullable=False)
+    description = Column(Text)
+    # Kept up to date in the transactions adding and removing photos, see `AlbumService`.
+    photo_count = Column(Integer, nullable=False, default=0, server_default="0")
+    cover_photo_id = Column(Integer, ForeignKey("photos.id", ondelete="SET NULL"))
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    cover = relationship("PhotoModel", lazy="joined")
+
+
+class AlbumPhotoModel(db.Model):
+    """A photo of an album, at its position in the album."""
+
+    __tablename__ = "album_photos"
+    __table_args__ = (
+        # Covers listing an album's photos in order.
+        Index("ix_album_photos_album_id_position", "album_id", "position"),
+        # Covers finding the albums of a photo when it is removed.
+        Index("ix_album_photos_photo_id", "photo_id"),
+    )
+
+    album_id = Column(Integer, ForeignKey("albums.id", ondelete="CASCADE"), primary_key=True)
+    photo_id = Column(Integer, ForeignKey("photos.id", ondelete="CASCADE"), primary_key=True)
+    position = Column(Integer, nullable=False)
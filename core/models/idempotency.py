@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, Text
+
+from core.db import db
+
+
+class IdempotencyKeyModel(db.Model):
+    """The response to a request with an `Idempotency-Key`, replayed to its retries until it expires.
+
+    While the request is in flight, status is null and the row expires soon,
+    so a key claimed by a process that died is released.
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    key = Column(Text, primary_key=True)
+    fingerprint = Column(Text, nullable=False)
+    status = Column(Integer)
+    headers = Column(Text)
+    body = Column(LargeBinary)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -1,19 +1,42 @@
-from os import urandom
+import typing
+from datetime import datetime
 
-from passlib.handlers.pbkdf2 import pbkdf2_sha256
+from sqlalchemy import Column, DateTime, Integer
+from sqlalchemy.ext.declarative import declared_attr
 
+from core.hashing import hasher
 
-class CryptMixin:
-    SALT_LENGTH = 16
 
+class CryptMixin:
     @classmethod
     def hash(cls, password):
-        settings = dict(
-            rounds=3000,
-            salt=urandom(cls.SALT_LENGTH),
-        )
-        return pbkdf2_sha256.using(**settings).hash(password)
+        return hasher.hash(password)
 
     @staticmethod
     def verify(password, hash):
-        return pbkdf2_sha256.verify(password, hash)
+        return hasher.verify(password, hash)
+
+    @staticmethod
+    def verify_and_update(password, hash) -> typing.Tuple[bool, typing.Optional[str]]:
+        return hasher.verify_and_update(password, hash)
+
+
+class VersionMixin:
+    """Versions rows, incrementing `version` on every update.
+
+    Updates are made conditional on the version that was loaded, so a
+    concurrent change raises `StaleDataError` instead of being overwritten.
+    """
+
+    version = Column(Integer, nullable=False, server_default="1")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.version}
+
+
+class SoftDeleteMixin:
+    """Marks rows deleted with `deleted_at` instead of deleting them; `Service` queries skip them until they are purged."""
+
+    deleted_at = Column(DateTime, index=True)
@@ -1,15 +1,23 @@
-from sqlalchemy import Column, Integer, Text
+from sqlalchemy import Column, Index, Integer, Text
 from sqlalchemy.sql.schema import ForeignKey
 
 from core.db import db
 
+from .mixins import SoftDeleteMixin, VersionMixin
 
-class PhotoModel(db.Model):
+
+class PhotoModel(db.Model, SoftDeleteMixin, VersionMixin):
     __tablename__ = "photos"
+    __table_args__ = (
+        # Covers listing a user's photos in key order and looking one up by id and owner.
+        Index("ix_photos_user_id_id", "user_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     title = Column(Text)
     url = Column(Text)
     description = Column(Text)
+    # SHA-256 of the image the thumbnails were rendered from, see `core.thumbnails`.
+    thumbnail = Column(Text)
 
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, Text
+
+from core.db import db
+
+
+class ThumbnailJobModel(db.Model):
+    """The thumbnails to render for a photo, whether they were and how many times it was tried."""
+
+    __tablename__ = "thumbnail_jobs"
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    photo_id = Column(Integer, ForeignKey("photos.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(Text, nullable=False, default=PENDING, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, DateTime, Integer, Text
+
+from core.db import db
+
+
+class RevokedTokenModel(db.Model):
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True)
+    jti = Column(Text, nullable=False, unique=True)
+    # Once the token expires it is rejected anyway, so the row can be dropped.
+    expires_at = Column(DateTime, nullable=False, index=True)
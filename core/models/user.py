@@ -3,17 +3,24 @@ from sqlalchemy.orm import relationship
 
 from core.db import db
 
-from .mixins import CryptMixin
+from .mixins import CryptMixin, VersionMixin
 
 
-class UserModel(db.Model, CryptMixin):
+class UserModel(db.Model, CryptMixin, VersionMixin):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True)
     name = Column(Text)
     email = Column(Text, unique=True)
     _password = Column("password", Text)
-    photos = relationship("PhotoModel", backref="user", lazy=True)
+    photos = relationship(
+        "PhotoModel",
+        backref="user",
+        lazy=True,
+        primaryjoin="and_(UserModel.id == PhotoModel.user_id, PhotoModel.deleted_at.is_(None))",
+    )
+    # Incremented whenever one of the user's photos is created, updated or removed.
+    photos_version = Column(Integer, nullable=False, server_default="1")
 
     @property
     def password(self) -> str:
@@ -24,7 +31,11 @@ class UserModel(db.Model, CryptMixin):
         self._password = self.hash(password)
 
     def check_password(self, password: str) -> bool:
-        return self.verify(password, self.password)
+        """Checks password, rehashing it when the stored hash uses outdated KDF parameters."""
+        valid, new_hash = self.verify_and_update(password, self.password)
+        if new_hash:
+            self._password = new_hash
+        return valid
 
     def __repr__(self) -> str:
         return f"<User {self.email}>"
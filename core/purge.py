@@ -0,0 +1,70 @@
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Lock
+
+from flask import Flask, current_app
+
+
+class Purger:
+    """Hard deletes soft-deleted rows on a background thread, at most every `PURGE_INTERVAL` seconds.
+
+    Purges are started by deletes, so a process that deletes nothing never
+    runs one; `flask photo purge` runs one on demand. Rows are purged
+    `PURGE_AFTER` seconds after they were deleted, `PURGE_CHUNK_SIZE` at a time.
+    """
+
+    def __init__(self):
+        self.interval = 0
+        self.retention = 7 * 24 * 60 * 60
+        self.chunk_size = 500
+        self.purged = 0
+        self._next_purge = 0.0
+        self._lock = Lock()
+        self._executor = None
+
+    def init_app(self, app: Flask):
+        self.shutdown()
+        self.interval = app.config["PURGE_INTERVAL"]
+        self.retention = app.config["PURGE_AFTER"]
+        self.chunk_size = app.config["PURGE_CHUNK_SIZE"]
+        self.purged = 0
+        self._next_purge = 0.0
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def cutoff(self) -> datetime:
+        """Returns when the rows purged now were deleted, at the latest."""
+        return datetime.utcnow() - timedelta(seconds=self.retention)
+
+    def schedule(self, purge: typing.Callable[[datetime, int], int]):
+        """Calls purge with `cutoff()` and the chunk size on the background thread, unless it is not due yet."""
+        if not self.interval:
+            return None
+        app = current_app._get_current_object()
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_purge:
+                return None
+            self._next_purge = now + self.interval
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="purge")
+            return self._executor.submit(self._run, app, purge)
+
+    def _run(self, app: Flask, purge):
+        with app.app_context():
+            try:
+                self.purged += purge(self.cutoff(), self.chunk_size)
+            except Exception:
+                app.logger.exception("Purging deleted rows failed.")
+
+    @property
+    def stats(self) -> dict:
+        return dict(purged=self.purged, interval=self.interval)
+
+
+purger = Purger()
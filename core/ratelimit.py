@@ -0,0 +1,162 @@
+import math
+import time
+import typing
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+from flask import Flask, request
+
+from core.cache import RedisBackend, RedisError
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request goes over a rate limit; retry_after is how many seconds until one is allowed again."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Rate limit exceeded, retry after {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class MemoryWindows:
+    """Counts the hits of every key in its current and previous window, in process memory.
+
+    Each worker process counts on its own, so a client may get up to the limit
+    from every worker. Beyond `max_keys`, the least recently hit keys are forgotten.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def hit(self, key: str, window: int, ttl: int) -> typing.Tuple[int, int]:
+        """Counts a hit of key in window and returns the hits of the previous window and of this one."""
+        with self._lock:
+            last, previous, current = self._entries.pop(key, (window, 0, 0))
+            if last == window - 1:
+                previous, current = current, 0
+            elif last != window:
+                previous, current = 0, 0
+            current += 1
+            self._entries[key] = (window, previous, current)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+            return previous, current
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisWindows:
+    """Counts the hits of every key in its current and previous window in a Redis-compatible server.
+
+    Every worker process shares the counts. A hit is a single round trip and,
+    like the response cache, an unreachable server never fails a request: its
+    hits are not counted.
+    """
+
+    def __init__(self, url: str):
+        self.redis = RedisBackend(url)
+
+    def hit(self, key: str, window: int, ttl: int) -> typing.Tuple[int, int]:
+        current_key = f"{key}:{window}"
+        try:
+            current, _, previous = self.redis.pipeline(
+                ("INCR", current_key), ("EXPIRE", current_key, ttl), ("GET", f"{key}:{window - 1}")
+            )
+        except (OSError, RedisError):
+            return 0, 0
+        return int(previous or 0), current
+
+
+def client_address() -> str:
+    """The address of the client; behind a proxy, it must be set from `X-Forwarded-For` by the proxy's middleware."""
+    return request.remote_addr
+
+
+def credentials_email() -> typing.Optional[str]:
+    """The e-mail of the credentials in the JSON body, read without validating the rest of it."""
+    body = request.get_json(silent=True)
+    email = body.get("email") if isinstance(body, dict) else None
+    return email.strip().lower() if isinstance(email, str) else None
+
+
+class RateLimiter:
+    """Limits how often a client may call a view with sliding windows.
+
+    Limits are named, as `name: (limit, period)` in `RATELIMIT_LIMITS`, and
+    counted per key, such as the client address. A request is allowed while
+    the hits of the last period, estimated from the hits of the current window
+    and the prorated hits of the previous one, stay within limit. Rejected
+    requests are counted too, so a client that does not wait stays limited.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.limits = {}
+        self.rejected = 0
+
+    def init_app(self, app: Flask):
+        backend = app.config["RATELIMIT_BACKEND"]
+        self.limits = dict(app.config["RATELIMIT_LIMITS"])
+        self.rejected = 0
+        if backend == "memory":
+            self.backend = MemoryWindows(app.config["RATELIMIT_MAX_KEYS"])
+        elif backend == "redis":
+            self.backend = RedisWindows(app.config["RATELIMIT_URL"])
+        else:
+            self.backend = None
+
+    def limit(self, name: str, key: typing.Callable[[], typing.Optional[str]] = client_address, methods=None):
+        """A decorator that rejects the requests, or only those with methods, going over the `name` limit.
+
+        It is meant for `SwaggerView.decorators`, so requests are rejected
+        before the view parses them. Requests whose key is None are not counted.
+        """
+
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if methods is None or request.method in methods:
+                    self.hit(name, key())
+                return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def hit(self, name: str, value: typing.Optional[str], now: float = None):
+        """Counts a hit of value on the `name` limit; raises `RateLimitExceeded` if it goes over."""
+        if self.backend is None or value is None or name not in self.limits:
+            return
+        limit, period = self.limits[name]
+        now = time.time() if now is None else now
+        window = int(now // period)
+        elapsed = now / period - window
+        previous, current = self.backend.hit(f"ratelimit:{name}:{value}", window, 2 * period)
+        if previous * (1 - elapsed) + current > limit:
+            self.rejected += 1
+            raise RateLimitExceeded(retry_after(limit, period, elapsed, previous, current))
+
+    @property
+    def stats(self) -> dict:
+        keys = len(self.backend) if isinstance(self.backend, MemoryWindows) else None
+        return dict(keys=keys, rejected=self.rejected)
+
+
+def retry_after(limit: int, period: int, elapsed: float, previous: int, current: int) -> int:
+    """Returns the seconds until the estimated hits of the last period allow one more, for hits counted so far.
+
+    elapsed is the part of the current window that already passed, from 0 to 1.
+    """
+    if current < limit:
+        # The previous window's hits have to weigh a little less.
+        wait = 1 - (limit - 1 - current) / previous - elapsed
+    else:
+        # The current window's hits have to become previous and weigh a little less.
+        wait = 1 - elapsed + (1 - (limit - 1) / current)
+    return max(1, math.ceil(wait * period))
+
+
+limiter = RateLimiter()
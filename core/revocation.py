@@ -0,0 +1,65 @@
+import time
+import typing
+from datetime import datetime
+from threading import Lock
+
+from flask import Flask
+
+from core.db import db
+from core.models import RevokedTokenModel
+
+
+class RevocationList:
+    """The ids (`jti`) of the revoked tokens that did not expire yet, kept in memory.
+
+    Revocations are stored in the `revoked_tokens` table, which is reloaded,
+    with the ones made by other processes, at most every
+    `JWT_REVOCATION_REFRESH` seconds, so checking a token usually costs no query.
+    Only unexpired tokens are kept, so the whole table stays small; it is read
+    whole because its ids are reused once expired rows are deleted.
+    """
+
+    def __init__(self):
+        self.refresh_interval = 5.0
+        self._revoked = {}
+        self._next_refresh = 0.0
+        self._lock = Lock()
+
+    def init_app(self, app: Flask):
+        self.refresh_interval = app.config["JWT_REVOCATION_REFRESH"]
+        with self._lock:
+            self._revoked.clear()
+            self._next_refresh = 0.0
+
+    def is_revoked(self, jti: str) -> bool:
+        if time.monotonic() >= self._next_refresh:
+            self.refresh()
+        return jti in self._revoked
+
+    def revoke(self, jti: str, expires_at: datetime):
+        db.session.query(RevokedTokenModel).filter(RevokedTokenModel.expires_at < datetime.utcnow()).delete()
+        if not db.session.query(RevokedTokenModel.id).filter_by(jti=jti).scalar():
+            db.session.add(RevokedTokenModel(jti=jti, expires_at=expires_at))
+        db.session.commit()
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def refresh(self):
+        """Reloads the revocations of the tokens that did not expire yet."""
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            rows = db.session.query(RevokedTokenModel.jti, RevokedTokenModel.expires_at).filter(
+                RevokedTokenModel.expires_at > datetime.utcnow()
+            )
+            self._revoked = dict(rows.all())
+            self._next_refresh = time.monotonic() + self.refresh_interval
+        finally:
+            self._lock.release()
+
+    @property
+    def stats(self) -> typing.Dict[str, int]:
+        return dict(revoked=len(self._revoked))
+
+
+revocation_list = RevocationList()
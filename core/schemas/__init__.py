@@ -1,48 +1,197 @@
+import typing
 from collections import namedtuple
-from functools import wraps
+from collections.abc import Mapping
+from functools import lru_cache, wraps
 
-from flask.json import jsonify
+from flask import Response, current_app, request, stream_with_context
 from marshmallow import Schema as BaseSchema
-from marshmallow import fields
-from marshmallow.decorators import post_load
+from marshmallow import ValidationError, fields, missing, validate
+from marshmallow.decorators import POST_DUMP, PRE_DUMP, post_load
+from webargs.fields import DelimitedList
 
-from core.models import PhotoModel, UserModel
-from core.utils import unpack
+from core.instrumentation import instrumentation
+from core.models import AlbumModel, PhotoModel, UserModel
+from core.serialization import dumps, json_response
+from core.thumbnails import thumbnailer
+from core.utils import chunked, decode_cursor, encode_cursor, unpack
+
+NDJSON_MIMETYPE = "application/x-ndjson"
 
 
 class Schema(BaseSchema):
     __model__ = None
 
+    def __init__(self, *args, as_model: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.as_model = as_model
+
     @classmethod
-    def dump_with(cls, *fn_args, **fn_kwargs):
-        """A decorator that apply dump to the return values of your methods."""
+    def dump_with(cls, many: bool = False, only: typing.Iterable[str] = None):
+        """A decorator that apply dump to the return values of your methods.
+
+        Given `only`, just those fields are dumped; dotted names select fields of nested schemas.
+        """
 
         def decorator(fn):
             @wraps(fn)
             def wrapper(*args, **kwargs):
                 resp = fn(*args, **kwargs)
-                if isinstance(resp, tuple):
-                    data, code, headers = unpack(resp)
-                    result = (
-                        jsonify(cls().dump(data, *fn_args, **fn_kwargs)),
-                        code,
-                        headers,
-                    )
-                else:
-                    result = jsonify(cls().dump(resp, *fn_args, **fn_kwargs))
-                return result
+                data, code, headers = unpack(resp)
+                if isinstance(data, Response):
+                    return resp
+                with instrumentation.timing("serialize"):
+                    serialize = cls.serializer(only)
+                    dumped = [serialize(item) for item in data] if many else serialize(data)
+                    return json_response(dumped), code, headers
 
             return wrapper
 
         return decorator
 
+    @classmethod
+    def serializer(cls, only: typing.Iterable[str] = None):
+        """Return a function that dumps one object as `cls(only=only).dump` would.
+
+        It is compiled once per schema class and `only` into a list of attribute
+        getters and converters, skipping marshmallow's per-call field machinery.
+        """
+        return compile_serializer(cls, frozenset(only) if only else None)
+
+    @classmethod
+    def stream(cls, items, only: typing.Iterable[str] = None) -> Response:
+        """Return a chunked response that dumps items as they are read.
+
+        Items are serialized `STREAM_CHUNK_SIZE` at a time, framed as a JSON
+        array or, when the client accepts it, as newline delimited JSON.
+        """
+        serialize = cls.serializer(only)
+        chunk_size = current_app.config["STREAM_CHUNK_SIZE"]
+        ndjson = wants_ndjson()
+
+        def generate():
+            if not ndjson:
+                yield b"["
+            separator = b""
+            for chunk in chunked(items, chunk_size):
+                dumped = (dumps(serialize(item)) for item in chunk)
+                if ndjson:
+                    yield b"".join(item + b"\n" for item in dumped)
+                else:
+                    yield separator + b",".join(dumped)
+                    separator = b","
+            if not ndjson:
+                yield b"]\n"
+
+        mimetype = NDJSON_MIMETYPE if ndjson else "application/json"
+        return Response(stream_with_context(generate()), mimetype=mimetype)
+
     @post_load
     def make_object(self, data, **_):
-        if self.__model__:
+        if self.__model__ and self.as_model:
             return self.__model__(**data)
         return data
 
 
+@lru_cache(maxsize=None)
+def compile_serializer(schema_class, only: typing.FrozenSet[str] = None):
+    """Compile the dump of schema_class into a plan of (key, attribute, converter) steps.
+
+    Strings and numbers are converted by their Python type, nested schemas by
+    their own compiled serializer and any other field by its `_serialize`.
+    Schemas with dump hooks or fields reading the whole object keep the
+    regular marshmallow dump.
+    """
+    schema = schema_class(only=only)
+    if schema._has_processors(PRE_DUMP) or schema._has_processors(POST_DUMP):
+        return schema.dump
+
+    plan = []
+    for name, field in schema.dump_fields.items():
+        if not field._CHECK_ATTRIBUTE or field.default is not missing:
+            return schema.dump
+        plan.append((field.data_key or name, field.attribute or name, _converter(field, name)))
+
+    def serialize(obj):
+        result = {}
+        is_mapping = isinstance(obj, Mapping)
+        for key, attribute, convert in plan:
+            value = obj.get(attribute, missing) if is_mapping else getattr(obj, attribute, missing)
+            if value is missing:
+                continue
+            result[key] = value if value is None else convert(value)
+        return result
+
+    return serialize
+
+
+def _converter(field: fields.Field, name: str):
+    serialize = type(field)._serialize
+    if serialize is fields.String._serialize:
+        return str
+    if serialize is fields.Number._serialize and not field.as_string:
+        return field.num_type
+    if isinstance(field, fields.Nested) and not field.exclude:
+        nested = compile_serializer(type(field.schema), frozenset(field.only) if field.only else None)
+        if field.many:
+            return lambda value: [nested(item) for item in value]
+        return nested
+    return lambda value: field._serialize(value, name, None)
+
+
+def wants_ndjson() -> bool:
+    """Return whether the client prefers newline delimited JSON over JSON"""
+    return request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+class Cursor(fields.String):
+    """An opaque pagination cursor wrapping the key of the last item of a page."""
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return None
+        return encode_cursor(value)
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            return decode_cursor(super()._deserialize(value, attr, data, **kwargs))
+        except ValueError as err:
+            raise ValidationError(str(err)) from err
+
+
+class Thumbnails(fields.Field):
+    """The URLs of a photo's thumbnails keyed by size, from the digest of its image; null until they are rendered."""
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return None
+        return thumbnailer.urls(value)
+
+
+class PaginationSchema(Schema):
+    cursor = Cursor(missing=None)
+    limit = fields.Integer(missing=50, validate=validate.Range(min=1, max=500))
+
+
+class PhotoFieldsSchema(Schema):
+    only = DelimitedList(
+        fields.String(validate=validate.OneOf(["id", "title", "url", "description", "thumbnails"])),
+        data_key="fields",
+        missing=None,
+    )
+
+
+class PhotoContentSchema(Schema):
+    size = fields.Integer(missing=None, validate=lambda size: size in thumbnailer.sizes)
+
+
+class PhotoQuerySchema(PaginationSchema, PhotoFieldsSchema):
+    stream = fields.Boolean(missing=False)
+    q = fields.String(validate=validate.Length(min=1, max=200))
+    sort = fields.String(missing="id", validate=validate.OneOf(["id", "-id"]))
+    min_id = fields.Integer()
+    max_id = fields.Integer()
+
+
 class UserSchema(Schema):
     __model__ = UserModel
 
@@ -65,3 +214,59 @@ class PhotoSchema(Schema):
     title = fields.Str()
     url = fields.URL(required=True)
     description = fields.Str()
+    thumbnails = Thumbnails(attribute="thumbnail", dump_only=True)
+
+
+class PhotoPageSchema(Schema):
+    items = fields.Nested(PhotoSchema, many=True)
+    next_cursor = Cursor(allow_none=True)
+
+
+class UserPhotosSchema(Schema):
+    id = fields.Int(dump_only=True)
+    name = fields.Str(dump_only=True)
+    email = fields.Email(dump_only=True)
+    photo_count = fields.Int(dump_only=True)
+    photos = fields.Nested(PhotoSchema, many=True, only=("id", "title", "url", "thumbnails"), dump_only=True)
+
+
+class UserPhotosQuerySchema(Schema):
+    limit = fields.Integer(missing=10, validate=validate.Range(min=0, max=100))
+
+
+class PhotoIdsSchema(Schema):
+    ids = fields.List(fields.Integer())
+
+
+class PhotoIdsQuerySchema(Schema):
+    ids = DelimitedList(fields.Integer(), required=True, validate=validate.Length(min=1, max=500))
+
+
+class PhotoAlbumsSchema(Schema):
+    album_ids = DelimitedList(fields.Integer(), missing=())
+
+
+class AlbumSchema(Schema):
+    __model__ = AlbumModel
+
+    id = fields.Int(dump_only=True)
+    title = fields.Str(required=True)
+    description = fields.Str()
+    photo_count = fields.Int(dump_only=True)
+    cover_photo_id = fields.Int()
+    cover = fields.Nested(PhotoSchema, only=("id", "title", "thumbnails"), dump_only=True)
+
+
+class AlbumPageSchema(Schema):
+    items = fields.Nested(AlbumSchema, many=True)
+    next_cursor = Cursor(allow_none=True)
+
+
+class AlbumPhotosSchema(Schema):
+    photo_ids = fields.List(fields.Integer(), required=True, validate=validate.Length(min=1, max=500))
+
+
+class BatchResultSchema(Schema):
+    index = fields.Integer()
+    status = fields.Integer()
+    errors = fields.Dict(keys=fields.String())
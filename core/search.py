@@ -0,0 +1,136 @@
+import re
+import typing
+import weakref
+
+from sqlalchemy import and_, bindparam, event, func, inspect, or_, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import DDLElement, Table
+
+from core.models import PhotoModel
+
+
+def tokenize(query: str) -> typing.List[str]:
+    return re.findall(r"\w+", query.lower())
+
+
+class CreateSearchIndex(DDLElement):
+    def __init__(self, index: "SearchIndex"):
+        self.index = index
+
+
+@compiles(CreateSearchIndex)
+def visit_create_search_index(element: CreateSearchIndex, compiler, **kwargs) -> str:
+    index = element.index
+    return f"CREATE VIRTUAL TABLE IF NOT EXISTS {index.name} USING fts5({', '.join(index.columns)})"
+
+
+class FillSearchIndex(DDLElement):
+    def __init__(self, index: "SearchIndex"):
+        self.index = index
+
+
+@compiles(FillSearchIndex)
+def visit_fill_search_index(element: FillSearchIndex, compiler, **kwargs) -> str:
+    index = element.index
+    columns = ", ".join(index.columns)
+    return f"INSERT INTO {index.name} (rowid, {columns}) SELECT id, {columns} FROM {index.table.name}"
+
+
+class SearchIndex:
+    """A full-text index over some text columns of a table.
+
+    On SQLite builds with FTS5 the index is a virtual table, named after the
+    table, whose rowids are the indexed rows' ids. It is created and dropped
+    along with the table and must be kept in sync by calling `update` and
+    `delete` in the transaction that changes the rows. Elsewhere searches fall
+    back to `LIKE` and the sync methods do nothing. On databases created before
+    the index, `flask db upgrade` creates and fills it, see `pending_migrations`.
+
+    Whether an engine has the index is checked once and remembered, so an
+    index built by `flask db upgrade` or `flask db reindex` is used after the
+    application restarts.
+    """
+
+    def __init__(self, table: Table, columns: typing.List[str]):
+        self.table = table
+        self.columns = columns
+        self.name = f"{table.name}_fts"
+        self._available = weakref.WeakKeyDictionary()
+        event.listen(table, "after_create", self._after_create)
+        event.listen(table, "after_drop", self._after_drop)
+
+    def available(self, bind: typing.Union[Engine, Connection]) -> bool:
+        engine = bind.engine
+        if engine not in self._available:
+            self._available[engine] = engine.dialect.name == "sqlite" and inspect(engine).has_table(self.name)
+        return self._available[engine]
+
+    def supported(self, bind: typing.Union[Engine, Connection]) -> bool:
+        if bind.dialect.name != "sqlite":
+            return False
+        return any(option == "ENABLE_FTS5" for option, in bind.execute(text("PRAGMA compile_options")))
+
+    def criterion(self, bind: typing.Union[Engine, Connection], query: str):
+        """Returns a criterion selecting the rows matching every word of query, as a prefix."""
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        id = self.table.c.id
+        if self.available(bind):
+            match = " ".join(f'"{token}"*' for token in tokens)
+            return id.in_(text(f"SELECT rowid FROM {self.name} WHERE {self.name} MATCH :match").bindparams(match=match))
+        columns = [func.lower(self.table.c[column]) for column in self.columns]
+        return and_(*(or_(*(column.contains(token, autoescape=True) for column in columns)) for token in tokens))
+
+    def update(self, connection: Connection, ids: typing.Iterable[int]):
+        """Indexes the current content of the rows with ids."""
+        ids = list(ids)
+        if not ids or not self.available(connection):
+            return
+        self.delete(connection, ids)
+        columns = ", ".join(self.columns)
+        connection.execute(
+            text(
+                f"INSERT INTO {self.name} (rowid, {columns}) SELECT id, {columns} FROM {self.table.name} WHERE id IN :ids"
+            ).bindparams(bindparam("ids", ids, expanding=True))
+        )
+
+    def delete(self, connection: Connection, ids: typing.Iterable[int]):
+        ids = list(ids)
+        if not ids or not self.available(connection):
+            return
+        connection.execute(
+            text(f"DELETE FROM {self.name} WHERE rowid IN :ids").bindparams(bindparam("ids", ids, expanding=True))
+        )
+
+    def rebuild(self, connection: Connection) -> bool:
+        """Creates the index from scratch, returning False when the database does not support it."""
+        if not self.supported(connection):
+            return False
+        self._after_drop(self.table, connection)
+        self._after_create(self.table, connection)
+        connection.execute(FillSearchIndex(self))
+        return True
+
+    def pending_migrations(self, engine: Engine) -> typing.Iterator[DDLElement]:
+        """Yields the statements creating and filling the index, when the database supports it but lacks it."""
+        with engine.connect() as connection:
+            if not self.supported(connection) or inspect(connection).has_table(self.name):
+                return
+        self._available.pop(engine, None)
+        yield CreateSearchIndex(self)
+        yield FillSearchIndex(self)
+
+    def _after_create(self, target, connection: Connection, **_):
+        if self.supported(connection):
+            connection.execute(CreateSearchIndex(self))
+            self._available[connection.engine] = True
+
+    def _after_drop(self, target, connection: Connection, **_):
+        if connection.dialect.name == "sqlite":
+            connection.execute(text(f"DROP TABLE IF EXISTS {self.name}"))
+            self._available[connection.engine] = False
+
+
+photo_index = SearchIndex(PhotoModel.__table__, ["title", "description"])
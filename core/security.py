@@ -1,7 +1,10 @@
+from flask import current_app
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 
+from .instrumentation import instrumentation
 from .models import UserModel
+from .revocation import revocation_list
 
 from .services import UserService
 
@@ -15,6 +18,24 @@ cors = CORS(
 )
 
 
+class TokenIdentity:
+    """The user a token was issued to, built from the token's claims.
+
+    `id` and `email` come from the token; accessing anything else loads the
+    user, once, through `UserService.get_identity`.
+    """
+
+    def __init__(self, id: int, email: str):
+        self.id = id
+        self.email = email
+        self._user = None
+
+    def __getattr__(self, name: str):
+        if self._user is None:
+            self._user = UserService.get_identity(self.id)
+        return getattr(self._user, name)
+
+
 # Register a callback function that takes whatever object is passed in as the
 # identity when creating JWTs and converts it to a JSON serializable format.
 @jwt.user_identity_loader
@@ -22,7 +43,21 @@ def user_identity_callback(user: UserModel) -> int:
     return user.id
 
 
+@jwt.additional_claims_loader
+def additional_claims_callback(user: UserModel) -> dict:
+    return dict(email=user.email)
+
+
 @jwt.user_lookup_loader
-def user_lookup_callback(_, jwt_data) -> UserModel:
+def user_lookup_callback(_, jwt_data):
     identity = jwt_data["sub"]
-    return UserService.get_by_id(identity)
+    if current_app.config["JWT_STATELESS_IDENTITY"]:
+        return TokenIdentity(identity, jwt_data.get("email"))
+    with instrumentation.timing("auth"):
+        return UserService.get_identity(identity)
+
+
+@jwt.token_in_blocklist_loader
+def token_in_blocklist_callback(_, jwt_data) -> bool:
+    with instrumentation.timing("auth"):
+        return revocation_list.is_revoked(jwt_data["jti"])
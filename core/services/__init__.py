@@ -1,30 +1,124 @@
 import typing
+from collections import namedtuple
+from datetime import datetime
 
-from flask_jwt_extended.utils import create_access_token
+from flask import current_app
+from flask_jwt_extended.utils import create_access_token, create_refresh_token, decode_token
 from flask_sqlalchemy.model import Model
+from sqlalchemy import case, delete, func, insert, inspect, literal, select, update
 from sqlalchemy.exc import IntegrityError, NoResultFound
+from sqlalchemy.orm import joinedload, lazyload, load_only, make_transient_to_detached, raiseload, selectinload
 
-from core.db import db
-from core.models import PhotoModel, UserModel
+from core.cache import response_cache, user_cache
+from core.db import LazyLoadChosen, db
+from core.models import AlbumModel, AlbumPhotoModel, PhotoModel, ThumbnailJobModel, UserModel
+from core.models.mixins import SoftDeleteMixin
+from core.purge import purger
+from core.revocation import revocation_list
+from core.search import photo_index
+from core.thumbnails import thumbnailer
 
 T = typing.TypeVar("T")
 
+Page = namedtuple("Page", "items next_cursor")
+
+Load = typing.Mapping[str, str]
+
+LOADERS = {
+    "select": lazyload,
+    "selectin": selectinload,
+    "joined": joinedload,
+    "raise": raiseload,
+}
+
 
 class Service(typing.Generic[T]):
     __session__ = db.session
     __model__: T
 
     @classmethod
-    def _get(cls, **filters):
-        return cls.__model__.query.filter_by(**filters)
+    def _get(cls, fields: typing.Iterable[str] = None, criteria: typing.Iterable = (), load: Load = None, **filters):
+        """Returns a query of the items matching filters and criteria, loading only the `fields` columns when given.
+
+        The primary key is always loaded; other columns are loaded on first access.
+        Soft-deleted items are left out. `load` maps relationship names, or `*` for every other relationship, to
+        the strategy loading them: `select` (lazily), `selectin`, `joined` or `raise`.
+        It may be read from a replica, unless `_use_primary` was called in this session.
+        """
+        query = cls.__model__.query.execution_options(replica=True).filter_by(**filters).filter(*criteria)
+        if issubclass(cls.__model__, SoftDeleteMixin):
+            query = query.filter(cls.__model__.deleted_at.is_(None))
+        if fields:
+            query = query.options(load_only(*fields))
+        if load:
+            query = query.options(*cls._loaders(load))
+        return query
+
+    @classmethod
+    def _loaders(cls, load: Load) -> list:
+        options = []
+        for name, strategy in load.items():
+            if strategy not in LOADERS:
+                raise ValueError(f"Unknown loading strategy {strategy!r}, expected one of {', '.join(LOADERS)}.")
+            options.append(LOADERS[strategy](name if name == "*" else getattr(cls.__model__, name)))
+            if strategy == "select":
+                options.append(LazyLoadChosen(inspect(cls.__model__), name))
+        return options
+
+    @classmethod
+    def _use_primary(cls):
+        """Reads the rest of the session from the primary; call it before reading what is about to be written."""
+        cls.__session__().use_primary()
+
+    @classmethod
+    def get_one(cls, fields: typing.Iterable[str] = None, load: Load = None, **filters) -> T:
+        return cls._get(fields, load=load, **filters).one()
 
     @classmethod
-    def get_one(cls, **filters) -> T:
-        return cls._get(**filters).one()
+    def list(cls, fields: typing.Iterable[str] = None, load: Load = None, **filters) -> typing.List[T]:
+        return cls._get(fields, load=load, **filters).all()
 
     @classmethod
-    def list(cls, **filters) -> typing.List[T]:
-        return cls._get(**filters).all()
+    def paginate(
+        cls,
+        cursor=None,
+        limit: int = 50,
+        fields: typing.Iterable[str] = None,
+        criteria: typing.Iterable = (),
+        descending: bool = False,
+        load: Load = None,
+        **filters,
+    ) -> Page:
+        """Returns a page of at most `limit` items ordered by primary key.
+
+        Keyset pagination: `cursor` is the key of the last item of the previous
+        page, so the query cost depends on the page size, not on its depth.
+        """
+        key = cls.__model__.id
+        query = cls._get(fields, criteria, load, **filters)
+        if cursor is not None:
+            query = query.filter(key < cursor if descending else key > cursor)
+        items = query.order_by(key.desc() if descending else key).limit(limit + 1).all()
+        next_cursor = items[limit - 1].id if len(items) > limit else None
+        return Page(items[:limit], next_cursor)
+
+    @classmethod
+    def stream(
+        cls,
+        chunk_size: int = 500,
+        fields: typing.Iterable[str] = None,
+        criteria: typing.Iterable = (),
+        descending: bool = False,
+        load: Load = None,
+        **filters,
+    ) -> typing.Iterable[T]:
+        """Returns every item ordered by primary key, fetching `chunk_size` rows at a time.
+
+        Collections cannot be `joined` while streaming; `selectin` loads them a chunk at a time.
+        """
+        key = cls.__model__.id
+        query = cls._get(fields, criteria, load, **filters)
+        return query.order_by(key.desc() if descending else key).yield_per(chunk_size)
 
 
 class LoginService(Service):
@@ -32,14 +126,39 @@ class LoginService(Service):
 
     @classmethod
     def check_credentials(cls, credentials) -> bool:
+        # An outdated hash is replaced, so the user is read from the primary.
+        cls._use_primary()
         try:
-            return cls.get_one(email=credentials.email).check_password(credentials.password)
+            user = cls.get_one(email=credentials.email)
         except NoResultFound:
             return False
+        valid = user.check_password(credentials.password)
+        if cls.__session__.is_modified(user):
+            cls.__session__.commit()
+            # The commit bumped the user's version, which the cached identity still holds.
+            user_cache.invalidate(user.id)
+        return valid
 
     @classmethod
-    def get_access_token(cls, credentials) -> str:
-        return create_access_token(identity=cls.get_one(email=credentials.email))
+    def get_tokens(cls, credentials) -> typing.Tuple[str, str]:
+        """Returns an access token and a refresh token; the access token names its refresh token, to revoke both."""
+        user = cls.get_one(email=credentials.email)
+        refresh_token = create_refresh_token(identity=user)
+        refresh_jti = decode_token(refresh_token)["jti"]
+        return create_access_token(identity=user, additional_claims=dict(refresh_jti=refresh_jti)), refresh_token
+
+    @classmethod
+    def refresh(cls, user, refresh_jti: str) -> str:
+        """Returns a new access token for the user a refresh token, `refresh_jti`, was issued to."""
+        return create_access_token(identity=user, additional_claims=dict(refresh_jti=refresh_jti))
+
+    @classmethod
+    def revoke(cls, jwt_data: dict):
+        """Revokes an access token and the refresh token it was issued with, until they expire."""
+        revocation_list.revoke(jwt_data["jti"], datetime.utcfromtimestamp(jwt_data["exp"]))
+        if "refresh_jti" in jwt_data:
+            expires_at = datetime.utcnow() + current_app.config["JWT_REFRESH_TOKEN_EXPIRES"]
+            revocation_list.revoke(jwt_data["refresh_jti"], expires_at)
 
 
 class UserService(Service):
@@ -47,7 +166,47 @@ class UserService(Service):
 
     @classmethod
     def get_by_id(cls, id) -> UserModel:
-        return cls.get_one(id=id)
+        """Returns the user with `id`, from the session identity map when already loaded."""
+        user = cls.__model__.query.execution_options(replica=True).get(id)
+        if user is None:
+            raise NoResultFound()
+        return user
+
+    @classmethod
+    def get_identity(cls, id) -> UserModel:
+        """Returns the user with `id`, sparing the query while it is in `user_cache`.
+
+        The password hash is not cached; it is loaded only if it is accessed.
+        """
+        identity = user_cache.get(id)
+        if identity is None:
+            user = cls.get_by_id(id)
+            user_cache.set(id, cls._identity(user))
+            return user
+        user = cls.__model__(**identity)
+        make_transient_to_detached(user)
+        return cls.__session__.merge(user, load=False)
+
+    @classmethod
+    def _identity(cls, user: UserModel) -> dict:
+        columns = inspect(cls.__model__).column_attrs
+        uncached = ("_password", "photos_version")
+        return {column.key: getattr(user, column.key) for column in columns if column.key not in uncached}
+
+    @classmethod
+    def with_photo_counts(cls, load: Load = None, **filters) -> typing.List[typing.Tuple[UserModel, int]]:
+        """Returns the users matching filters, ordered by id, with their photo count, in a single query.
+
+        `load` may also load their photos, with a constant number of queries given `selectin`.
+        """
+        # Correlated, the count of each user is read from the `user_id, id` index of their photos only.
+        count = (
+            select(func.count(PhotoModel.id))
+            .where(PhotoModel.user_id == cls.__model__.id, PhotoModel.deleted_at.is_(None))
+            .scalar_subquery()
+        )
+        query = cls._get(load=load, **filters).add_columns(count).order_by(cls.__model__.id)
+        return [(user, count) for user, count in query]
 
     @classmethod
     def save(cls, user: UserModel) -> UserModel:
@@ -59,37 +218,455 @@ class UserService(Service):
         else:
             cls.__session__.merge(user)
         cls.__session__.commit()
+        user_cache.invalidate(user.id)
         return user
 
     @classmethod
     def remove(cls, id: int):
+        cls._use_primary()
         photo = cls.get_by_id(id)
         cls.__session__.delete(photo)
         cls.__session__.commit()
+        user_cache.invalidate(id)
 
 
 class PhotoService(Service):
     __model__ = PhotoModel
 
     @classmethod
-    def list(cls, user_id: int) -> typing.List[UserModel]:
-        return super().list(user_id=user_id)
+    def _get(cls, fields: typing.Iterable[str] = None, criteria: typing.Iterable = (), load: Load = None, **filters):
+        # The `thumbnails` field is rendered from the `thumbnail` column.
+        fields = fields and ["thumbnail" if field == "thumbnails" else field for field in fields]
+        return super()._get(fields, criteria, load, **filters)
 
     @classmethod
-    def get_by_id(cls, id: int, user_id: int) -> UserModel:
-        return cls.get_one(id=id, user_id=user_id)
+    def list(cls, user_id: int, fields: typing.Iterable[str] = None) -> typing.List[UserModel]:
+        return super().list(fields, user_id=user_id)
 
     @classmethod
-    def save(cls, photo: PhotoModel) -> PhotoModel:
+    def paginate(
+        cls,
+        user_id: int,
+        cursor=None,
+        limit: int = 50,
+        fields: typing.Iterable[str] = None,
+        sort: str = "id",
+        **search,
+    ) -> Page:
+        return super().paginate(cursor, limit, fields, cls._search(**search), sort == "-id", user_id=user_id)
+
+    @classmethod
+    def stream(
+        cls, user_id: int, chunk_size: int = 500, fields: typing.Iterable[str] = None, sort: str = "id", **search
+    ) -> typing.Iterable[PhotoModel]:
+        return super().stream(chunk_size, fields, cls._search(**search), sort == "-id", user_id=user_id)
+
+    @classmethod
+    def _search(cls, q: str = None, min_id: int = None, max_id: int = None) -> list:
+        """Returns the criteria selecting the photos matching q with an id between min_id and max_id, inclusive."""
+        criteria = []
+        if q:
+            criteria.append(photo_index.criterion(cls.__session__().get_bind(cls.__model__.__mapper__), q))
+        if min_id is not None:
+            criteria.append(cls.__model__.id >= min_id)
+        if max_id is not None:
+            criteria.append(cls.__model__.id <= max_id)
+        return [criterion for criterion in criteria if criterion is not None]
+
+    @classmethod
+    def get_by_id(cls, id: int, user_id: int, fields: typing.Iterable[str] = None) -> UserModel:
+        return cls.get_one(fields, id=id, user_id=user_id)
+
+    @classmethod
+    def get_for_update(cls, id: int, user_id: int) -> PhotoModel:
+        """Returns the photo from the primary, for a write to follow."""
+        cls._use_primary()
+        return cls.get_by_id(id, user_id)
+
+    @classmethod
+    def collection_version(cls, user_id: int) -> int:
+        """Returns the version of the user's photos, which changes whenever any of them does.
+
+        It is read like the photos, from the session's replica when they are, so a response cached or tagged
+        with it is never older than its version. The counters of a shared cache could be, so they are not used
+        along with replicas.
+        """
+
+        def load():
+            query = cls.__session__.query(UserModel.photos_version).execution_options(replica=True)
+            return query.filter_by(id=user_id).scalar()
+
+        if db.replicas.keys:
+            return load()
+        return response_cache.version(f"photos:{user_id}", load)
+
+    @classmethod
+    def save(cls, photo: PhotoModel, album_ids: typing.Iterable[int] = ()) -> PhotoModel:
+        """Saves the photo, adding it to the user's albums with `album_ids`.
+
+        When its url is new or changed, its thumbnails are queued and rendered once committed.
+        """
+        cls._use_primary()
         if photo.id is None:
             cls.__session__.add(photo)
+            url_changed = True
         else:
-            cls.__session__.merge(photo)
+            url_changed = cls.get_for_update(photo.id, photo.user_id).url != photo.url
+            photo = cls.__session__.merge(photo)
+        if url_changed:
+            photo.thumbnail = None
+        cls.__session__.flush()
+        photo_index.update(cls.__session__.connection(), [photo.id])
+        if url_changed:
+            ThumbnailService.queue([photo.id])
+        for album in AlbumService.get_for_update(album_ids, photo.user_id):
+            AlbumService.add_photos(album, [photo.id])
+        cls._touch(photo.user_id)
         cls.__session__.commit()
+        cls._invalidate(photo.user_id)
+        if url_changed:
+            thumbnailer.in_background(ThumbnailService.process, [photo.id])
         return photo
 
+    @classmethod
+    def bulk_save(cls, rows: typing.List[dict]):
+        """Inserts rows with a single executemany statement and commits them."""
+        user_ids = {row["user_id"] for row in rows}
+        table = cls.__model__.__table__
+        last_id = cls.__session__.query(func.max(table.c.id)).scalar() or 0
+        cls.__session__.execute(table.insert(), rows)
+        # The new rows are past the last id; reindexing a concurrent writer's rows too is harmless.
+        new_ids = cls.__session__.query(table.c.id).filter(table.c.id > last_id, table.c.user_id.in_(user_ids))
+        new_ids = [id for id, in new_ids]
+        photo_index.update(cls.__session__.connection(), new_ids)
+        ThumbnailService.queue(new_ids)
+        cls._touch(*user_ids)
+        cls.__session__.commit()
+        cls._invalidate(*user_ids)
+        thumbnailer.in_background(ThumbnailService.process, new_ids)
+
     @classmethod
     def remove(cls, id, user_id: int):
-        photo = cls.get_by_id(id, user_id)
-        cls.__session__.delete(photo)
+        if not cls.remove_many([id], user_id):
+            raise NoResultFound()
+
+    @classmethod
+    def remove_many(cls, ids: typing.Iterable[int], user_id: int) -> typing.List[int]:
+        """Deletes the user's photos with ids and returns the ids of those that were found.
+
+        Photos are marked deleted by a single statement and hard deleted by
+        `purge` later; they leave their albums and the search index at once.
+        """
+        ids = set(ids)
+        if not ids:
+            return []
+        cls._use_primary()
+        model = cls.__model__
+        now = datetime.utcnow()
+        result = cls.__session__.execute(
+            update(model)
+            .where(model.user_id == user_id, model.id.in_(ids), model.deleted_at.is_(None))
+            .values(deleted_at=now, updated_at=now, version=model.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = ids
+        if result.rowcount != len(ids):
+            # Some were missing; the deleted ones are told apart by the time they were deleted at.
+            query = cls.__session__.query(model.id).filter(model.id.in_(ids), model.deleted_at == now)
+            deleted = {id for id, in query.filter_by(user_id=user_id)}
+        if deleted:
+            cls.__session__.query(ThumbnailJobModel).filter(ThumbnailJobModel.photo_id.in_(deleted)).delete(
+                synchronize_session=False
+            )
+            AlbumService.remove_photos(deleted)
+            photo_index.delete(cls.__session__.connection(), deleted)
+            cls._touch(user_id)
+        cls.__session__.commit()
+        if deleted:
+            cls._invalidate(user_id)
+            purger.schedule(cls.purge)
+        return sorted(deleted)
+
+    @classmethod
+    def purge(cls, before: datetime, chunk_size: int = 500) -> int:
+        """Hard deletes the photos deleted before `before` and returns how many there were.
+
+        They are deleted `chunk_size` at a time, each chunk in its own short
+        transaction, so writers are never locked out for long.
+        """
+        cls._use_primary()
+        model = cls.__model__
+        purged = 0
+        while True:
+            ids = cls.__session__.query(model.id).filter(model.deleted_at < before).order_by(model.id).limit(chunk_size)
+            ids = [id for id, in ids]
+            if not ids:
+                return purged
+            cls.__session__.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+            cls.__session__.commit()
+            purged += len(ids)
+
+    @classmethod
+    def _touch(cls, *user_ids: int):
+        """Increments the collection version of the users, in the current transaction."""
+        cls.__session__.execute(
+            update(UserModel)
+            .where(UserModel.id.in_(user_ids))
+            .values(photos_version=UserModel.photos_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    def _invalidate(cls, *user_ids: int):
+        """Makes the cached responses of the users' photos stale, once the write is committed."""
+        for user_id in user_ids:
+            response_cache.invalidate(f"photos:{user_id}")
+
+
+class AlbumService(Service):
+    """Albums and their ordered photos.
+
+    Every album keeps its `photo_count` and `cover_photo_id` up to date in the
+    transactions adding and removing its photos, so listing albums costs a
+    single query.
+    """
+
+    __model__ = AlbumModel
+
+    @classmethod
+    def paginate(cls, user_id: int, cursor=None, limit: int = 50) -> Page:
+        return super().paginate(cursor, limit, user_id=user_id)
+
+    @classmethod
+    def get_by_id(cls, id: int, user_id: int) -> AlbumModel:
+        return cls.get_one(id=id, user_id=user_id)
+
+    @classmethod
+    def get_for_update(cls, ids: typing.Iterable[int], user_id: int) -> typing.List[AlbumModel]:
+        """Returns the user's albums with ids from the primary, for a write to follow; raises if any is missing."""
+        ids = set(ids)
+        if not ids:
+            return []
+        cls._use_primary()
+        albums = cls._get(criteria=[cls.__model__.id.in_(ids)], user_id=user_id).all()
+        if len(albums) != len(ids):
+            raise NoResultFound()
+        return albums
+
+    @classmethod
+    def photos(cls, id: int, user_id: int, cursor=None, limit: int = 50) -> Page:
+        """Returns a page of the album's photos in album order; the cursor is the position of the last one."""
+        cls.get_by_id(id, user_id)
+        query = (
+            PhotoService._get()
+            .join(AlbumPhotoModel, AlbumPhotoModel.photo_id == PhotoModel.id)
+            .filter(AlbumPhotoModel.album_id == id)
+            .add_columns(AlbumPhotoModel.position)
+        )
+        if cursor is not None:
+            query = query.filter(AlbumPhotoModel.position > cursor)
+        rows = query.order_by(AlbumPhotoModel.position).limit(limit + 1).all()
+        next_cursor = rows[limit - 1].position if len(rows) > limit else None
+        return Page([photo for photo, _ in rows[:limit]], next_cursor)
+
+    @classmethod
+    def save(cls, album: AlbumModel) -> AlbumModel:
+        """Saves the album; its cover photo, when set, must be one of its photos."""
+        cls._use_primary()
+        if album.id is None:
+            cls.__session__.add(album)
+        else:
+            cls.get_for_update([album.id], album.user_id)
+            if album.cover_photo_id is not None:
+                # Raises NoResultFound when the cover is not in the album.
+                AlbumPhotoModel.query.filter_by(album_id=album.id, photo_id=album.cover_photo_id).one()
+            album = cls.__session__.merge(album)
+        cls.__session__.commit()
+        return album
+
+    @classmethod
+    def remove(cls, id: int, user_id: int):
+        album = cls.get_for_update([id], user_id)[0]
+        cls.__session__.execute(delete(AlbumPhotoModel).where(AlbumPhotoModel.album_id == id))
+        cls.__session__.delete(album)
+        cls.__session__.commit()
+
+    @classmethod
+    def add(cls, id: int, user_id: int, photo_ids: typing.Iterable[int]) -> AlbumModel:
+        album = cls.get_for_update([id], user_id)[0]
+        cls.add_photos(album, photo_ids)
+        cls.__session__.commit()
+        return album
+
+    @classmethod
+    def discard(cls, id: int, user_id: int, photo_ids: typing.Iterable[int]):
+        cls.get_for_update([id], user_id)
+        cls.remove_photos(photo_ids, id)
+        cls.__session__.commit()
+
+    @classmethod
+    def add_photos(cls, album: AlbumModel, photo_ids: typing.Iterable[int]):
+        """Appends the photos to the album in order, in the current transaction.
+
+        They must belong to the album's owner; those already in the album keep their position.
+        """
+        photo_ids = list(dict.fromkeys(photo_ids))
+        photos = PhotoService._get(criteria=[PhotoModel.id.in_(photo_ids)], user_id=album.user_id)
+        if photos.count() != len(photo_ids):
+            raise NoResultFound()
+        entries = AlbumPhotoModel.query.filter(
+            AlbumPhotoModel.album_id == album.id, AlbumPhotoModel.photo_id.in_(photo_ids)
+        )
+        present = {entry.photo_id for entry in entries}
+        new_ids = [id for id in photo_ids if id not in present]
+        if not new_ids:
+            return
+
+        last = (
+            cls.__session__.query(func.max(AlbumPhotoModel.position))
+            .filter(AlbumPhotoModel.album_id == album.id)
+            .scalar()
+        )
+        last = last or 0
+        rows = [dict(album_id=album.id, photo_id=id, position=last + i) for i, id in enumerate(new_ids, 1)]
+        cls.__session__.execute(insert(AlbumPhotoModel), rows)
+        album.photo_count = cls.__model__.photo_count + len(new_ids)
+        if album.cover_photo_id is None:
+            album.cover_photo_id = new_ids[0]
+        cls.__session__.flush()
+
+    @classmethod
+    def remove_photos(cls, photo_ids: typing.Iterable[int], album_id: int = None):
+        """Removes the photos from the album, or from every album when `album_id` is None, in the current transaction.
+
+        Counts are decremented and a removed cover is replaced by the first
+        remaining photo with a single UPDATE of the albums involved.
+        """
+        album, entry = cls.__model__, AlbumPhotoModel
+        photo_ids = list(photo_ids)
+        removing = [entry.photo_id.in_(photo_ids)]
+        if album_id is not None:
+            removing.append(entry.album_id == album_id)
+        removed = select(func.count()).where(entry.album_id == album.id, entry.photo_id.in_(photo_ids))
+        next_cover = (
+            select(entry.photo_id)
+            .where(entry.album_id == album.id, entry.photo_id.notin_(photo_ids))
+            .order_by(entry.position)
+            .limit(1)
+        )
+        cls.__session__.execute(
+            update(album)
+            .where(album.id.in_(select(entry.album_id).where(*removing)))
+            .values(
+                photo_count=album.photo_count - removed.scalar_subquery(),
+                cover_photo_id=case(
+                    (album.cover_photo_id.in_(photo_ids), next_cover.scalar_subquery()),
+                    else_=album.cover_photo_id,
+                ),
+                version=album.version + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        cls.__session__.execute(delete(entry).where(*removing).execution_options(synchronize_session=False))
+
+
+class ThumbnailService(Service):
+    """Keeps a job per photo whose thumbnails are rendered by `thumbnailer`, retrying the failed ones."""
+
+    __model__ = ThumbnailJobModel
+
+    @classmethod
+    def queue(cls, photo_ids: typing.Iterable[int]):
+        """Marks the thumbnails of the photos to be rendered, in the current transaction."""
+        job = cls.__model__
+        photo_ids = list(photo_ids)
+        if not photo_ids:
+            return
+        cls.__session__.query(job).filter(job.photo_id.in_(photo_ids)).delete(synchronize_session=False)
+        cls.__session__.execute(insert(job), [dict(photo_id=id, status=job.PENDING, attempts=0) for id in photo_ids])
+
+    @classmethod
+    def backfill(cls) -> int:
+        """Queues the photos that never had a job, and returns how many were queued."""
+        job = cls.__model__
+        missing = select(PhotoModel.id, literal(job.PENDING), literal(0)).where(
+            ~PhotoModel.id.in_(select(job.photo_id)), PhotoModel.deleted_at.is_(None)
+        )
+        result = cls.__session__.execute(insert(job).from_select(["photo_id", "status", "attempts"], missing))
+        cls.__session__.commit()
+        return result.rowcount
+
+    @classmethod
+    def unfinished(cls) -> typing.Iterable[int]:
+        """Returns the ids of the photos whose jobs are pending or were interrupted while running."""
+        job = cls.__model__
+        cls._use_primary()
+        statuses = (job.PENDING, job.RUNNING)
+        return [
+            id for id, in cls.__session__.query(job.photo_id).filter(job.status.in_(statuses)).order_by(job.photo_id)
+        ]
+
+    @classmethod
+    def process(cls, photo_ids: typing.Iterable[int]) -> typing.Dict[str, int]:
+        """Renders the thumbnails of the photos concurrently, retrying each one up to `THUMBNAIL_MAX_ATTEMPTS` times.
+
+        Returns how many jobs are done and how many failed.
+        """
+        counts = dict.fromkeys((cls.__model__.DONE, cls.__model__.FAILED), 0)
+        while photo_ids:
+            sources = cls._start(photo_ids)
+            finished = cls._finish(thumbnailer.render_all(sources))
+            photo_ids = [id for id, status in finished.items() if status == cls.__model__.PENDING]
+            for status in finished.values():
+                if status in counts:
+                    counts[status] += 1
+        return counts
+
+    @classmethod
+    def _start(cls, photo_ids: typing.Iterable[int]) -> typing.List[typing.Tuple[typing.Tuple[int, str], str]]:
+        """Marks the unfinished jobs of the photos as running and returns their ((photo id, url), url) pairs."""
+        job = cls.__model__
+        cls._use_primary()
+        jobs = (
+            cls.__session__.query(job, PhotoModel.url)
+            .join(PhotoModel, PhotoModel.id == job.photo_id)
+            .filter(job.photo_id.in_(list(photo_ids)), job.status.in_((job.PENDING, job.RUNNING)))
+            .all()
+        )
+        for row, _ in jobs:
+            row.status = job.RUNNING
+            row.attempts += 1
+        cls.__session__.commit()
+        return [((row.photo_id, url), url) for row, url in jobs]
+
+    @classmethod
+    def _finish(cls, results) -> typing.Dict[int, str]:
+        """Records the ((photo id, url), digest, error) results, storing the digests on the photos in one transaction.
+
+        Returns the new status of every job; failed jobs stay pending while they have attempts left.
+        """
+        job = cls.__model__
+        results = [(id, url, digest, error) for (id, url), digest, error in results]
+        photo_ids = [id for id, _, _, _ in results]
+        jobs = {row.photo_id: row for row in job.query.filter(job.photo_id.in_(photo_ids))}
+        photos = {photo.id: photo for photo in PhotoModel.query.filter(PhotoModel.id.in_(photo_ids))}
+        finished, user_ids = {}, set()
+        for id, url, digest, error in results:
+            # The photo may have been removed, or given another url, while its thumbnails were rendered;
+            # the job is then another render's.
+            row, photo = jobs.get(id), photos.get(id)
+            if row is None or photo is None or photo.url != url:
+                continue
+            row.error = error
+            if digest is not None:
+                row.status = job.DONE
+                photo.thumbnail = digest
+                user_ids.add(photo.user_id)
+            else:
+                row.status = job.PENDING if row.attempts < thumbnailer.max_attempts else job.FAILED
+            finished[id] = row.status
+        if user_ids:
+            PhotoService._touch(*user_ids)
         cls.__session__.commit()
+        PhotoService._invalidate(*user_ids)
+        return finished
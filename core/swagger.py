@@ -0,0 +1,32 @@
+from flasgger import Swagger
+from flask import Flask
+
+
+def build_template(app: Flask) -> dict:
+    """Return the flasgger template of the application's marshmallow definitions"""
+    from apispec.ext.marshmallow import MarshmallowPlugin
+    from apispec_webframeworks.flask import FlaskPlugin
+    from flasgger.marshmallow_apispec import APISpec
+    from flasgger.utils import apispec_to_template
+
+    from . import __title__, __version__
+
+    api_spec = APISpec(
+        title=__title__,
+        version=__version__,
+        openapi_version="2.0",
+        plugins=[
+            FlaskPlugin(),
+            MarshmallowPlugin(schema_name_resolver=lambda schema: schema.__name__.replace("Schema", "")),
+        ],
+    )
+    return apispec_to_template(app, api_spec)
+
+
+class LazySwagger(Swagger):
+    """Swagger building its template on the first request of a spec instead of at startup."""
+
+    def get_apispecs(self, endpoint="apispec_1"):
+        if self.template is None:
+            self.template = build_template(self.app)
+        return super().get_apispecs(endpoint)
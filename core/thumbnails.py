@@ -0,0 +1,255 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import re
+import typing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from threading import Lock
+from urllib.parse import urlsplit
+from urllib.request import (
+    HTTPDefaultErrorHandler,
+    HTTPErrorProcessor,
+    HTTPHandler,
+    HTTPRedirectHandler,
+    HTTPSHandler,
+    OpenerDirector,
+    url2pathname,
+)
+
+from flask import Flask, current_app
+
+THUMBNAIL_NAME = re.compile(r"(?P<prefix>[0-9a-f]{2})/(?P<digest>[0-9a-f]{64})-(?P<size>[0-9]+)\.jpg")
+
+
+def thumbnail_name(digest: str, size: int = None) -> str:
+    """Returns the path, relative to `THUMBNAIL_DIR`, of the thumbnail of an image with `digest`, or of the image."""
+    if size is None:
+        return f"{digest[:2]}/{digest}"
+    return f"{digest[:2]}/{digest}-{size}.jpg"
+
+
+def is_thumbnail_name(name: str, sizes: typing.Iterable[int]) -> bool:
+    """Returns whether name is the name of a thumbnail in one of sizes, rather than of an image or any other file."""
+    match = THUMBNAIL_NAME.fullmatch(name)
+    return bool(match) and match["digest"][:2] == match["prefix"] and int(match["size"]) in sizes
+
+
+def check_public_address(address: str):
+    """Raises ValueError unless address is a public one, rather than a private, loopback or link-local one."""
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if getattr(ip, "ipv4_mapped", None):
+        ip = ip.ipv4_mapped
+    if not ip.is_global or ip.is_multicast:
+        raise ValueError(f"Refusing to fetch an image from the non-public address {address}.")
+
+
+class PublicHTTPConnection(http.client.HTTPConnection):
+    """An HTTP connection refusing non-public peers, checked once connected so the address cannot change after."""
+
+    def connect(self):
+        super().connect()
+        check_public_address(self.sock.getpeername()[0])
+
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+    def connect(self):
+        super().connect()
+        check_public_address(self.sock.getpeername()[0])
+
+
+class PublicHTTPHandler(HTTPHandler):
+    def http_open(self, request):
+        return self.do_open(PublicHTTPConnection, request)
+
+
+class PublicHTTPSHandler(HTTPSHandler):
+    def https_open(self, request):
+        return self.do_open(PublicHTTPSConnection, request, context=self._context)
+
+
+def public_opener() -> OpenerDirector:
+    """Returns an opener of http(s) URLs on public addresses only, at every redirect too; it ignores proxies."""
+    opener = OpenerDirector()
+    for handler in (
+        PublicHTTPHandler(),
+        PublicHTTPSHandler(),
+        HTTPRedirectHandler(),
+        HTTPDefaultErrorHandler(),
+        HTTPErrorProcessor(),
+    ):
+        opener.add_handler(handler)
+    return opener
+
+
+def read_image(source: str, timeout: float, max_bytes: int, allow_files: bool) -> bytes:
+    """Returns the bytes of the image at source, an http(s) URL or, when allowed, a file path or `file://` URL.
+
+    URLs are fetched from public addresses only, so a photo cannot make the
+    server request its own network or a cloud metadata endpoint.
+    """
+    url = urlsplit(source)
+    if url.scheme in ("http", "https"):
+        with public_opener().open(source, timeout=timeout) as response:
+            data = response.read(max_bytes + 1)
+    elif url.scheme in ("", "file") and allow_files:
+        with open(url2pathname(url.path) if url.scheme else source, "rb") as f:
+            data = f.read(max_bytes + 1)
+    else:
+        raise ValueError(f"Unsupported image source {source!r}.")
+    if len(data) > max_bytes:
+        raise ValueError(f"The image is larger than {max_bytes} bytes.")
+    return data
+
+
+def render(source: str, directory: str, sizes: typing.Sequence[int], timeout: float, max_bytes: int, allow_files: bool):
+    """Stores the image at source and its JPEG thumbnails under directory and returns the image digest.
+
+    Files are named after the SHA-256 of the image, so an image saved twice
+    is decoded once. Each thumbnail fits in a `size` pixels square and is
+    scaled down from the previous, larger one.
+    """
+    # Pillow is only needed where images are rendered, so starting the application does not import it.
+    from PIL import Image, ImageOps
+
+    data = read_image(source, timeout, max_bytes, allow_files)
+    digest = hashlib.sha256(data).hexdigest()
+    paths = {size: os.path.join(directory, thumbnail_name(digest, size)) for size in (None, *sizes)}
+    if all(os.path.exists(path) for path in paths.values()):
+        return digest
+
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEG images are decoded at the smallest scale that is still larger than the largest thumbnail.
+        image.draft("RGB", (max(sizes), max(sizes)))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    os.makedirs(os.path.dirname(paths[None]), exist_ok=True)
+    for size in sorted(sizes, reverse=True):
+        image.thumbnail((size, size), Image.LANCZOS)
+        with _replacing(paths[size]) as partial:
+            image.save(partial, "JPEG", quality=85, optimize=True)
+    with _replacing(paths[None]) as partial, open(partial, "wb") as f:
+        f.write(data)
+    return digest
+
+
+@contextmanager
+def _replacing(path: str):
+    """Yields a temporary path, renamed to path once written so readers never see a partial file."""
+    partial = f"{path}.{os.getpid()}.tmp"
+    yield partial
+    os.replace(partial, path)
+
+
+class Thumbnailer:
+    """Renders photo thumbnails on a process pool.
+
+    Decoding and resizing are CPU-bound, so they run in `THUMBNAIL_POOL_SIZE`
+    worker processes. Work started by a request is handed to a background
+    thread, which waits on the pool so the request does not. With no workers,
+    requests leave the work to `flask photo thumbnails`, which renders inline.
+    """
+
+    def __init__(self):
+        self.directory = "thumbnails"
+        self.sizes = (128, 512)
+        self.url = "/api/thumbnails"
+        self.max_attempts = 3
+        self.timeout = 10.0
+        self.max_bytes = 20 * 1024 * 1024
+        self.allow_files = False
+        self.rendering = 0
+        self._lock = Lock()
+        self._pool_size = 0
+        self._executor = None
+        self._background = None
+
+    def init_app(self, app: Flask):
+        self.shutdown()
+        self.directory = os.path.abspath(app.config["THUMBNAIL_DIR"])
+        self.sizes = tuple(app.config["THUMBNAIL_SIZES"])
+        self.url = app.config["THUMBNAIL_URL"].rstrip("/")
+        self.max_attempts = app.config["THUMBNAIL_MAX_ATTEMPTS"]
+        self.timeout = app.config["THUMBNAIL_FETCH_TIMEOUT"]
+        self.max_bytes = app.config["THUMBNAIL_MAX_BYTES"]
+        self.allow_files = app.config["THUMBNAIL_FILE_SOURCES"]
+        self._pool_size = app.config["THUMBNAIL_POOL_SIZE"]
+
+    def shutdown(self):
+        if self._background is not None:
+            self._background.shutdown(wait=True)
+            self._background = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def urls(self, digest: str) -> typing.Dict[str, str]:
+        """Returns the URL of every thumbnail of the image with `digest`, keyed by size."""
+        return {str(size): f"{self.url}/{thumbnail_name(digest, size)}" for size in self.sizes}
+
+    def render_all(self, sources: typing.Iterable[typing.Tuple[typing.Any, str]]):
+        """Renders the thumbnails of (key, source) pairs concurrently.
+
+        Yields (key, digest, error) as each one completes; the digest is None
+        and error describes the failure when the image could not be rendered.
+        """
+        args = (self.directory, self.sizes, self.timeout, self.max_bytes, self.allow_files)
+        if not self._pool_size:
+            for key, source in sources:
+                yield (key, *self._attempt(lambda: render(source, *args)))
+            return
+
+        futures = {self._get_executor().submit(render, source, *args): key for key, source in sources}
+        with self._lock:
+            self.rendering += len(futures)
+        try:
+            for future in as_completed(futures):
+                with self._lock:
+                    self.rendering -= 1
+                yield (futures.pop(future), *self._attempt(future.result))
+        finally:
+            with self._lock:
+                self.rendering -= len(futures)
+            for future in futures:
+                future.cancel()
+
+    def in_background(self, fn, *args):
+        """Calls fn with args in an application context on the background thread, unless there are no workers."""
+        if not self._pool_size:
+            return None
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    fn(*args)
+                except Exception:
+                    app.logger.exception("Rendering thumbnails in the background failed.")
+
+        with self._lock:
+            if self._background is None:
+                self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnails")
+            return self._background.submit(run)
+
+    @property
+    def stats(self) -> dict:
+        return dict(rendering=self.rendering, workers=self._pool_size)
+
+    @staticmethod
+    def _attempt(fn) -> typing.Tuple[typing.Optional[str], typing.Optional[str]]:
+        try:
+            return fn(), None
+        except Exception as error:  # Any failure fails the job, which is retried.
+            return None, f"{type(error).__name__}: {error}"
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ProcessPoolExecutor
+
+                self._executor = ProcessPoolExecutor(max_workers=self._pool_size)
+            return self._executor
+
+
+thumbnailer = Thumbnailer()
@@ -1,4 +1,7 @@
+import base64
+import binascii
 from functools import wraps
+from itertools import islice
 
 
 def unpack(value):
@@ -21,6 +24,15 @@ def unpack(value):
     return value, 200, {}
 
 
+def chunked(iterable, size: int):
+    """Yield lists of at most `size` items from an iterable"""
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
 def parse_args_with_schema(schema):
     def decorator(fn):
         @wraps(fn)
@@ -30,3 +42,17 @@ def parse_args_with_schema(schema):
         return wrapper
 
     return decorator
+
+
+def encode_cursor(value) -> str:
+    """Return an opaque, URL-safe representation of a pagination key"""
+    return base64.urlsafe_b64encode(str(value).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Return the pagination key of a cursor created by `encode_cursor`"""
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(cursor + padding).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor.")
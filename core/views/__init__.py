@@ -1,12 +1,74 @@
+from http import HTTPStatus
+
 from flask.blueprints import Blueprint
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm.exc import StaleDataError
+
+from core.hashing import HashingPoolBusy
+from core.idempotency import IdempotencyKeyInFlight, IdempotencyKeyReused
+from core.ratelimit import RateLimitExceeded
 
+from .album import AlbumPhotosView, AlbumPhotoView, AlbumsView, AlbumView
 from .auth import LoginView
-from .photo import PhotoView, PhotosView
-from .user import UsersView
+from .health import HealthView
+from .photo import PhotoContentView, PhotosBatchView, PhotoView, PhotosView
+from .thumbnail import ThumbnailView
+from .user import UserPhotosView, UsersView
 
 api_bp = Blueprint("api", __name__, url_prefix="/api")
 
+api_bp.add_url_rule("/health", "health", HealthView.as_view("health"))
 api_bp.add_url_rule("/login", "login", LoginView.as_view("login"))
 api_bp.add_url_rule("/users", "users", UsersView.as_view("users"))
+api_bp.add_url_rule("/users/<int:id>/photos", "user_photos", UserPhotosView.as_view("user_photos"))
 api_bp.add_url_rule("/photos", "photos", PhotosView.as_view("photos"))
-api_bp.add_url_rule("/photos/<id>", "photo", PhotoView.as_view("photo"))
+api_bp.add_url_rule("/photos:batch", "photos_batch", PhotosBatchView.as_view("photos_batch"))
+api_bp.add_url_rule("/photos/<int:id>", "photo", PhotoView.as_view("photo"))
+api_bp.add_url_rule("/photos/<int:id>/content", "photo_content", PhotoContentView.as_view("photo_content"))
+api_bp.add_url_rule("/albums", "albums", AlbumsView.as_view("albums"))
+api_bp.add_url_rule("/albums/<int:id>", "album", AlbumView.as_view("album"))
+api_bp.add_url_rule("/albums/<int:id>/photos", "album_photos", AlbumPhotosView.as_view("album_photos"))
+api_bp.add_url_rule("/albums/<int:id>/photos/<int:photo_id>", "album_photo", AlbumPhotoView.as_view("album_photo"))
+api_bp.add_url_rule("/thumbnails/<path:name>", "thumbnail", ThumbnailView.as_view("thumbnail"))
+
+
+@api_bp.errorhandler(HashingPoolBusy)
+def handle_hashing_pool_busy(_):
+    return (
+        dict(message="Too many requests are being authenticated, try again later."),
+        HTTPStatus.SERVICE_UNAVAILABLE,
+        {"Retry-After": "1"},
+    )
+
+
+@api_bp.errorhandler(IdempotencyKeyInFlight)
+def handle_idempotency_key_in_flight(_):
+    return (
+        dict(message="A request with this Idempotency-Key is being handled, try again later."),
+        HTTPStatus.CONFLICT,
+        {"Retry-After": "1"},
+    )
+
+
+@api_bp.errorhandler(IdempotencyKeyReused)
+def handle_idempotency_key_reused(_):
+    return dict(message="The Idempotency-Key was used for another request."), HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+@api_bp.errorhandler(RateLimitExceeded)
+def handle_rate_limit_exceeded(error):
+    return (
+        dict(message="Too many requests, try again later."),
+        HTTPStatus.TOO_MANY_REQUESTS,
+        {"Retry-After": str(error.retry_after)},
+    )
+
+
+@api_bp.errorhandler(NoResultFound)
+def handle_no_result_found(_):
+    return dict(message="Resource not found."), HTTPStatus.NOT_FOUND
+
+
+@api_bp.errorhandler(StaleDataError)
+def handle_stale_data(_):
+    return dict(message="The resource was modified."), HTTPStatus.PRECONDITION_FAILED
@@ -0,0 +1,220 @@
+from http import HTTPStatus
+
+from flasgger import SwaggerView
+from flask_jwt_extended import current_user, jwt_required
+from webargs.flaskparser import use_args
+
+from core.schemas import AlbumPageSchema, AlbumPhotosSchema, AlbumSchema, PaginationSchema, PhotoPageSchema
+from core.services import AlbumService
+
+from .conditional import etag_header, make_etag, not_modified
+
+
+def album_etag(album) -> str:
+    return make_etag("album", album.id, album.version)
+
+
+class BaseAlbumView(SwaggerView):
+    service = AlbumService
+    decorators = [jwt_required()]
+    tags = ["albums"]
+    definitions = {
+        "AlbumSchema": AlbumSchema,
+        "AlbumPageSchema": AlbumPageSchema,
+        "AlbumPhotosSchema": AlbumPhotosSchema,
+        "PhotoPageSchema": PhotoPageSchema,
+    }
+
+
+class AlbumsView(BaseAlbumView):
+    @use_args(PaginationSchema, location="query")
+    @AlbumPageSchema.dump_with()
+    def get(self, args):
+        """Endpoint that returns a page of albums, with their photo count and cover photo.
+        ---
+        parameters:
+            -   in: query
+                type: string
+                name: cursor
+                description: The `next_cursor` of the previous page.
+            -   in: query
+                type: integer
+                name: limit
+                default: 50
+                minimum: 1
+                maximum: 500
+        responses:
+            200:
+                description: A page of albums.
+                schema:
+                    $ref: '#/definitions/AlbumPageSchema'
+            422:
+                description: Unprocessable parameters.
+        """
+        return self.service.paginate(current_user.id, **args), HTTPStatus.OK
+
+    @use_args(AlbumSchema)
+    @AlbumSchema.dump_with()
+    def post(self, album):
+        """Endpoint that creates an album.
+        ---
+        parameters:
+            -   in: body
+                schema:
+                    $ref: '#/definitions/AlbumSchema'
+        responses:
+            201:
+                description: The new album, without photos.
+                schema:
+                    $ref: '#/definitions/AlbumSchema'
+            422:
+                description: Unprocessable parameters.
+        """
+        album.user_id = current_user.id
+        album.cover_photo_id = None
+        album = self.service.save(album)
+        return album, HTTPStatus.CREATED, etag_header(album_etag(album))
+
+
+class AlbumView(BaseAlbumView):
+    @AlbumSchema.dump_with()
+    def get(self, id):
+        """Endpoint that returns an album.
+        ---
+        parameters:
+            -   in: path
+                type: integer
+                name: id
+        responses:
+            200:
+                description: The album.
+                schema:
+                    $ref: '#/definitions/AlbumSchema'
+            304:
+                description: The album did not change since the `If-None-Match` ETag.
+            404:
+                description: Album not found.
+        """
+        album = self.service.get_by_id(id, current_user.id)
+        etag = album_etag(album)
+        return not_modified(etag) or (album, HTTPStatus.OK, etag_header(etag))
+
+    @use_args(AlbumSchema)
+    @AlbumSchema.dump_with()
+    def put(self, album, id):
+        """Endpoint that updates an album's title, description and cover photo.
+        ---
+        parameters:
+            -   in: path
+                type: integer
+                name: id
+            -   in: body
+                schema:
+                    $ref: '#/definitions/AlbumSchema'
+        responses:
+            200:
+                description: The updated album.
+                schema:
+                    $ref: '#/definitions/AlbumSchema'
+            404:
+                description: Album not found, or the cover photo is not in the album.
+            422:
+                description: Unprocessable parameters.
+        """
+        album.id = id
+        album.user_id = current_user.id
+        album = self.service.save(album)
+        return album, HTTPStatus.OK, etag_header(album_etag(album))
+
+    def delete(self, id):
+        """Endpoint that deletes an album, keeping its photos.
+        ---
+        parameters:
+            -   in: path
+                type: integer
+                name: id
+        responses:
+            204:
+                description: Album was deleted.
+            404:
+                description: Album not found.
+        """
+        self.service.remove(id, current_user.id)
+        return "", HTTPStatus.NO_CONTENT
+
+
+class AlbumPhotosView(BaseAlbumView):
+    @use_args(PaginationSchema, location="query")
+    @PhotoPageSchema.dump_with()
+    def get(self, args, id):
+        """Endpoint that returns a page of an album's photos, in album order.
+        ---
+        parameters:
+            -   in: path
+                type: integer
+                name: id
+            -   in: query
+                type: string
+                name: cursor
+                description: The `next_cursor` of the previous page.
+            -   in: query
+                type: integer
+                name: limit
+                default: 50
+                minimum: 1
+                maximum: 500
+        responses:
+            200:
+                description: A page of photos.
+                schema:
+                    $ref: '#/definitions/PhotoPageSchema'
+            404:
+                description: Album not found.
+        """
+        return self.service.photos(id, current_user.id, **args), HTTPStatus.OK
+
+    @use_args(AlbumPhotosSchema)
+    @AlbumSchema.dump_with()
+    def post(self, args, id):
+        """Endpoint that appends photos to an album; photos already in it keep their position.
+        ---
+        parameters:
+            -   in: path
+                type: integer
+                name: id
+            -   in: body
+                schema:
+                    $ref: '#/definitions/AlbumPhotosSchema'
+        responses:
+            200:
+                description: The album.
+                schema:
+                    $ref: '#/definitions/AlbumSchema'
+            404:
+                description: Album or one of the photos not found.
+            422:
+                description: Unprocessable parameters.
+        """
+        album = self.service.add(id, current_user.id, args["photo_ids"])
+        return album, HTTPStatus.OK, etag_header(album_etag(album))
+
+
+class AlbumPhotoView(BaseAlbumView):
+    def delete(self, id, photo_id):
+        """Endpoint that removes a photo from an album, keeping the photo.
+        ---
+        parameters:
+            -   in: path
+                type: integer
+                name: id
+            -   in: path
+                type: integer
+                name: photo_id
+        responses:
+            204:
+                description: The photo is no longer in the album.
+            404:
+                description: Album not found.
+        """
+        self.service.discard(id, current_user.id, [photo_id])
+        return "", HTTPStatus.NO_CONTENT
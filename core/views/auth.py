@@ -1,13 +1,20 @@
 from http import HTTPStatus
 from flasgger import SwaggerView
+from flask_jwt_extended import current_user, get_jwt, jwt_required
 from webargs.flaskparser import use_args
 
+from core.ratelimit import client_address, credentials_email, limiter
 from core.schemas import LoginSchema
 from core.services import LoginService
 
 
 class LoginView(SwaggerView):
     service = LoginService
+    # Credentials are throttled before their password is hashed.
+    decorators = [
+        limiter.limit("login_address", client_address, methods=("POST",)),
+        limiter.limit("login_email", credentials_email, methods=("POST",)),
+    ]
     tags = ["auth"]
     definitions = {
         "LoginSchema": LoginSchema,
@@ -30,6 +37,8 @@ class LoginView(SwaggerView):
                     properties:
                         access_token:
                             type: string
+                        refresh_token:
+                            type: string
             401:
                 description: Credentials are invalid.
                 schema:
@@ -40,6 +49,8 @@ class LoginView(SwaggerView):
                             example: 'E-mail or password are invalid.'
             422:
                 description: Unprocessable parameters.
+            429:
+                description: Too many attempts from this address or for this e-mail, retry after `Retry-After` seconds.
         """
         if not self.service.check_credentials(credentials):
             return (
@@ -47,5 +58,42 @@ class LoginView(SwaggerView):
                 HTTPStatus.UNAUTHORIZED,
             )
 
-        access_token = self.service.get_access_token(credentials)
-        return dict(access_token=access_token)
+        access_token, refresh_token = self.service.get_tokens(credentials)
+        return dict(access_token=access_token, refresh_token=refresh_token)
+
+    @jwt_required(refresh=True)
+    def put(self):
+        """Endpoint that issues a new access token from a refresh token.
+        ---
+        parameters:
+            -   name: Authorization
+                in: header
+                type: string
+                description: 'Bearer <refresh_token>'
+        responses:
+            200:
+                description: New access token.
+                schema:
+                    type: object
+                    properties:
+                        access_token:
+                            type: string
+            401:
+                description: The refresh token is missing, expired or revoked.
+            422:
+                description: The token is not a refresh token.
+        """
+        return dict(access_token=self.service.refresh(current_user, get_jwt()["jti"]))
+
+    @jwt_required()
+    def delete(self):
+        """Endpoint that logs out, revoking the access token and its refresh token.
+        ---
+        responses:
+            204:
+                description: Tokens revoked.
+            401:
+                description: The access token is missing, expired or revoked.
+        """
+        self.service.revoke(get_jwt())
+        return "", HTTPStatus.NO_CONTENT
@@ -0,0 +1,51 @@
+import hashlib
+from http import HTTPStatus
+
+from flask import Response, current_app, jsonify, request
+from werkzeug.http import quote_etag
+
+from core.cache import response_cache
+
+
+def make_etag(*parts) -> str:
+    """Return a strong entity tag identifying a representation by its parts"""
+    return hashlib.blake2b(":".join(map(str, parts)).encode(), digest_size=16).hexdigest()
+
+
+def etag_header(etag: str) -> dict:
+    return {"ETag": quote_etag(etag)}
+
+
+def not_modified(etag: str):
+    """Return a 304 response if the client's `If-None-Match` matches etag"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=HTTPStatus.NOT_MODIFIED)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def precondition_failed(etag: str):
+    """Return a 412 response if the client sent an `If-Match` that does not match etag"""
+    if request.if_match and not request.if_match.contains(etag):
+        return jsonify(message="The resource was modified."), HTTPStatus.PRECONDITION_FAILED
+    return None
+
+
+def cached_response(key: str, render):
+    """Return the response cached under key, calling render to build and cache it on a miss.
+
+    Only successful responses with an ETag are cached, and their ETag is kept
+    along with the body so a hit can still be answered with 304.
+    """
+    entry = response_cache.get(key)
+    if entry is not None:
+        etag, _, body = entry.partition(b"\n")
+        etag = etag.decode()
+        return not_modified(etag) or Response(body, mimetype="application/json", headers=etag_header(etag))
+
+    response = current_app.make_response(render())
+    etag, _ = response.get_etag()
+    if response.status_code == HTTPStatus.OK and etag:
+        response_cache.set(key, etag.encode() + b"\n" + response.get_data())
+    return response
@@ -0,0 +1,56 @@
+import os
+
+from flask import Response, current_app, request
+from flask.helpers import safe_join
+from werkzeug.exceptions import NotFound
+from werkzeug.wsgi import wrap_file
+
+from core.thumbnails import thumbnailer
+
+from .conditional import not_modified
+
+
+def send_stored_file(name: str, mimetype: str, etag: str, cache_control: str) -> Response:
+    """Return a response serving the file `name` of `THUMBNAIL_DIR`, whose content etag identifies.
+
+    The file is passed to the server's `wsgi.file_wrapper`, which may send it
+    with sendfile, and Range requests are answered with its parts. With
+    `CONTENT_OFFLOAD`, the reverse proxy sends the file instead, told so by
+    an `X-Sendfile` or `X-Accel-Redirect` header. A matching `If-None-Match`
+    is answered before the file is even opened.
+    """
+    response = not_modified(etag)
+    if response:
+        response.headers["Cache-Control"] = cache_control
+        return response
+
+    path = safe_join(thumbnailer.directory, name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise NotFound()
+
+    offload = current_app.config["CONTENT_OFFLOAD"]
+    if offload == "x-accel-redirect":
+        response = offloaded_response(mimetype)
+        response.headers["X-Accel-Redirect"] = f"{current_app.config['CONTENT_ACCEL_PREFIX'].rstrip('/')}/{name}"
+    elif offload == "x-sendfile":
+        response = offloaded_response(mimetype)
+        response.headers["X-Sendfile"] = path
+    else:
+        file = open(path, "rb")
+        response = Response(wrap_file(request.environ, file), mimetype=mimetype, direct_passthrough=True)
+        response.headers["Accept-Ranges"] = "bytes"
+        response.content_length = stat.st_size
+    response.last_modified = int(stat.st_mtime)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    # The ranges of an offloaded file are served by the proxy.
+    return response.make_conditional(request, accept_ranges=True, complete_length=None if offload else stat.st_size)
+
+
+def offloaded_response(mimetype: str) -> Response:
+    """Return an empty response for the proxy to fill with a file, leaving it to set the Content-Length."""
+    response = Response(mimetype=mimetype)
+    response.automatically_set_content_length = False
+    return response
@@ -0,0 +1,34 @@
+from http import HTTPStatus
+
+from flasgger import SwaggerView
+from flask import jsonify
+
+from core.db import db
+from core.instrumentation import monitoring_authorized
+
+
+class HealthView(SwaggerView):
+    tags = ["health"]
+
+    def get(self):
+        """Endpoint that reports this worker's health and, to monitoring, its database pool usage.
+
+        Anyone may check the status; the pool usage is only reported to
+        requests with the `MONITORING_TOKEN` as their bearer token.
+        ---
+        responses:
+            200:
+                description: The worker is healthy.
+                schema:
+                    type: object
+                    properties:
+                        status:
+                            type: string
+                            example: ok
+                        pool:
+                            type: object
+                            description: Connections checked in and out, overflow and time waited for checkouts.
+        """
+        if not monitoring_authorized():
+            return jsonify(status="ok"), HTTPStatus.OK
+        return jsonify(status="ok", pool=db.pool_stats()), HTTPStatus.OK
@@ -1,11 +1,36 @@
+import mimetypes
 from http import HTTPStatus
 
 from flasgger import SwaggerView
+from flask import current_app, jsonify, request
 from flask_jwt_extended import jwt_required, current_user
 from webargs.flaskparser import use_args
 
-from core.schemas import PhotoSchema
+from core.idempotency import idempotent
+from core.ingest import ingest_photos, parse_ndjson
+from core.schemas import (
+    NDJSON_MIMETYPE,
+    BatchResultSchema,
+    PhotoAlbumsSchema,
+    PhotoContentSchema,
+    PhotoFieldsSchema,
+    PhotoIdsQuerySchema,
+    PhotoIdsSchema,
+    PhotoPageSchema,
+    PhotoQuerySchema,
+    PhotoSchema,
+    wants_ndjson,
+)
 from core.services import PhotoService
+from core.thumbnails import thumbnail_name
+
+from .conditional import cached_response, etag_header, make_etag, not_modified, precondition_failed
+from .files import send_stored_file
+
+
+def photo_etag(photo, only=None) -> str:
+    """Return the ETag of a photo's representation, which differs for every sparse fieldset"""
+    return make_etag("photo", photo.id, photo.version, *sorted(only or ()))
 
 
 class BasePhotoView(SwaggerView):
@@ -13,29 +38,99 @@ class BasePhotoView(SwaggerView):
     decorators = [jwt_required()]
     tags = ["photos"]
     definitions = {
+        "BatchResultSchema": BatchResultSchema,
+        "PhotoIdsSchema": PhotoIdsSchema,
         "PhotoSchema": PhotoSchema,
+        "PhotoPageSchema": PhotoPageSchema,
     }
 
 
 class PhotosView(BasePhotoView):
-    @PhotoSchema.dump_with(many=True)
-    def get(self):
-        """Endpoint that returns a list of photos.
+    @use_args(PhotoQuerySchema, location="query")
+    def get(self, args):
+        """Endpoint that returns a page of photos.
         ---
+        parameters:
+            -   in: query
+                type: string
+                name: cursor
+                description: The `next_cursor` of the previous page.
+            -   in: query
+                type: integer
+                name: limit
+                default: 50
+                minimum: 1
+                maximum: 500
+            -   in: query
+                type: boolean
+                name: stream
+                description: >
+                    Streams every photo instead of a page, as a JSON array or,
+                    with `Accept: application/x-ndjson`, as newline delimited JSON.
+            -   in: query
+                type: array
+                items:
+                    type: string
+                    enum: [id, title, url, description, thumbnails]
+                collectionFormat: csv
+                name: fields
+                description: Returns only these fields of every photo.
+            -   in: query
+                type: string
+                name: q
+                description: Returns the photos whose title or description has words starting with every word of q.
+            -   in: query
+                type: string
+                name: sort
+                enum: [id, -id]
+                default: id
+                description: Orders the photos by ascending id or, with `-id`, by descending id.
+            -   in: query
+                type: integer
+                name: min_id
+            -   in: query
+                type: integer
+                name: max_id
+        produces:
+            - application/json
+            - application/x-ndjson
         responses:
             200:
-                description: A list of photos
+                description: A page of photos
                 schema:
-                    type: array
-                    items:
-                        $ref: '#/definitions/PhotoSchema'
+                    $ref: '#/definitions/PhotoPageSchema'
+            304:
+                description: The photos did not change since the `If-None-Match` ETag.
+            422:
+                description: Unprocessable parameters.
         """
         user_id = current_user.id
-        return self.service.list(user_id), HTTPStatus.OK
+        version = self.service.collection_version(user_id)
+        etag = make_etag("photos", user_id, version, request.query_string.decode(), wants_ndjson())
+        response = not_modified(etag)
+        if response:
+            return response
+
+        only = args.pop("only")
+        if args.pop("stream") or wants_ndjson():
+            chunk_size = current_app.config["STREAM_CHUNK_SIZE"]
+            search = {key: value for key, value in args.items() if key not in ("cursor", "limit")}
+            response = PhotoSchema.stream(self.service.stream(user_id, chunk_size, only, **search), only)
+            response.set_etag(etag)
+            return response
+
+        page_only = only and [f"items.{name}" for name in only] + ["next_cursor"]
+        render = PhotoPageSchema.dump_with(only=page_only)(self._page)
+        return cached_response(f"photos:{user_id}:{etag}", lambda: render(user_id, args, only, etag))
+
+    def _page(self, user_id, args, only, etag):
+        return self.service.paginate(user_id, fields=only, **args), HTTPStatus.OK, etag_header(etag)
 
+    @idempotent
     @use_args(PhotoSchema)
+    @use_args(PhotoAlbumsSchema, location="query")
     @PhotoSchema.dump_with()
-    def post(self, photo):
+    def post(self, photo, args):
         """Endpoint that saves a new photo.
         ---
         responses:
@@ -43,19 +138,97 @@ class PhotosView(BasePhotoView):
                 description: Successful in order of save a new photo representation.
                 schema:
                     $ref: '#/definitions/PhotoSchema'
+            404:
+                description: One of the albums not found.
+            409:
+                description: A request with the same `Idempotency-Key` is being handled.
+            422:
+                description: Unprocessable parameters, or the `Idempotency-Key` was used for another request.
         parameters:
+            -   in: header
+                type: string
+                name: Idempotency-Key
+                description: Retries with this key get the response to the first request instead of another photo.
             -   in: body
                 schema:
                     $ref: '#/definitions/PhotoSchema'
+            -   in: query
+                type: array
+                items:
+                    type: integer
+                collectionFormat: csv
+                name: album_ids
+                description: Also appends the photo to these albums.
         """
-        photo.user_id = 1
-        self.service.save(photo)
+        photo.user_id = current_user.id
+        self.service.save(photo, args["album_ids"])
         return photo, HTTPStatus.CREATED
 
+    @use_args(PhotoIdsQuerySchema, location="query")
+    @PhotoIdsSchema.dump_with()
+    def delete(self, args):
+        """Endpoint that deletes many photos at once.
+        ---
+        parameters:
+            -   in: query
+                type: array
+                items:
+                    type: integer
+                collectionFormat: csv
+                name: ids
+                required: true
+                description: The ids of up to 500 photos.
+        responses:
+            200:
+                description: The ids of the photos that were deleted; the others were not found.
+                schema:
+                    $ref: '#/definitions/PhotoIdsSchema'
+            422:
+                description: Unprocessable parameters.
+        """
+        return dict(ids=self.service.remove_many(args["ids"], current_user.id)), HTTPStatus.OK
+
+
+class PhotosBatchView(BasePhotoView):
+    @BatchResultSchema.dump_with(many=True)
+    def post(self):
+        """Endpoint that saves many new photos at once.
+        ---
+        consumes:
+            - application/json
+            - application/x-ndjson
+        parameters:
+            -   in: body
+                name: photos
+                description: An array of photos, or one photo per line as newline delimited JSON.
+                schema:
+                    type: array
+                    items:
+                        $ref: '#/definitions/PhotoSchema'
+        responses:
+            207:
+                description: The result of every photo, in the order they were sent.
+                schema:
+                    type: array
+                    items:
+                        $ref: '#/definitions/BatchResultSchema'
+            422:
+                description: The body is not an array of photos.
+        """
+        if request.mimetype == NDJSON_MIMETYPE:
+            records = parse_ndjson(request.stream)
+        else:
+            records = request.get_json(silent=True)
+            if not isinstance(records, list):
+                return jsonify(message="Expected an array of photos."), HTTPStatus.UNPROCESSABLE_ENTITY
+
+        chunk_size = current_app.config["BATCH_CHUNK_SIZE"]
+        return list(ingest_photos(records, current_user.id, chunk_size)), HTTPStatus.MULTI_STATUS
+
 
 class PhotoView(BasePhotoView):
-    @PhotoSchema.dump_with()
-    def get(self, id):
+    @use_args(PhotoFieldsSchema, location="query")
+    def get(self, args, id):
         """Endpoint returns a photo given a specified id.
         ---
         responses:
@@ -63,13 +236,35 @@ class PhotoView(BasePhotoView):
                 description: Successful photo request.
                 schema:
                     $ref: '#/definitions/PhotoSchema'
+            304:
+                description: The photo did not change since the `If-None-Match` ETag.
+            404:
+                description: Photo not found.
         parameters:
             -   in: path
                 type: integer
                 name: id
+            -   in: query
+                type: array
+                items:
+                    type: string
+                    enum: [id, title, url, description, thumbnails]
+                collectionFormat: csv
+                name: fields
+                description: Returns only these fields of the photo.
         """
         user_id = current_user.id
-        return self.service.get_by_id(id, user_id), HTTPStatus.OK
+        only = args["only"]
+        version = self.service.collection_version(user_id)
+        key = f"photo:{user_id}:{id}:{version}:{','.join(sorted(only or ()))}"
+        render = PhotoSchema.dump_with(only=only)(self._get)
+        return cached_response(key, lambda: render(id, user_id, only))
+
+    def _get(self, id, user_id, only):
+        # The version is loaded along with the requested fields, it makes the ETag.
+        photo = self.service.get_by_id(id, user_id, only and [*only, "version"])
+        etag = photo_etag(photo, only)
+        return not_modified(etag) or (photo, HTTPStatus.OK, etag_header(etag))
 
     def delete(self, id):
         """Endpoint that deletes a photo given a specified id.
@@ -77,12 +272,20 @@ class PhotoView(BasePhotoView):
         responses:
             204:
                 description: Photo was sucessfully deleted.
+            404:
+                description: Photo not found.
+            412:
+                description: The photo changed since the `If-Match` ETag.
         parameters:
             -   in: path
                 type: integer
                 name: id
         """
         user_id = current_user.id
+        if request.if_match:
+            response = precondition_failed(photo_etag(self.service.get_for_update(id, user_id)))
+            if response:
+                return response
         self.service.remove(id, user_id)
         return "", HTTPStatus.NO_CONTENT
 
@@ -96,6 +299,10 @@ class PhotoView(BasePhotoView):
                 description: Successful in order of updates a photo representation.
                 schema:
                     $ref: '#/definitions/PhotoSchema'
+            404:
+                description: Photo not found.
+            412:
+                description: The photo changed since the `If-Match` ETag.
         parameters:
             -   in: path
                 type: integer
@@ -104,7 +311,54 @@ class PhotoView(BasePhotoView):
                 schema:
                     $ref: '#/definitions/PhotoSchema'
         """
+        user_id = current_user.id
+        if request.if_match:
+            response = precondition_failed(photo_etag(self.service.get_for_update(id, user_id)))
+            if response:
+                return response
         photo.id = id
-        photo.user_id = current_user.id
-        self.service.save(photo)
-        return photo, HTTPStatus.OK
+        photo.user_id = user_id
+        photo = self.service.save(photo)
+        return photo, HTTPStatus.OK, etag_header(photo_etag(photo))
+
+
+class PhotoContentView(BasePhotoView):
+    @use_args(PhotoContentSchema, location="query")
+    def get(self, args, id):
+        """Endpoint that returns the image of a photo, or one of its thumbnails.
+        ---
+        produces:
+            - image/*
+        responses:
+            200:
+                description: The image.
+            206:
+                description: The requested bytes of the image.
+            304:
+                description: The image did not change since the `If-None-Match` ETag.
+            404:
+                description: Photo not found, or its image was not stored yet.
+            422:
+                description: Unprocessable parameters.
+        parameters:
+            -   in: path
+                type: integer
+                name: id
+            -   in: query
+                type: integer
+                name: size
+                description: Returns the thumbnail of this size, one of the keys of the photo's `thumbnails`.
+            -   in: header
+                type: string
+                name: Range
+                description: Requests only these bytes of the image.
+        """
+        photo = self.service.get_by_id(id, current_user.id, ["url", "thumbnail"])
+        if photo.thumbnail is None:
+            return jsonify(message="The image was not stored yet."), HTTPStatus.NOT_FOUND
+
+        size = args["size"]
+        name = thumbnail_name(photo.thumbnail, size)
+        mimetype = "image/jpeg" if size else mimetypes.guess_type(photo.url)[0] or "application/octet-stream"
+        # The URL stays the same when the photo's image changes, so caches must revalidate with the ETag.
+        return send_stored_file(name, mimetype, name.rpartition("/")[2], "private, no-cache")
@@ -0,0 +1,40 @@
+from flasgger import SwaggerView
+from werkzeug.exceptions import NotFound
+
+from core.thumbnails import is_thumbnail_name, thumbnailer
+
+from .files import send_stored_file
+
+
+class ThumbnailView(SwaggerView):
+    tags = ["photos"]
+
+    def get(self, name):
+        """Endpoint that returns a photo thumbnail, as listed in the photo's `thumbnails`.
+        ---
+        parameters:
+            -   in: path
+                type: string
+                name: name
+                required: true
+            -   in: header
+                type: string
+                name: Range
+                description: Requests only these bytes of the thumbnail.
+        produces:
+            - image/jpeg
+        responses:
+            200:
+                description: The thumbnail. Its name is its image's digest, so it never changes.
+            206:
+                description: The requested bytes of the thumbnail.
+            304:
+                description: The thumbnail did not change since the `If-None-Match` ETag.
+            404:
+                description: Thumbnail not found.
+        """
+        # Only thumbnails are public; the images they were rendered from are served to their owner.
+        if not is_thumbnail_name(name, thumbnailer.sizes):
+            raise NotFound()
+        # Thumbnails are content-addressed, so they are cached forever and the name is their ETag.
+        return send_stored_file(name, "image/jpeg", name.rpartition("/")[2], "public, max-age=31536000, immutable")
@@ -1,19 +1,26 @@
 from http import HTTPStatus
 
 from flasgger import SwaggerView
+from flask import jsonify
 from flask_jwt_extended import current_user, jwt_required
+from sqlalchemy.exc import NoResultFound
 from webargs.flaskparser import use_args
 
-from core.schemas import UserSchema
-from core.services import UserService
+from core.idempotency import idempotent
+from core.ratelimit import client_address, limiter
+from core.schemas import UserPhotosQuerySchema, UserPhotosSchema, UserSchema
+from core.services import PhotoService, UserService
+
+from .conditional import etag_header, make_etag, not_modified
 
 
 class BaseUserView(SwaggerView):
     service = UserService
-    decorators = [jwt_required(optional=True)]
+    decorators = [jwt_required(optional=True), limiter.limit("signup_address", client_address, methods=("POST",))]
     tags = ["users"]
     definitions = {
         "UserSchema": UserSchema,
+        "UserPhotosSchema": UserPhotosSchema,
     }
 
 
@@ -27,25 +34,74 @@ class UsersView(BaseUserView):
                 description: Authenticated user.
                 schema:
                     $ref: '#/definitions/UserSchema'
+            304:
+                description: The user did not change since the `If-None-Match` ETag.
             401:
                 description: Unauthorized by lack of credentials.
         """
         if not current_user:
-            return dict(message="Unauthorized by lack of credentials."), HTTPStatus.UNAUTHORIZED
-        id = current_user.id
-        return self.service.get_by_id(id), HTTPStatus.OK
+            return jsonify(message="Unauthorized by lack of credentials."), HTTPStatus.UNAUTHORIZED
+        user = self.service.get_by_id(current_user.id)
+        etag = make_etag("user", user.id, user.version)
+        return not_modified(etag) or (user, HTTPStatus.OK, etag_header(etag))
 
+    @idempotent
     @UserSchema.dump_with()
     @use_args(UserSchema)
     def post(self, user):
         """Endpoint creates an user.
         ---
+        parameters:
+            -   in: header
+                type: string
+                name: Idempotency-Key
+                description: Retries with this key get the response to the first request instead of another user.
         responses:
             200:
                 description: Successfully newly created user.
                 schema:
                     $ref: '#/definitions/UserSchema'
+            409:
+                description: A request with the same `Idempotency-Key` is being handled.
             422:
-                description: Unprocessable parameters.
+                description: Unprocessable parameters, or the `Idempotency-Key` was used for another request.
+            429:
+                description: Too many users created from this address, retry after `Retry-After` seconds.
         """
         return self.service.save(user), HTTPStatus.CREATED
+
+
+class UserPhotosView(BaseUserView):
+    decorators = [jwt_required()]
+
+    @use_args(UserPhotosQuerySchema, location="query")
+    @UserPhotosSchema.dump_with()
+    def get(self, args, id):
+        """Endpoint returns a summary of an user's photos: how many there are and the most recent ones.
+        ---
+        parameters:
+            -   in: path
+                type: integer
+                name: id
+            -   in: query
+                type: integer
+                name: limit
+                default: 10
+                minimum: 0
+                maximum: 100
+                description: How many of the most recent photos are returned.
+        responses:
+            200:
+                description: The user, with their photo count and most recent photos.
+                schema:
+                    $ref: '#/definitions/UserPhotosSchema'
+            404:
+                description: User not found.
+        """
+        if id != current_user.id:
+            raise NoResultFound()
+        # Two queries however many photos there are: the user with their count, then a page of photos.
+        [(user, photo_count)] = self.service.with_photo_counts(id=id)
+        photos = PhotoService.paginate(id, limit=args["limit"], sort="-id").items if args["limit"] else []
+        summary = dict(id=user.id, name=user.name, email=user.email, photo_count=photo_count, photos=photos)
+        return summary, HTTPStatus.OK
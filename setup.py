@@ -13,7 +13,7 @@ setup(
     name=__title__.replace(" ", "_").lower(),
     version=__version__,
     long_description=__doc__,
-    packages=[p for p in find_packages() if p != "tests"],
+    packages=[p for p in find_packages() if p not in ("tests", "benchmarks")],
     include_package_data=True,
     zip_safe=False,
     install_requires=get_requirements(),
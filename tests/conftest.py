@@ -0,0 +1,16 @@
+import threading
+
+import pytest
+
+from .fake_redis import FakeRedis
+from .test_api import access_token, app, auth_header, client, photos  # noqa: F401
+
+
+@pytest.fixture
+def redis_server():
+    server = FakeRedis()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
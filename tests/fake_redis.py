@@ -0,0 +1,71 @@
+import socketserver
+import threading
+import time
+
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    """A Redis-compatible server keeping strings in a dict, for the commands the app uses."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.data = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return "redis://{}:{}/0".format(*self.server_address)
+
+    def get(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = [self.rfile.read(int(self.rfile.readline()[1:-2]) + 2)[:-2] for _ in range(int(line[1:-2]))]
+            with self.server.lock:
+                reply = self.execute(args[0].decode().upper(), args[1:])
+            self.wfile.write(reply)
+
+    def execute(self, command, args):
+        server = self.server
+        if command in ("PING", "SELECT"):
+            return b"+OK\r\n"
+        if command == "FLUSHDB":
+            server.data.clear()
+            return b"+OK\r\n"
+        if command == "GET":
+            return bulk(server.get(args[0]))
+        if command == "SET":
+            key, value, options = args[0], args[1], [arg.decode().upper() for arg in args[2:]]
+            if "NX" in options and server.get(key) is not None:
+                return b"$-1\r\n"
+            expires = time.monotonic() + int(options[options.index("EX") + 1]) if "EX" in options else None
+            server.data[key] = (value, expires)
+            return b"+OK\r\n"
+        if command == "INCR":
+            value = int(server.get(args[0]) or 0) + 1
+            server.data[args[0]] = (str(value).encode(), server.data.get(args[0], (None, None))[1])
+            return b":%d\r\n" % value
+        if command == "EXPIRE":
+            value = server.get(args[0])
+            if value is not None:
+                server.data[args[0]] = (value, time.monotonic() + int(args[1]))
+            return b":%d\r\n" % (value is not None)
+        if command == "DEL":
+            return b":%d\r\n" % sum(server.data.pop(key, None) is not None for key in args)
+        return b"-ERR unknown command '%s'\r\n" % command.encode()
+
+
+def bulk(value):
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
@@ -1,10 +1,23 @@
 import json
+from datetime import datetime, timedelta
 
 import pytest
 from flask.app import Flask
+from flask_jwt_extended import decode_token
+from sqlalchemy import event
 
 import core
+from core.cache import user_cache
+from core.config import TestConfig
+from core.hashing import hasher
+from core.idempotency import idempotency_keys, request_fingerprint
+from core.models.photo import PhotoModel
+from core.models.token import RevokedTokenModel
 from core.models.user import UserModel
+from core.ratelimit import limiter
+from core.revocation import RevocationList, revocation_list
+from core.search import photo_index
+from core.services import PhotoService, UserService
 
 
 @pytest.fixture
@@ -45,6 +58,15 @@ def auth_header(access_token):
     return {"Authorization": f"Bearer {access_token}"}
 
 
+@pytest.fixture
+def photos(app: Flask, client):
+    user = UserModel.query.filter_by(email="test@client.local").one()
+    photos = [PhotoModel(title=f"Test {i}", url="https://example.com/photo.png", user_id=user.id) for i in range(3)]
+    app.db.session.add_all(photos)
+    app.db.session.commit()
+    return photos
+
+
 class TestUser:
     path = "/api/users"
 
@@ -125,6 +147,62 @@ class TestUser:
         rv = client.get(self.path)
         assert 401 == rv.status_code
 
+    def test_when_get_user_data_twice_the_second_lookup_is_served_from_cache(self, client, auth_header):
+        client.get(self.path, headers=auth_header)
+        rv = client.get(self.path, headers=auth_header)
+        data = json.loads(rv.data.decode())
+        assert dict(data, email="test@client.local", name="John Doe") == data
+        assert dict(hits=1, misses=1, size=1) == user_cache.stats
+
+    def test_when_get_user_data_with_its_etag_return_304_as_status_code(self, client, auth_header):
+        etag = client.get(self.path, headers=auth_header).headers["ETag"]
+        rv = client.get(self.path, headers=dict(auth_header, **{"If-None-Match": etag}))
+        assert 304 == rv.status_code
+
+    def test_when_a_user_is_saved_its_cached_lookup_is_invalidated(self, client, auth_header):
+        client.get(self.path, headers=auth_header)
+        user = UserModel.query.filter_by(email="test@client.local").one()
+        user.name = "Jane Doe"
+        UserService.save(user)
+
+        rv = client.get(self.path, headers=auth_header)
+        assert "Jane Doe" == json.loads(rv.data.decode())["name"]
+        assert 0 == user_cache.stats["hits"]
+
+    def test_when_a_login_rehashes_the_password_the_cached_lookup_is_invalidated(self, client, auth_header):
+        etag = client.get(self.path, headers=auth_header).headers["ETag"]
+        hasher.rounds = 4000
+        assert 200 == client.post("/api/login", json={"email": "test@client.local", "password": "12345"}).status_code
+
+        rv = client.get(self.path, headers=dict(auth_header, **{"If-None-Match": etag}))
+        assert 200 == rv.status_code
+        assert etag != rv.headers["ETag"]
+
+
+class TestUserPhotos:
+    def path(self, user_id: int) -> str:
+        return f"/api/users/{user_id}/photos"
+
+    def test_when_get_photo_summary_return_count_and_most_recent_photos(self, app, client, auth_header, photos):
+        statements = []
+
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        user_id = photos[0].user_id
+        event.listen(app.db.engine, "before_cursor_execute", listener)
+        try:
+            rv = client.get(self.path(user_id), query_string={"limit": 2}, headers=auth_header)
+        finally:
+            event.remove(app.db.engine, "before_cursor_execute", listener)
+        data = json.loads(rv.data.decode())
+        assert 200 == rv.status_code
+        assert (3, ["Test 2", "Test 1"]) == (data["photo_count"], [photo["title"] for photo in data["photos"]])
+        assert 2 == len([statement for statement in statements if "FROM photos" in statement])
+
+    def test_when_get_photo_summary_of_another_user_return_404_as_status_code(self, client, auth_header, photos):
+        assert 404 == client.get(self.path(photos[0].user_id + 1), headers=auth_header).status_code
+
 
 class TestLogin:
     path = "/api/login"
@@ -182,6 +260,64 @@ class TestLogin:
         )
         assert 401 == rv.status_code
 
+    def test_when_login_too_often_for_an_email_return_429_before_verifying_the_password(self, app, client, monkeypatch):
+        app.config["RATELIMIT_LIMITS"] = {"login_email": (2, 60)}
+        limiter.init_app(app)
+        verified = []
+        monkeypatch.setattr(hasher, "verify_and_update", lambda *args: verified.append(args) or (False, None))
+
+        statuses = [
+            client.post(self.path, json={"email": "test@client.local", "password": "incorrect"}).status_code
+            for _ in range(3)
+        ]
+        rv = client.post(self.path, json={"email": "Test@Client.local", "password": "12345"})
+        assert [401, 401, 429] == statuses
+        assert 429 == rv.status_code
+        assert 0 < int(rv.headers["Retry-After"]) <= 120
+        assert 2 == len(verified)
+        assert 401 == client.post(self.path, json={"email": "other@client.local", "password": "12345"}).status_code
+
+    def test_when_login_with_an_outdated_password_hash_it_is_rehashed(self, client):
+        hasher.rounds = 4000
+        rv = client.post(
+            self.path,
+            data=json.dumps(
+                {
+                    "email": "test@client.local",
+                    "password": "12345",
+                }
+            ),
+            content_type="application/json",
+        )
+        user = UserModel.query.filter_by(email="test@client.local").one()
+        assert 200 == rv.status_code
+        assert user.password.startswith("$pbkdf2-sha256$4000$")
+        assert user.check_password("12345")
+
+    def test_when_no_password_can_be_hashed_return_503_as_status_code(self, app, client):
+        app.config["HASHING_POOL_MAX_PENDING"] = 0
+        hasher.init_app(app)
+        rv = client.post(
+            self.path,
+            data=json.dumps(
+                {
+                    "email": "test@client.local",
+                    "password": "12345",
+                }
+            ),
+            content_type="application/json",
+        )
+        assert 503 == rv.status_code
+        assert "Retry-After" in rv.headers
+
+    def test_when_hashing_on_a_process_pool_passwords_are_verified(self, app):
+        app.config["HASHING_POOL_SIZE"] = 1
+        hasher.init_app(app)
+        try:
+            assert hasher.verify("12345", hasher.hash("12345"))
+        finally:
+            hasher.shutdown()
+
     def test_when_try_login_with_invalid_params_return_422_as_status_code(self, client):
         rv = client.post(
             self.path,
@@ -195,6 +331,62 @@ class TestLogin:
         )
         assert 422 == rv.status_code
 
+    def test_when_refresh_with_a_refresh_token_return_a_new_access_token(self, client):
+        tokens = client.post(self.path, json={"email": "test@client.local", "password": "12345"}).get_json()
+        rv = client.put(self.path, headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+        access_token = rv.get_json()["access_token"]
+        assert 200 == rv.status_code
+        assert 200 == client.get("/api/users", headers={"Authorization": f"Bearer {access_token}"}).status_code
+
+    def test_when_refresh_with_an_access_token_return_422_as_status_code(self, client, auth_header):
+        assert 422 == client.put(self.path, headers=auth_header).status_code
+
+    def test_when_logout_the_access_and_refresh_tokens_are_revoked(self, client):
+        tokens = client.post(self.path, json={"email": "test@client.local", "password": "12345"}).get_json()
+        auth_header = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+        assert 204 == client.delete(self.path, headers=auth_header).status_code
+        assert 401 == client.get("/api/photos", headers=auth_header).status_code
+        assert 401 == client.put(self.path, headers={"Authorization": f"Bearer {tokens['refresh_token']}"}).status_code
+
+    def test_when_another_process_revokes_a_token_it_is_refused_after_a_refresh(self, app, client, auth_header):
+        assert 200 == client.get("/api/photos", headers=auth_header).status_code
+        jti = decode_token(auth_header["Authorization"].split()[1])["jti"]
+        app.db.session.add(RevokedTokenModel(jti=jti, expires_at=datetime.utcnow() + timedelta(hours=1)))
+        app.db.session.commit()
+
+        revocation_list.refresh()
+        assert 401 == client.get("/api/photos", headers=auth_header).status_code
+        assert dict(revoked=1) == revocation_list.stats
+
+    def test_when_a_revocation_reuses_the_id_of_an_expired_one_other_processes_see_it(self, app, client):
+        worker, other_worker = RevocationList(), RevocationList()
+        worker.init_app(app)
+        other_worker.init_app(app)
+        worker.revoke("expired", datetime.utcnow() - timedelta(seconds=1))
+        other_worker.refresh()
+
+        # Purging the expired row frees its id, which the next revocation reuses.
+        worker.revoke("revoked", datetime.utcnow() + timedelta(hours=1))
+        other_worker.refresh()
+        assert other_worker.is_revoked("revoked")
+        assert dict(revoked=1) == other_worker.stats
+
+    def test_when_identity_is_stateless_photos_are_listed_without_loading_the_user(self, app, client, auth_header):
+        app.config["JWT_STATELESS_IDENTITY"] = True
+        statements = []
+
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(app.db.engine, "before_cursor_execute", listener)
+        try:
+            rv = client.get("/api/photos", headers=auth_header)
+        finally:
+            event.remove(app.db.engine, "before_cursor_execute", listener)
+        assert 200 == rv.status_code
+        assert not [statement for statement in statements if "users.email" in statement]
+
 
 class TestPhoto:
     path = "/api/photos"
@@ -240,3 +432,418 @@ class TestPhoto:
             == data
         )
         assert "id" in data
+
+    def test_when_list_photos_return_a_page_of_photos_and_a_next_cursor(self, client, auth_header, photos):
+        rv = client.get(self.path, query_string={"limit": 2}, headers=auth_header)
+        data = json.loads(rv.data.decode())
+        assert 200 == rv.status_code
+        assert ["Test 0", "Test 1"] == [photo["title"] for photo in data["items"]]
+        assert data["next_cursor"]
+
+        rv = client.get(self.path, query_string={"limit": 2, "cursor": data["next_cursor"]}, headers=auth_header)
+        data = json.loads(rv.data.decode())
+        assert ["Test 2"] == [photo["title"] for photo in data["items"]]
+        assert data["next_cursor"] is None
+
+    def test_when_list_photos_with_an_invalid_cursor_return_422_as_status_code(self, client, auth_header):
+        rv = client.get(self.path, query_string={"cursor": "not-a-cursor"}, headers=auth_header)
+        assert 422 == rv.status_code
+
+    def test_when_list_photos_with_stream_return_every_photo_as_a_json_array(self, client, auth_header, photos):
+        rv = client.get(self.path, query_string={"stream": 1}, headers=auth_header)
+        data = json.loads(rv.data.decode())
+        assert "application/json" == rv.mimetype
+        assert ["Test 0", "Test 1", "Test 2"] == [photo["title"] for photo in data]
+
+    def test_when_list_photos_accepting_ndjson_return_one_photo_per_line(self, client, auth_header, photos):
+        rv = client.get(self.path, headers=dict(auth_header, Accept="application/x-ndjson"))
+        lines = rv.data.decode().splitlines()
+        assert "application/x-ndjson" == rv.mimetype
+        assert ["Test 0", "Test 1", "Test 2"] == [json.loads(line)["title"] for line in lines]
+
+    def test_when_list_photos_with_fields_return_and_select_only_those_fields(self, app, client, auth_header, photos):
+        statements = []
+
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(app.db.engine, "before_cursor_execute", listener)
+        try:
+            rv = client.get(self.path, query_string={"fields": "id,title"}, headers=auth_header)
+        finally:
+            event.remove(app.db.engine, "before_cursor_execute", listener)
+        data = json.loads(rv.data.decode())
+        assert [{"id": photo.id, "title": photo.title} for photo in photos] == data["items"]
+        assert not [statement for statement in statements if "photos.description" in statement]
+
+    def test_when_get_a_photo_with_fields_return_only_those_fields(self, client, auth_header, photos):
+        rv = client.get(f"{self.path}/{photos[0].id}", query_string={"fields": "url"}, headers=auth_header)
+        assert {"url": "https://example.com/photo.png"} == json.loads(rv.data.decode())
+
+        full = client.get(f"{self.path}/{photos[0].id}", headers=auth_header)
+        assert full.headers["ETag"] != rv.headers["ETag"]
+
+    def test_when_list_photos_with_an_unknown_field_return_422_as_status_code(self, client, auth_header):
+        rv = client.get(self.path, query_string={"fields": "id,password"}, headers=auth_header)
+        assert 422 == rv.status_code
+
+
+class TestPhotoDelete:
+    path = "/api/photos"
+
+    def test_when_delete_a_photo_it_is_hidden_until_purged(self, app, client, auth_header, photos):
+        photo_id = photos[0].id
+        rv = client.delete(f"{self.path}/{photo_id}", headers=auth_header)
+        assert 204 == rv.status_code
+        assert 404 == client.get(f"{self.path}/{photo_id}", headers=auth_header).status_code
+        assert 404 == client.delete(f"{self.path}/{photo_id}", headers=auth_header).status_code
+        assert 2 == len(json.loads(client.get(self.path, headers=auth_header).data.decode())["items"])
+        assert app.db.session.query(PhotoModel.deleted_at).filter_by(id=photo_id).scalar() is not None
+
+    def test_when_delete_many_photos_they_are_marked_deleted_with_one_update(self, app, client, auth_header, photos):
+        user = UserModel(email="another@client.local", password="12345")
+        app.db.session.add(user)
+        app.db.session.commit()
+        another = PhotoService.save(PhotoModel(title="Another", url="https://example.com/photo.png", user_id=user.id))
+        ids = [photos[0].id, photos[2].id, another.id, 999]
+        statements = []
+
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(app.db.engine, "before_cursor_execute", listener)
+        try:
+            rv = client.delete(self.path, query_string={"ids": ",".join(map(str, ids))}, headers=auth_header)
+        finally:
+            event.remove(app.db.engine, "before_cursor_execute", listener)
+        assert 200 == rv.status_code
+        assert {"ids": [photos[0].id, photos[2].id]} == json.loads(rv.data.decode())
+        assert 1 == len([statement for statement in statements if statement.startswith("UPDATE photos")])
+        assert 200 == client.get(f"{self.path}/{photos[1].id}", headers=auth_header).status_code
+        assert app.db.session.query(PhotoModel.deleted_at).filter_by(id=another.id).scalar() is None
+
+    def test_when_delete_too_many_photos_return_422_as_status_code(self, client, auth_header):
+        rv = client.delete(self.path, query_string={"ids": ",".join(map(str, range(501)))}, headers=auth_header)
+        assert 422 == rv.status_code
+
+
+class TestIdempotencyKeys:
+    photo = {"title": "Test", "url": "https://example.com/photo.png"}
+
+    def post_photo(self, client, auth_header, photo=None, key="retried-key"):
+        return client.post(
+            "/api/photos", json=photo or self.photo, headers=dict(auth_header, **{"Idempotency-Key": key})
+        )
+
+    def test_when_a_post_is_retried_with_its_key_return_the_first_response(self, app, client, auth_header):
+        first = self.post_photo(client, auth_header)
+        retry = self.post_photo(client, auth_header)
+        idempotency_keys.cache.clear()
+        stored = self.post_photo(client, auth_header)
+
+        assert (201, first.data) == (retry.status_code, retry.data)
+        assert (201, first.data) == (stored.status_code, stored.data)
+        assert "true" == stored.headers["Idempotent-Replayed"]
+        assert 1 == PhotoModel.query.count()
+        assert 2 == self.post_photo(client, auth_header, key="another-key").get_json()["id"]
+
+    def test_when_a_key_is_used_for_another_request_return_422_as_status_code(self, client, auth_header):
+        self.post_photo(client, auth_header)
+        rv = self.post_photo(client, auth_header, photo=dict(self.photo, title="Another"))
+        assert 422 == rv.status_code
+
+    def test_when_a_request_with_the_key_is_in_flight_return_409_as_status_code(self, app, client, auth_header):
+        user_id = UserModel.query.filter_by(email="test@client.local").one().id
+        with app.test_request_context("/api/photos", method="POST", json=self.photo):
+            fingerprint = request_fingerprint()
+        idempotency_keys.claim(f"{user_id}:retried-key", fingerprint)
+
+        rv = self.post_photo(client, auth_header)
+        assert 409 == rv.status_code
+        assert "1" == rv.headers["Retry-After"]
+        assert 0 == PhotoModel.query.count()
+
+    def test_when_a_sign_up_is_retried_the_password_is_not_hashed_again(self, client, monkeypatch):
+        hashed = []
+        hash = hasher.hash
+        monkeypatch.setattr(hasher, "hash", lambda password: hashed.append(password) or hash(password))
+        user = {"email": "new@client.local", "password": "12345"}
+
+        statuses = [
+            client.post("/api/users", json=user, headers={"Idempotency-Key": "sign-up"}).status_code for _ in range(2)
+        ]
+        assert [201, 201] == statuses
+        assert 1 == len(hashed)
+
+
+class TestPhotoSearch:
+    path = "/api/photos"
+
+    def titles(self, client, auth_header, **query):
+        rv = client.get(self.path, query_string=query, headers=auth_header)
+        return [photo["title"] for photo in json.loads(rv.data.decode())["items"]]
+
+    def test_when_search_photos_return_those_matching_every_word_prefix(self, client, auth_header, photos):
+        url = "https://example.com/photo.png"
+        PhotoService.save(PhotoModel(title="Boats", description="Sunset over the harbour", url=url, user_id=1))
+        PhotoService.save(PhotoModel(title="Harbour lights", url=url, user_id=1))
+
+        assert ["Boats", "Harbour lights"] == self.titles(client, auth_header, q="harb")
+        assert ["Boats"] == self.titles(client, auth_header, q="sunset harbour")
+
+    def test_when_a_photo_is_updated_or_removed_the_search_index_follows(self, client, auth_header, photos):
+        photo = PhotoModel(id=photos[0].id, title="Mountain", url=photos[0].url, user_id=photos[0].user_id)
+        PhotoService.save(photo)
+        assert ["Mountain"] == self.titles(client, auth_header, q="mountain")
+        assert [] == self.titles(client, auth_header, q="test 0")
+
+        PhotoService.remove(photos[0].id, photos[0].user_id)
+        assert [] == self.titles(client, auth_header, q="mountain")
+
+    def test_when_full_text_search_is_not_available_search_with_like(self, app, client, auth_header, photos):
+        photo_index._available[app.db.engine] = False
+
+        assert ["Test 2"] == self.titles(client, auth_header, q="2")
+
+    def test_when_sort_by_descending_id_return_pages_in_that_order(self, client, auth_header, photos):
+        rv = client.get(self.path, query_string={"sort": "-id", "limit": 2}, headers=auth_header)
+        data = json.loads(rv.data.decode())
+        assert ["Test 2", "Test 1"] == [photo["title"] for photo in data["items"]]
+
+        assert ["Test 0"] == self.titles(client, auth_header, sort="-id", cursor=data["next_cursor"])
+
+    def test_when_filter_by_id_range_return_photos_within_it(self, client, auth_header, photos):
+        assert ["Test 1"] == self.titles(client, auth_header, min_id=photos[1].id, max_id=photos[1].id)
+
+
+class TestPhotoBatch:
+    path = "/api/photos:batch"
+
+    def test_when_post_an_array_of_photos_return_a_result_per_photo(self, client, auth_header):
+        rv = client.post(
+            self.path,
+            data=json.dumps(
+                [
+                    {"title": "Test 1", "url": "https://example.com/1.png"},
+                    {"title": "Test 2"},
+                    {"title": "Test 3", "url": "https://example.com/3.png", "description": "Lorem Ipsum"},
+                ]
+            ),
+            content_type="application/json",
+            headers=auth_header,
+        )
+        data = json.loads(rv.data.decode())
+        assert 207 == rv.status_code
+        assert [201, 422, 201] == [result["status"] for result in data]
+        assert "url" in data[1]["errors"]
+        assert ["Test 1", "Test 3"] == [photo.title for photo in PhotoModel.query.order_by(PhotoModel.id)]
+
+    def test_when_post_ndjson_photos_every_valid_line_is_saved(self, client, auth_header):
+        rv = client.post(
+            self.path,
+            data='{"title": "Test 1", "url": "https://example.com/1.png"}\nnot json\n',
+            content_type="application/x-ndjson",
+            headers=auth_header,
+        )
+        data = json.loads(rv.data.decode())
+        assert [201, 422] == [result["status"] for result in data]
+        assert 1 == PhotoModel.query.count()
+
+    def test_when_post_something_other_than_an_array_return_422_as_status_code(self, client, auth_header):
+        rv = client.post(
+            self.path, data=json.dumps({"title": "Test 1"}), content_type="application/json", headers=auth_header
+        )
+        assert 422 == rv.status_code
+
+    def test_when_import_a_csv_file_every_valid_row_is_saved(self, app, client, tmp_path):
+        file = tmp_path / "photos.csv"
+        file.write_text("title,url\nTest 1,https://example.com/1.png\nTest 2,\nTest 3,https://example.com/3.png\n")
+        user = UserModel.query.filter_by(email="test@client.local").one()
+
+        result = app.test_cli_runner().invoke(
+            args=["photo", "import", str(file), "--user-id", user.id, "--chunk-size", 2]
+        )
+        assert "2 photos imported, 1 failed." in result.output
+        assert ["Test 1", "Test 3"] == [photo.title for photo in PhotoModel.query.order_by(PhotoModel.id)]
+
+
+class TestPhotoConditionalRequests:
+    path = "/api/photos"
+
+    def test_when_get_a_photo_with_its_etag_return_304_as_status_code(self, client, auth_header, photos):
+        rv = client.get(f"{self.path}/{photos[0].id}", headers=auth_header)
+        etag = rv.headers["ETag"]
+
+        rv = client.get(f"{self.path}/{photos[0].id}", headers=dict(auth_header, **{"If-None-Match": etag}))
+        assert 304 == rv.status_code
+        assert b"" == rv.data
+
+    def test_when_a_photo_is_added_the_list_etag_changes(self, client, auth_header, photos):
+        etag = client.get(self.path, headers=auth_header).headers["ETag"]
+        rv = client.get(self.path, headers=dict(auth_header, **{"If-None-Match": etag}))
+        assert 304 == rv.status_code
+
+        client.post(
+            self.path,
+            data=json.dumps({"title": "Test 3", "url": "https://example.com/3.png"}),
+            content_type="application/json",
+            headers=auth_header,
+        )
+        rv = client.get(self.path, headers=dict(auth_header, **{"If-None-Match": etag}))
+        assert 200 == rv.status_code
+        assert 4 == len(json.loads(rv.data.decode())["items"])
+
+    def test_when_put_a_photo_with_a_stale_etag_return_412_as_status_code(self, client, auth_header, photos):
+        path = f"{self.path}/{photos[0].id}"
+        etag = client.get(path, headers=auth_header).headers["ETag"]
+        body = json.dumps({"title": "Updated", "url": "https://example.com/0.png"})
+
+        rv = client.put(
+            path, data=body, content_type="application/json", headers=dict(auth_header, **{"If-Match": etag})
+        )
+        assert 200 == rv.status_code
+        assert etag != rv.headers["ETag"]
+
+        rv = client.put(
+            path, data=body, content_type="application/json", headers=dict(auth_header, **{"If-Match": etag})
+        )
+        assert 412 == rv.status_code
+
+    def test_when_delete_a_photo_with_a_stale_etag_return_412_as_status_code(self, client, auth_header, photos):
+        rv = client.delete(f"{self.path}/{photos[0].id}", headers=dict(auth_header, **{"If-Match": '"stale"'}))
+        assert 412 == rv.status_code
+
+    def test_when_get_a_missing_photo_return_404_as_status_code(self, client, auth_header):
+        rv = client.get(f"{self.path}/404", headers=auth_header)
+        assert 404 == rv.status_code
+
+    def test_when_put_a_photo_of_another_user_return_404_as_status_code(self, app, client, auth_header):
+        user = UserModel(email="another@client.local", password="12345")
+        photo = PhotoModel(title="Not yours", url="https://example.com/photo.png", user=user)
+        app.db.session.add(photo)
+        app.db.session.commit()
+
+        rv = client.put(
+            f"{self.path}/{photo.id}",
+            data=json.dumps({"title": "Mine", "url": "https://example.com/photo.png"}),
+            content_type="application/json",
+            headers=auth_header,
+        )
+        assert 404 == rv.status_code
+        assert "Not yours" == PhotoModel.query.get(photo.id).title
+
+
+class TestAlbum:
+    path = "/api/albums"
+
+    def create(self, client, auth_header, photo_ids=()) -> int:
+        album_id = client.post(self.path, json={"title": "Holidays"}, headers=auth_header).get_json()["id"]
+        if photo_ids:
+            client.post(f"{self.path}/{album_id}/photos", json={"photo_ids": list(photo_ids)}, headers=auth_header)
+        return album_id
+
+    def test_when_list_albums_return_counts_and_covers_with_one_query(self, app, client, auth_header, photos):
+        self.create(client, auth_header, [photos[1].id, photos[0].id])
+        self.create(client, auth_header)
+        statements = []
+
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(app.db.engine, "before_cursor_execute", listener)
+        try:
+            rv = client.get(self.path, headers=auth_header)
+        finally:
+            event.remove(app.db.engine, "before_cursor_execute", listener)
+        items = rv.get_json()["items"]
+        assert [2, 0] == [album["photo_count"] for album in items]
+        assert "Test 1" == items[0]["cover"]["title"]
+        assert items[1]["cover"] is None
+        assert 1 == len([statement for statement in statements if "FROM albums" in statement])
+
+    def test_when_list_album_photos_return_them_in_album_order(self, client, auth_header, photos):
+        album_id = self.create(client, auth_header, [photos[2].id, photos[0].id, photos[1].id])
+
+        first = client.get(f"{self.path}/{album_id}/photos", query_string={"limit": 2}, headers=auth_header)
+        cursor = first.get_json()["next_cursor"]
+        second = client.get(f"{self.path}/{album_id}/photos", query_string={"cursor": cursor}, headers=auth_header)
+        titles = [photo["title"] for page in (first, second) for photo in page.get_json()["items"]]
+        assert ["Test 2", "Test 0", "Test 1"] == titles
+
+    def test_when_the_cover_photo_is_removed_the_next_one_becomes_the_cover(self, client, auth_header, photos):
+        album_id = self.create(client, auth_header, [photos[0].id, photos[1].id])
+
+        client.delete(f"/api/photos/{photos[0].id}", headers=auth_header)
+        album = client.get(f"{self.path}/{album_id}", headers=auth_header).get_json()
+        assert (1, photos[1].id) == (album["photo_count"], album["cover_photo_id"])
+
+    def test_when_add_a_deleted_photo_to_an_album_return_404_as_status_code(self, client, auth_header, photos):
+        album_id = self.create(client, auth_header)
+        client.delete(f"/api/photos/{photos[0].id}", headers=auth_header)
+
+        rv = client.post(
+            f"{self.path}/{album_id}/photos", json={"photo_ids": [photos[0].id, photos[1].id]}, headers=auth_header
+        )
+        album = client.get(f"{self.path}/{album_id}", headers=auth_header).get_json()
+        assert 404 == rv.status_code
+        assert (0, None) == (album["photo_count"], album.get("cover_photo_id"))
+
+    def test_when_a_photo_is_taken_out_of_an_album_it_is_kept(self, client, auth_header, photos):
+        album_id = self.create(client, auth_header, [photos[0].id, photos[1].id])
+
+        rv = client.delete(f"{self.path}/{album_id}/photos/{photos[1].id}", headers=auth_header)
+        album = client.get(f"{self.path}/{album_id}", headers=auth_header).get_json()
+        assert 204 == rv.status_code
+        assert (1, photos[0].id) == (album["photo_count"], album["cover_photo_id"])
+        assert 200 == client.get(f"/api/photos/{photos[1].id}", headers=auth_header).status_code
+
+    def test_when_post_a_photo_with_album_ids_it_is_added_to_them(self, client, auth_header):
+        album_id = self.create(client, auth_header)
+
+        rv = client.post(
+            "/api/photos",
+            json={"title": "New", "url": "https://example.com/new.png"},
+            query_string={"album_ids": str(album_id)},
+            headers=auth_header,
+        )
+        album = client.get(f"{self.path}/{album_id}", headers=auth_header).get_json()
+        assert 201 == rv.status_code
+        assert (1, rv.get_json()["id"]) == (album["photo_count"], album["cover_photo_id"])
+
+    def test_when_add_a_photo_of_another_user_return_404_as_status_code(self, app, client, auth_header):
+        album_id = self.create(client, auth_header)
+        photo = PhotoModel(title="Not yours", url="https://example.com/photo.png")
+        photo.user = UserModel(email="another@client.local", password="12345")
+        app.db.session.add(photo)
+        app.db.session.commit()
+
+        rv = client.post(f"{self.path}/{album_id}/photos", json={"photo_ids": [photo.id]}, headers=auth_header)
+        assert 404 == rv.status_code
+        assert 0 == client.get(f"{self.path}/{album_id}", headers=auth_header).get_json()["photo_count"]
+
+    def test_when_set_a_cover_outside_the_album_return_404_as_status_code(self, client, auth_header, photos):
+        album_id = self.create(client, auth_header, [photos[0].id])
+
+        body = {"title": "Holidays", "cover_photo_id": photos[1].id}
+        assert 404 == client.put(f"{self.path}/{album_id}", json=body, headers=auth_header).status_code
+        body = {"title": "Holidays", "cover_photo_id": photos[0].id}
+        assert 200 == client.put(f"{self.path}/{album_id}", json=body, headers=auth_header).status_code
+
+
+class TestSwagger:
+    path = "/apispec_1.json"
+
+    def test_when_the_spec_is_first_requested_its_template_is_built(self, app, client):
+        assert app.swag.template is None
+
+        rv = client.get(self.path)
+        assert 200 == rv.status_code
+        assert "/api/photos" in rv.get_json()["paths"]
+        assert app.swag.template is not None
+
+    def test_when_swagger_is_disabled_return_404_as_status_code(self, monkeypatch):
+        monkeypatch.setattr(TestConfig, "SWAGGER_ENABLED", False)
+        app = core.create_app("test")
+
+        assert 404 == app.test_client().get(self.path).status_code
+        assert 404 == app.test_client().get("/apidocs/").status_code
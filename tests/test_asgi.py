@@ -0,0 +1,116 @@
+import asyncio
+import json
+import sys
+
+import pytest
+
+from core.asgi import ASGIAdapter
+
+
+def call(app, method: str, path: str, body_parts=(b"",), headers=(), query_string=b"", disconnect=False, sent=None):
+    """Calls the ASGI application with the body sent in parts and returns the messages it sent.
+
+    With disconnect, the client goes away after sending the parts, before the end of the body.
+    """
+    scope = dict(
+        type="http",
+        method=method,
+        path=path,
+        query_string=query_string,
+        headers=[(name.encode(), value.encode()) for name, value in headers],
+        http_version="1.1",
+        client=("127.0.0.1", 5000),
+    )
+    messages = [
+        dict(type="http.request", body=part, more_body=disconnect or i < len(body_parts) - 1)
+        for i, part in enumerate(body_parts)
+    ]
+    if disconnect:
+        messages.append(dict(type="http.disconnect"))
+    sent = [] if sent is None else sent
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(ASGIAdapter(app, 2)(scope, receive, send))
+    return sent
+
+
+class TestASGIAdapter:
+    def test_when_post_a_body_in_parts_return_the_application_response(self, app, client):
+        body = json.dumps(dict(email="test@client.local", password="12345")).encode()
+        sent = call(app, "POST", "/api/login", [body[:10], body[10:]], [("content-type", "application/json")])
+
+        assert 200 == sent[0]["status"]
+        assert "access_token" in json.loads(b"".join(message.get("body", b"") for message in sent[1:]))
+        assert not sent[-1].get("more_body")
+
+    def test_when_streaming_return_the_body_in_chunks(self, app, client, auth_header, photos):
+        app.config["STREAM_CHUNK_SIZE"] = 1
+        headers = [("authorization", auth_header["Authorization"])]
+        sent = call(app, "GET", "/api/photos", headers=headers, query_string=b"stream=1")
+
+        body = b"".join(message.get("body", b"") for message in sent[1:])
+        assert 200 == sent[0]["status"]
+        assert 3 == len(json.loads(body))
+        assert 4 < len(sent)
+
+    def test_when_the_body_is_too_large_return_413_as_status_code(self, app, client):
+        app.config["MAX_CONTENT_LENGTH"] = 4
+        sent = call(app, "POST", "/api/login", [b"12345"])
+
+        assert 413 == sent[0]["status"]
+
+    def test_when_the_client_disconnects_before_the_end_of_the_body_the_view_is_not_called(self, app, client):
+        calls = []
+        app.before_request(lambda: calls.append(True))
+        sent = call(app, "POST", "/api/login", [b'{"email": '], [("content-type", "application/json")], disconnect=True)
+
+        assert [] == sent
+        assert [] == calls
+
+    def test_when_the_application_fails_after_sending_the_status_the_error_is_raised(self, app):
+        def fail_while_streaming(environ, start_response):
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            yield b"first"
+            try:
+                raise ValueError("Failed while streaming.")
+            except ValueError:
+                start_response("500 INTERNAL SERVER ERROR", [], sys.exc_info())
+            yield b"error page"
+
+        app.wsgi_app = fail_while_streaming
+        sent = []
+        with pytest.raises(ValueError):
+            call(app, "GET", "/", sent=sent)
+
+        assert 200 == sent[0]["status"]
+        assert [b"first"] == [message["body"] for message in sent[1:]]
+
+    def test_when_the_client_goes_away_while_streaming_the_thread_stops_streaming(self, app):
+        chunks = []
+
+        def stream(environ, start_response):
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            for i in range(100):
+                chunks.append(i)
+                yield b"chunk"
+
+        async def send(message):
+            if message["type"] == "http.response.body":
+                raise OSError("Connection reset by peer.")
+
+        async def receive():
+            return dict(type="http.request", body=b"")
+
+        app.wsgi_app = stream
+        adapter = ASGIAdapter(app, 1, window=2)
+        scope = dict(type="http", method="GET", path="/", headers=[], client=("127.0.0.1", 5000))
+        with pytest.raises(OSError):
+            asyncio.run(adapter(scope, receive, send))
+
+        assert 1 == adapter.executor.submit(lambda: 1).result(timeout=1)
+        assert len(chunks) < 100
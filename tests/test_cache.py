@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from core.cache import LRUBackend, RedisBackend, response_cache
+
+
+class TestLRUBackend:
+    def test_when_over_max_bytes_the_least_recently_used_values_are_evicted(self):
+        backend = LRUBackend(max_bytes=12)
+        backend.set("a", b"11111")
+        backend.set("b", b"22222")
+        backend.get("a")
+        backend.set("c", b"33333")
+
+        assert b"11111" == backend.get("a")
+        assert backend.get("b") is None
+        assert 12 == backend.size
+
+
+class TestRedisBackend:
+    def test_when_talking_to_a_redis_server_values_round_trip(self, redis_server):
+        backend = RedisBackend(redis_server.url)
+        backend.set("key", b"value\r\nwith bytes", ttl=60)
+
+        assert b"value\r\nwith bytes" == backend.get("key")
+        assert not backend.set("key", b"other", nx=True)
+        assert 1 == backend.incr("counter")
+        backend.delete("key")
+        assert backend.get("key") is None
+
+    def test_when_the_server_is_unreachable_every_lookup_is_a_miss(self, redis_server):
+        backend = RedisBackend(redis_server.url)
+        redis_server.shutdown()
+        redis_server.server_close()
+
+        assert backend.get("key") is None
+
+
+class TestPhotoResponseCache:
+    path = "/api/photos"
+
+    @pytest.fixture(params=["memory", "redis"])
+    def cache(self, request, app, client):
+        app.config["RESPONSE_CACHE_BACKEND"] = request.param
+        if request.param == "redis":
+            app.config["RESPONSE_CACHE_URL"] = request.getfixturevalue("redis_server").url
+        response_cache.init_app(app)
+        return response_cache
+
+    def test_when_list_photos_twice_the_second_response_is_served_from_cache(
+        self, app, client, auth_header, photos, cache
+    ):
+        client.get(self.path, headers=auth_header)
+        app.db.session.execute("UPDATE photos SET title = 'Changed behind the service'")
+
+        rv = client.get(self.path, headers=auth_header)
+        assert "Test 0" == json.loads(rv.data.decode())["items"][0]["title"]
+        assert rv.headers["ETag"]
+
+    def test_when_a_photo_is_saved_cached_responses_are_not_served(self, client, auth_header, photos, cache):
+        client.get(self.path, headers=auth_header)
+        client.get(f"{self.path}/{photos[0].id}", headers=auth_header)
+        client.put(
+            f"{self.path}/{photos[0].id}",
+            data=json.dumps({"title": "Updated", "url": "https://example.com/0.png"}),
+            content_type="application/json",
+            headers=auth_header,
+        )
+
+        rv = client.get(self.path, headers=auth_header)
+        assert "Updated" == json.loads(rv.data.decode())["items"][0]["title"]
+        rv = client.get(f"{self.path}/{photos[0].id}", headers=auth_header)
+        assert "Updated" == json.loads(rv.data.decode())["title"]
+
+    def test_when_a_photo_is_removed_cached_responses_are_not_served(self, client, auth_header, photos, cache):
+        client.get(self.path, headers=auth_header)
+        client.delete(f"{self.path}/{photos[0].id}", headers=auth_header)
+
+        rv = client.get(self.path, headers=auth_header)
+        assert 2 == len(json.loads(rv.data.decode())["items"])
+
+    def test_when_a_cached_photo_is_requested_with_its_etag_return_304(self, client, auth_header, photos, cache):
+        etag = client.get(f"{self.path}/{photos[0].id}", headers=auth_header).headers["ETag"]
+        rv = client.get(f"{self.path}/{photos[0].id}", headers=dict(auth_header, **{"If-None-Match": etag}))
+        assert 304 == rv.status_code
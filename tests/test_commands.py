@@ -0,0 +1,82 @@
+from sqlalchemy import inspect
+
+from core.models.photo import PhotoModel
+from core.purge import purger
+from core.services import PhotoService
+
+
+class TestDatabaseUpgrade:
+    def test_when_an_index_is_missing_upgrade_creates_it(self, app, client):
+        app.db.session.execute("DROP INDEX ix_photos_user_id_id")
+
+        result = app.test_cli_runner().invoke(args=["db", "upgrade"])
+        indexes = [index["name"] for index in inspect(app.db.engine).get_indexes("photos")]
+        assert "1 statements applied." in result.output
+        assert "ix_photos_user_id_id" in indexes
+
+    def test_when_a_column_is_missing_upgrade_adds_it(self, app, client):
+        app.db.session.execute("CREATE TABLE legacy_photos AS SELECT id, title, url, user_id FROM photos")
+        app.db.session.execute("DROP TABLE photos")
+        app.db.session.execute("ALTER TABLE legacy_photos RENAME TO photos")
+
+        result = app.test_cli_runner().invoke(args=["db", "upgrade"])
+        columns = [column["name"] for column in inspect(app.db.engine).get_columns("photos")]
+        assert "ALTER TABLE photos ADD COLUMN description TEXT;" in result.output
+        assert "description" in columns
+
+    def test_when_the_search_index_is_missing_upgrade_creates_and_fills_it(self, app, client, photos):
+        app.db.session.execute("DROP TABLE photos_fts")
+        app.db.session.commit()
+
+        result = app.test_cli_runner().invoke(args=["db", "upgrade"])
+        count = app.db.session.execute("SELECT count(*) FROM photos_fts WHERE photos_fts MATCH 'test'").scalar()
+        assert "CREATE VIRTUAL TABLE IF NOT EXISTS photos_fts USING fts5(title, description);" in result.output
+        assert "2 statements applied." in result.output
+        assert 3 == count
+
+    def test_when_the_schema_is_up_to_date_upgrade_does_nothing(self, app, client):
+        result = app.test_cli_runner().invoke(args=["db", "upgrade", "--dry-run"])
+        assert "0 statements pending." in result.output
+
+
+class TestDatabaseReindex:
+    def test_when_reindex_existing_photos_become_searchable(self, app, client, photos):
+        app.db.session.execute("DELETE FROM photos_fts")
+        app.db.session.commit()
+
+        result = app.test_cli_runner().invoke(args=["db", "reindex"])
+        count = app.db.session.execute("SELECT count(*) FROM photos_fts WHERE photos_fts MATCH 'test'").scalar()
+        assert "Rebuilt the photos_fts index." in result.output
+        assert 3 == count
+
+
+class TestUserList:
+    def test_when_list_users_with_counts_print_their_photo_count(self, app, client, photos):
+        result = app.test_cli_runner().invoke(args=["user", "list", "--counts"])
+        assert "test@client.local, 3 photos" in result.output
+
+    def test_when_list_users_with_photos_print_their_titles(self, app, client, photos):
+        result = app.test_cli_runner().invoke(args=["user", "list", "--photos"])
+        assert "test@client.local, 3 photos" in result.output
+        assert ", Test 2" in result.output
+
+
+class TestPhotoPurge:
+    def test_when_purge_photos_deleted_long_enough_ago_are_hard_deleted(self, app, client, photos):
+        user_id = photos[0].user_id
+        PhotoService.remove_many([photos[0].id, photos[1].id], user_id)
+
+        kept = app.test_cli_runner().invoke(args=["photo", "purge"])
+        purged = app.test_cli_runner().invoke(args=["photo", "purge", "--older-than", 0, "--chunk-size", 1])
+        assert "0 photos purged." in kept.output
+        assert "2 photos purged." in purged.output
+        assert ["Test 2"] == [photo.title for photo in PhotoModel.query]
+
+    def test_when_photos_are_deleted_a_purge_runs_in_the_background(self, app, client, photos):
+        app.config.update(PURGE_INTERVAL=60, PURGE_AFTER=-1)
+        purger.init_app(app)
+        PhotoService.remove(photos[0].id, photos[0].user_id)
+        purger.shutdown()
+
+        assert 2 == PhotoModel.query.count()
+        assert 1 == purger.stats["purged"]
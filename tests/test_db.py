@@ -0,0 +1,203 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError, OperationalError
+
+import core
+from core.config import TestConfig
+from core.db import LazyLoadError, RedisStickyClients, TimedQueuePool
+from core.models import PhotoModel, UserModel
+from core.services import PhotoService, UserService
+
+
+class TestEngine:
+    def test_when_using_a_sqlite_file_connections_are_tuned_with_pragmas(self, tmp_path):
+        app = core.create_app("development")
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'db.sqlite'}"
+        with app.app_context():
+            with app.db.engine.connect() as connection:
+                assert "wal" == connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+                assert 1 == connection.exec_driver_sql("PRAGMA synchronous").scalar()
+                assert 5000 == connection.exec_driver_sql("PRAGMA busy_timeout").scalar()
+
+    def test_when_using_a_queue_pool_its_usage_is_reported(self, tmp_path):
+        app = core.create_app("test")
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'db.sqlite'}"
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = dict(poolclass=TimedQueuePool, pool_size=2)
+        with app.app_context():
+            with app.db.engine.connect():
+                stats = app.db.pool_stats()
+                assert dict(stats, type="TimedQueuePool", size=2, checked_out=1, checkouts=1) == stats
+
+
+class TestHealth:
+    path = "/api/health"
+
+    def test_when_get_health_with_the_monitoring_token_return_status_and_pool_usage(self, app, client):
+        app.config["MONITORING_TOKEN"] = "monitoring"
+        rv = client.get(self.path, headers={"Authorization": "Bearer monitoring"})
+        data = rv.get_json()
+        assert 200 == rv.status_code
+        assert "ok" == data["status"]
+        assert "StaticPool" == data["pool"]["type"]
+
+    def test_when_get_health_without_the_monitoring_token_return_only_status(self, app, client):
+        app.config["MONITORING_TOKEN"] = "monitoring"
+        for headers in ({}, {"Authorization": "Bearer wrong"}):
+            rv = client.get(self.path, headers=headers)
+            assert 200 == rv.status_code
+            assert {"status": "ok"} == rv.get_json()
+
+    def test_when_no_monitoring_token_is_configured_return_only_status(self, client):
+        assert {"status": "ok"} == client.get(self.path, headers={"Authorization": "Bearer None"}).get_json()
+
+
+@pytest.fixture
+def replicated_app(tmp_path, monkeypatch):
+    """An app whose primary and two replicas are SQLite files, each with a photo titled after it."""
+    binds = {key: f"sqlite:///{tmp_path / key}.db" for key in ("replica_0", "replica_1")}
+    monkeypatch.setattr(TestConfig, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setattr(TestConfig, "SQLALCHEMY_BINDS", binds)
+    monkeypatch.setattr(TestConfig, "SQLALCHEMY_READ_REPLICAS", list(binds))
+    app = core.create_app("test")
+    with app.app_context():
+        for key in (None, *binds):
+            engine = app.db.get_engine(app, bind=key)
+            app.db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(UserModel.__table__.insert(), dict(id=1, email="test@client.local", _password=""))
+                connection.execute(PhotoModel.__table__.insert(), dict(id=1, title=key or "primary", user_id=1))
+    return app
+
+
+def read_title(app, headers=None) -> str:
+    with app.test_request_context(headers=headers):
+        return PhotoService.list(1)[0].title
+
+
+class TestReadReplicas:
+    def test_when_reading_replicas_are_used_in_turn(self, replicated_app):
+        assert ["replica_0", "replica_1", "replica_0"] == [read_title(replicated_app) for _ in range(3)]
+
+    def test_when_a_session_wrote_its_reads_go_to_the_primary(self, replicated_app):
+        with replicated_app.test_request_context():
+            PhotoService.save(PhotoModel(title="New", url="https://example.com/new.png", user_id=1))
+            assert "primary" == PhotoService.list(1)[0].title
+
+    def test_when_a_client_wrote_recently_its_reads_go_to_the_primary(self, replicated_app):
+        with replicated_app.test_request_context(headers={"Authorization": "Bearer writer"}):
+            PhotoService.save(PhotoModel(title="New", url="https://example.com/new.png", user_id=1))
+
+        assert "primary" == read_title(replicated_app, {"Authorization": "Bearer writer"})
+        assert read_title(replicated_app, {"Authorization": "Bearer reader"}).startswith("replica")
+
+    def test_when_a_client_wrote_through_another_worker_its_reads_go_to_the_primary(self, replicated_app, redis_server):
+        replicated_app.config["SQLALCHEMY_REPLICA_STICKY_BACKEND"] = "redis"
+        replicated_app.config["SQLALCHEMY_REPLICA_STICKY_URL"] = redis_server.url
+        replicated_app.db.init_app(replicated_app)
+        with replicated_app.test_request_context(headers={"Authorization": "Bearer writer"}):
+            PhotoService.save(PhotoModel(title="New", url="https://example.com/new.png", user_id=1))
+
+        other_worker = RedisStickyClients(redis_server.url, ttl=5)
+        assert other_worker.get("Bearer writer")
+        assert not other_worker.get("Bearer reader")
+        assert "primary" == read_title(replicated_app, {"Authorization": "Bearer writer"})
+        assert b"Bearer writer" not in b"".join(redis_server.data)
+
+    def test_when_a_replica_lags_its_page_is_not_served_to_a_client_reading_its_writes(self, replicated_app):
+        client = replicated_app.test_client()
+        with replicated_app.app_context():
+            user = UserModel.query.get(1)
+            writer, reader = [{"Authorization": f"Bearer {create_access_token(user)}"} for _ in range(2)]
+        photo = dict(title="New", url="https://example.com/new.png")
+        assert 201 == client.post("/api/photos", json=photo, headers=writer).status_code
+
+        stale = client.get("/api/photos", headers=reader)
+        fresh = client.get("/api/photos", headers=writer)
+        assert "New" not in [item["title"] for item in stale.get_json()["items"]]
+        assert "New" in [item["title"] for item in fresh.get_json()["items"]]
+
+    def test_when_a_replica_lags_the_etag_of_its_page_does_not_match_the_new_photos(self, replicated_app):
+        client = replicated_app.test_client()
+        with replicated_app.app_context():
+            user = UserModel.query.get(1)
+            writer, reader = [{"Authorization": f"Bearer {create_access_token(user)}"} for _ in range(2)]
+        photo = dict(title="New", url="https://example.com/new.png")
+        assert 201 == client.post("/api/photos", json=photo, headers=writer).status_code
+
+        etag = client.get("/api/photos", headers=reader).headers["ETag"]
+        rv = client.get("/api/photos", headers={"If-None-Match": etag, **writer})
+        assert 200 == rv.status_code
+        assert "New" in [item["title"] for item in rv.get_json()["items"]]
+
+    def test_when_a_replica_fails_the_read_is_retried_and_it_is_skipped(self, replicated_app, tmp_path):
+        (tmp_path / "replica_0.db").unlink()
+        (tmp_path / "replica_0.db").mkdir()
+
+        assert ["replica_1", "replica_1", "replica_1"] == [read_title(replicated_app) for _ in range(3)]
+
+    def test_when_every_replica_fails_the_read_is_retried_on_the_primary(self, replicated_app, tmp_path):
+        for key in ("replica_0", "replica_1"):
+            (tmp_path / f"{key}.db").unlink()
+            (tmp_path / f"{key}.db").mkdir()
+
+        assert ["primary", "primary"] == [read_title(replicated_app) for _ in range(2)]
+
+
+@pytest.fixture
+def users(app, client) -> int:
+    """Adds three more users with two photos each and returns how many users there are."""
+    for i in range(3):
+        user = UserModel(email=f"user{i}@client.local", password="12345")
+        user.photos = [PhotoModel(title=f"Photo {j}", url="https://example.com/photo.png") for j in range(2)]
+        app.db.session.add(user)
+    app.db.session.commit()
+    app.db.session.expunge_all()
+    return 4
+
+
+def count_statements(app, fn):
+    statements = []
+
+    def listener(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(app.db.engine, "before_cursor_execute", listener)
+    try:
+        return fn(), len(statements)
+    finally:
+        event.remove(app.db.engine, "before_cursor_execute", listener)
+
+
+class TestLoadingStrategies:
+    def test_when_strict_a_lazy_load_raises(self, app, users):
+        user = UserService.list()[0]
+        with pytest.raises(LazyLoadError):
+            user.photos
+
+    def test_when_strict_lazy_loads_chosen_with_select_are_allowed(self, app, users):
+        for load in ({"photos": "select"}, {"*": "select"}):
+            app.db.session.expunge_all()
+            assert [0, 2, 2, 2] == [len(user.photos) for user in UserService.list(load=load)]
+
+    def test_when_photos_are_loaded_eagerly_the_queries_do_not_grow_with_users(self, app, users):
+        for strategy, expected in (("selectin", 2), ("joined", 1)):
+            app.db.session.expunge_all()
+            counts, statements = count_statements(
+                app, lambda: [len(user.photos) for user in UserService.list(load={"photos": strategy})]
+            )
+            assert (expected, [0, 2, 2, 2]) == (statements, counts)
+
+    def test_when_photos_are_loaded_with_raise_accessing_them_raises(self, app, users):
+        app.config["SQLALCHEMY_STRICT_LOADING"] = False
+        user = UserService.list(load={"photos": "raise"})[0]
+        with pytest.raises(InvalidRequestError):
+            user.photos
+
+    def test_when_a_strategy_is_unknown_raise_value_error(self, app, users):
+        with pytest.raises(ValueError):
+            UserService.list(load={"photos": "eager"})
+
+    def test_when_counting_photos_every_user_is_counted_in_one_query(self, app, users):
+        rows, statements = count_statements(app, UserService.with_photo_counts)
+        assert (1, [0, 2, 2, 2]) == (statements, [count for _, count in rows])
@@ -0,0 +1,68 @@
+import logging
+
+import pytest
+from flask.app import Flask
+
+import core
+from core.config import TestConfig
+from core.instrumentation import instrumentation, redact
+
+
+@pytest.fixture
+def app(monkeypatch) -> Flask:
+    monkeypatch.setattr(TestConfig, "INSTRUMENTATION_ENABLED", True)
+    monkeypatch.setattr(TestConfig, "MONITORING_TOKEN", "monitoring")
+    return core.create_app("test")
+
+
+class TestInstrumentation:
+    def test_when_enabled_return_server_timing(self, client, auth_header, photos):
+        rv = client.get("/api/photos", headers=auth_header)
+
+        timings = {part.split(";")[0] for part in rv.headers["Server-Timing"].split(", ")}
+        assert {"auth", "db", "serialize", "total"} <= timings
+
+    def test_when_scraped_return_request_and_query_counters(self, client, auth_header, photos):
+        client.get("/api/photos", headers=auth_header)
+        rv = client.get("/metrics", headers={"Authorization": "Bearer monitoring"})
+
+        body = rv.data.decode()
+        assert 200 == rv.status_code
+        assert 'http_requests_total{endpoint="api.photos",method="GET",status="200"} 1' in body
+        assert 'db_queries_total{endpoint="api.photos"}' in body
+        assert 'user_cache{key="misses"}' in body
+
+    def test_when_scraped_without_the_monitoring_token_return_401_as_status_code(self, client, auth_header):
+        for headers in ({}, auth_header, {"Authorization": "Bearer wrong"}):
+            rv = client.get("/metrics", headers=headers)
+            assert 401 == rv.status_code
+            assert "http_requests_total" not in rv.data.decode()
+
+    def test_when_no_monitoring_token_is_configured_return_404_as_status_code(self, app, client):
+        app.config["MONITORING_TOKEN"] = None
+        assert 404 == client.get("/metrics", headers={"Authorization": "Bearer None"}).status_code
+
+    def test_when_a_query_is_slow_log_it_without_parameter_values(self, app, client, auth_header, caplog):
+        instrumentation.slow_query = 0
+        with caplog.at_level(logging.WARNING):
+            client.get("/api/photos", headers=auth_header)
+
+        assert "Slow query" in caplog.text
+        assert "test@client.local" not in caplog.text
+
+    def test_when_redacting_parameters_return_their_types_only(self):
+        assert "(<str>, <int>)" == redact(("secret", 1))
+        assert "{email: <str>}" == redact({"email": "secret"})
+        assert "<2 rows>" == redact([("a",), ("b",)])
+
+
+def test_when_disabled_return_no_server_timing():
+    app = core.create_app("test")
+    with app.app_context():
+        app.db.create_all()
+        client = app.test_client()
+        rv = client.get("/api/health")
+
+        assert "Server-Timing" not in rv.headers
+        assert 404 == client.get("/metrics").status_code
+        app.db.drop_all()
@@ -0,0 +1,70 @@
+import pytest
+
+from core.ratelimit import MemoryWindows, RateLimiter, RateLimitExceeded
+
+
+@pytest.fixture(params=["memory", "redis"])
+def limiter(request, app):
+    app.config["RATELIMIT_BACKEND"] = request.param
+    app.config["RATELIMIT_LIMITS"] = {"test": (3, 60)}
+    if request.param == "redis":
+        app.config["RATELIMIT_URL"] = request.getfixturevalue("redis_server").url
+    limiter = RateLimiter()
+    limiter.init_app(app)
+    return limiter
+
+
+class TestRateLimiter:
+    def test_when_over_the_limit_raise_with_the_seconds_until_a_request_is_allowed(self, limiter):
+        for _ in range(3):
+            limiter.hit("test", "client", now=6000.0)
+
+        with pytest.raises(RateLimitExceeded) as error:
+            limiter.hit("test", "client", now=6030.0)
+        assert 60 == error.value.retry_after
+        limiter.hit("test", "another client", now=6030.0)
+
+    def test_when_the_previous_window_passes_its_hits_weigh_less(self, limiter):
+        for _ in range(3):
+            limiter.hit("test", "client", now=6030.0)
+
+        with pytest.raises(RateLimitExceeded):
+            limiter.hit("test", "client", now=6061.0)
+        limiter.hit("test", "client", now=6100.0)
+        assert 1 == limiter.stats["rejected"]
+
+    def test_when_the_redis_server_is_unreachable_every_request_is_allowed(self, app, redis_server):
+        app.config.update(RATELIMIT_BACKEND="redis", RATELIMIT_URL=redis_server.url, RATELIMIT_LIMITS={"test": (1, 60)})
+        limiter = RateLimiter()
+        limiter.init_app(app)
+        redis_server.shutdown()
+        redis_server.server_close()
+
+        for _ in range(3):
+            limiter.hit("test", "client")
+
+    def test_when_a_view_is_limited_only_its_methods_are_counted_per_address(self, app, limiter):
+        view = limiter.limit("test", methods=("POST",))(lambda: "OK")
+
+        for method in ("GET", "POST", "GET", "POST", "POST"):
+            with app.test_request_context(method=method, environ_base={"REMOTE_ADDR": "192.0.2.1"}):
+                assert "OK" == view()
+        with app.test_request_context(method="POST", environ_base={"REMOTE_ADDR": "192.0.2.1"}):
+            with pytest.raises(RateLimitExceeded):
+                view()
+        with app.test_request_context(method="POST", environ_base={"REMOTE_ADDR": "192.0.2.2"}):
+            assert "OK" == view()
+
+
+class TestMemoryWindows:
+    def test_when_over_max_keys_the_least_recently_hit_are_forgotten(self):
+        windows = MemoryWindows(max_keys=2)
+        windows.hit("a", 1, 60)
+        windows.hit("b", 1, 60)
+        windows.hit("a", 1, 60)
+        windows.hit("c", 1, 60)
+
+        assert (0, 3) == windows.hit("a", 1, 60)
+        assert (0, 1) == windows.hit("b", 1, 60)
+        assert (3, 1) == windows.hit("a", 2, 60)
+        assert 2 == len(windows)
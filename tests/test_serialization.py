@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from core import serialization
+from core.models import UserModel
+from core.schemas import BatchResultSchema, PhotoPageSchema, PhotoSchema, UserSchema
+from core.services import Page
+
+
+class TestCompiledSerializer:
+    def test_when_dumping_a_photo_return_the_marshmallow_dump(self, photos):
+        photo = photos[0]
+        photo.description = None
+
+        assert PhotoSchema().dump(photo) == PhotoSchema.serializer()(photo)
+
+    def test_when_dumping_a_page_return_the_marshmallow_dump(self, photos):
+        page = Page(photos, 3)
+
+        assert PhotoPageSchema().dump(page) == PhotoPageSchema.serializer()(page)
+
+    def test_when_dumping_a_user_return_the_marshmallow_dump_without_load_only_fields(self, client):
+        user = UserModel.query.one()
+
+        assert UserSchema().dump(user) == UserSchema.serializer()(user)
+        assert "password" not in UserSchema.serializer()(user)
+
+    def test_when_dumping_dicts_missing_keys_are_left_out(self):
+        result = dict(index=0, status=201)
+
+        assert dict(index=0, status=201) == BatchResultSchema.serializer()(result)
+
+
+class TestDumps:
+    @pytest.mark.parametrize("backend", ["orjson", "json"])
+    def test_when_encoding_return_sorted_compact_json(self, app, monkeypatch, backend):
+        if backend == "json":
+            monkeypatch.setattr(serialization, "orjson", None)
+        elif serialization.orjson is None:
+            pytest.skip("orjson is not installed")
+
+        with app.app_context():
+            body = serialization.dumps({"b": 1, "a": ["é", None]})
+
+        assert {"a": ["é", None], "b": 1} == json.loads(body)
+        assert body.startswith(b'{"a":[')
+
+
+def test_when_swagger_is_requested_return_the_photo_definitions(client):
+    rv = client.get("/apispec_1.json")
+
+    assert 200 == rv.status_code
+    assert "PhotoSchema" in rv.get_json()["definitions"]
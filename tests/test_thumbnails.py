@@ -0,0 +1,203 @@
+import json
+import subprocess
+import sys
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+import core
+from core.config import TestConfig
+from core.models import PhotoModel, ThumbnailJobModel, UserModel
+from core.services import PhotoService, ThumbnailService
+from core.thumbnails import check_public_address, read_image, render, thumbnailer
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(TestConfig, "THUMBNAIL_DIR", str(tmp_path / "thumbnails"))
+    app = core.create_app("test")
+    yield app
+    thumbnailer.shutdown()
+
+
+@pytest.fixture
+def image_url(tmp_path) -> str:
+    path = tmp_path / "photo.png"
+    Image.new("RGB", (800, 600), "teal").save(path)
+    return path.as_uri()
+
+
+def add_photo(url: str) -> PhotoModel:
+    user = UserModel.query.filter_by(email="test@client.local").one()
+    photo = PhotoModel(title="Photo", url=url, user_id=user.id)
+    return PhotoService.save(photo)
+
+
+class TestRender:
+    def test_when_render_an_image_its_thumbnails_are_stored_under_its_digest(self, tmp_path, image_url):
+        digest = render(image_url, str(tmp_path), [128, 512], 1.0, 1024 * 1024, True)
+
+        sizes = [Image.open(tmp_path / digest[:2] / f"{digest}-{size}.jpg").size for size in (128, 512)]
+        assert [(128, 96), (512, 384)] == sizes
+        assert digest == render(image_url, str(tmp_path), [128, 512], 1.0, 1024 * 1024, True)
+
+    def test_when_files_are_not_allowed_rendering_a_file_url_fails(self, tmp_path, image_url):
+        with pytest.raises(ValueError):
+            render(image_url, str(tmp_path), [128], 1.0, 1024 * 1024, False)
+
+    def test_when_an_image_url_is_on_a_private_address_fetching_it_fails(self, tmp_path, image_url):
+        handler = partial(SimpleHTTPRequestHandler, directory=str(tmp_path))
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            with pytest.raises(ValueError):
+                read_image(f"http://127.0.0.1:{server.server_port}/photo.png", 1.0, 1024 * 1024, True)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        for address in ("169.254.169.254", "10.0.0.1", "::ffff:127.0.0.1", "fe80::1"):
+            with pytest.raises(ValueError):
+                check_public_address(address)
+        check_public_address("93.184.216.34")
+
+
+class TestThumbnailsCommand:
+    def test_when_backfill_every_photo_gets_thumbnail_urls(self, app, client, auth_header, photos, image_url):
+        for photo in photos:
+            photo.url = image_url
+        app.db.session.commit()
+        photo_id = photos[0].id
+
+        result = app.test_cli_runner().invoke(args=["photo", "thumbnails", "--backfill"])
+        rv = client.get(f"/api/photos/{photo_id}", headers=auth_header)
+        thumbnails = json.loads(rv.data.decode())["thumbnails"]
+        assert "3 photos queued." in result.output
+        assert "3 photos rendered, 0 failed." in result.output
+        assert ["128", "512"] == sorted(thumbnails)
+
+        rv = client.get(thumbnails["128"])
+        assert 200 == rv.status_code
+        assert "image/jpeg" == rv.mimetype
+        assert "immutable" in rv.headers["Cache-Control"]
+
+    def test_when_a_photo_is_saved_its_thumbnails_are_pending(self, app, client, image_url):
+        photo = add_photo(image_url)
+
+        job = ThumbnailJobModel.query.get(photo.id)
+        assert (ThumbnailJobModel.PENDING, None) == (job.status, photo.thumbnail)
+
+    def test_when_rendering_fails_it_is_retried_until_attempts_run_out(self, app, client, tmp_path):
+        photo_id = add_photo((tmp_path / "missing.png").as_uri()).id
+
+        result = app.test_cli_runner().invoke(args=["photo", "thumbnails"])
+        job = ThumbnailJobModel.query.get(photo_id)
+        assert "0 photos rendered, 1 failed." in result.output
+        assert (ThumbnailJobModel.FAILED, 3) == (job.status, job.attempts)
+        assert job.error.startswith("FileNotFoundError")
+
+    def test_when_the_url_changes_while_rendering_the_old_render_is_discarded(self, app, client, image_url):
+        photo = add_photo(image_url)
+        photo_id = photo.id
+        sources = ThumbnailService._start([photo_id])
+        PhotoService.save(
+            PhotoModel(id=photo_id, title="Photo", url="https://example.com/another.png", user_id=photo.user_id)
+        )
+
+        finished = ThumbnailService._finish(thumbnailer.render_all(sources))
+        job = ThumbnailJobModel.query.get(photo_id)
+        assert {} == finished
+        assert (ThumbnailJobModel.PENDING, None) == (job.status, PhotoModel.query.get(photo_id).thumbnail)
+
+
+class TestThumbnailPool:
+    def test_when_a_photo_is_saved_its_thumbnails_are_rendered_by_the_pool(self, app, client, image_url):
+        app.config["THUMBNAIL_POOL_SIZE"] = 1
+        thumbnailer.init_app(app)
+        photo_id = add_photo(image_url).id
+        thumbnailer.shutdown()
+
+        app.db.session.expire_all()
+        assert ThumbnailJobModel.DONE == ThumbnailJobModel.query.get(photo_id).status
+        assert PhotoModel.query.get(photo_id).thumbnail is not None
+
+    def test_when_the_app_is_created_pillow_and_the_process_pool_are_not_imported(self):
+        script = "import sys, core; core.create_app('test'); print('PIL' in sys.modules, 'concurrent.futures.process' in sys.modules)"
+        assert "False False" == subprocess.check_output([sys.executable, "-c", script], text=True).strip()
+
+
+@pytest.fixture
+def photo_id(app, client, image_url) -> int:
+    """The id of a photo of the authenticated user whose image and thumbnails are stored."""
+    photo_id = add_photo(image_url).id
+    ThumbnailService.process([photo_id])
+    return photo_id
+
+
+class TestPhotoContent:
+    def path(self, photo_id: int) -> str:
+        return f"/api/photos/{photo_id}/content"
+
+    def test_when_get_content_return_the_stored_image_with_validators(self, client, auth_header, photo_id, tmp_path):
+        rv = client.get(self.path(photo_id), headers=auth_header)
+        assert 200 == rv.status_code
+        assert "image/png" == rv.mimetype
+        assert (tmp_path / "photo.png").read_bytes() == rv.data
+        assert "bytes" == rv.headers["Accept-Ranges"]
+        assert "Last-Modified" in rv.headers
+
+        rv = client.get(self.path(photo_id), headers=dict(auth_header, **{"If-None-Match": rv.headers["ETag"]}))
+        assert 304 == rv.status_code
+
+    def test_when_get_a_range_of_content_return_only_those_bytes(self, client, auth_header, photo_id, tmp_path):
+        rv = client.get(self.path(photo_id), headers=dict(auth_header, Range="bytes=0-9"))
+        size = (tmp_path / "photo.png").stat().st_size
+        assert 206 == rv.status_code
+        assert (tmp_path / "photo.png").read_bytes()[:10] == rv.data
+        assert f"bytes 0-9/{size}" == rv.headers["Content-Range"]
+
+    def test_when_get_content_with_a_size_return_that_thumbnail(self, client, auth_header, photo_id):
+        rv = client.get(self.path(photo_id), query_string={"size": 128}, headers=auth_header)
+        assert 200 == rv.status_code
+        assert "image/jpeg" == rv.mimetype
+        assert 422 == client.get(self.path(photo_id), query_string={"size": 100}, headers=auth_header).status_code
+
+    def test_when_content_is_offloaded_return_only_a_redirect_header(self, app, client, auth_header, photo_id):
+        app.config["CONTENT_OFFLOAD"] = "x-accel-redirect"
+        rv = client.get(self.path(photo_id), headers=auth_header)
+        assert 200 == rv.status_code
+        assert b"" == rv.data
+        assert rv.headers["X-Accel-Redirect"].startswith("/protected/thumbnails/")
+        assert "Content-Length" not in rv.headers
+        assert "image/png" == rv.mimetype
+        assert rv.headers["ETag"]
+
+    def test_when_content_is_offloaded_to_sendfile_return_only_its_path(self, app, client, auth_header, photo_id):
+        app.config["CONTENT_OFFLOAD"] = "x-sendfile"
+        rv = client.get(self.path(photo_id), headers=auth_header)
+        assert 200 == rv.status_code
+        assert b"" == rv.data
+        assert rv.headers["X-Sendfile"].startswith(app.config["THUMBNAIL_DIR"])
+        assert "Content-Length" not in rv.headers
+
+    def test_when_get_content_of_another_users_photo_return_404_as_status_code(self, app, client, auth_header):
+        user = UserModel(email="another@client.local", password="12345")
+        app.db.session.add(user)
+        app.db.session.commit()
+        photo = PhotoService.save(PhotoModel(title="Photo", url="https://example.com/photo.png", user_id=user.id))
+
+        assert 404 == client.get(self.path(photo.id), headers=auth_header).status_code
+
+    def test_when_get_the_stored_image_as_a_thumbnail_return_404_as_status_code(self, client, auth_header, photo_id):
+        thumbnail = json.loads(client.get(f"/api/photos/{photo_id}", headers=auth_header).data.decode())["thumbnails"]
+        name = thumbnail["128"].rpartition("/api/thumbnails/")[2]
+        assert 200 == client.get(f"/api/thumbnails/{name}").status_code
+        assert 404 == client.get(f"/api/thumbnails/{name[: -len('-128.jpg')]}").status_code
+        assert 404 == client.get(f"/api/thumbnails/{name.replace('-128', '-100')}").status_code
+
+    def test_when_the_image_was_not_stored_yet_return_404_as_status_code(self, client, auth_header, image_url):
+        photo_id = add_photo(image_url).id
+        assert 404 == client.get(self.path(photo_id), headers=auth_header).status_code